@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Load test of the API: many concurrent clients request given URLs in a loop
+for given time. Reports throughput, latency percentiles and failures.
+
+Only standard library is used, so it can run anywhere, e.g. to compare
+WSGI and ASGI deployments:
+
+    python dev/scripts/loadtest.py --username u --password p \
+        --concurrency 100 http://localhost:8000/reservations/ \
+        http://localhost:8000/async/reservations/
+"""
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+def get_token(url, username, password):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.netloc)
+    connection.request(
+        'POST', '/auth/token/',
+        json.dumps({'username': username, 'password': password}),
+        {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    if response.status != 200:
+        raise SystemExit('Cannot obtain token: {} {}'.format(
+            response.status, response.read().decode()))
+    return json.loads(response.read())['token']
+
+
+def run(url, token, concurrency, duration):
+    parts = urlsplit(url)
+    path = parts.path + ('?' + parts.query if parts.query else '')
+    headers = {'Authorization': 'Bearer ' + token} if token else {}
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        connection = http.client.HTTPConnection(parts.netloc, timeout=60)
+        own_latencies = []
+        own_statuses = Counter()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                own_statuses[response.status] += 1
+            except (OSError, http.client.HTTPException) as e:
+                own_statuses[type(e).__name__] += 1
+                connection.close()
+                connection = http.client.HTTPConnection(
+                    parts.netloc, timeout=60)
+                continue
+            own_latencies.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own_latencies)
+            statuses.update(own_statuses)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+
+def report(url, latencies, statuses, elapsed):
+    print(url)
+    if not latencies:
+        print('  no successful requests: {}'.format(dict(statuses)))
+        return
+    ms = sorted(latency * 1000 for latency in latencies)
+    print('  {:.0f} requests/s, latency median {:.1f} ms, p95 {:.1f} ms, '
+          'p99 {:.1f} ms'.format(
+              len(ms) / elapsed,
+              statistics.median(ms),
+              ms[int(len(ms) * 0.95) - 1],
+              ms[int(len(ms) * 0.99) - 1]))
+    print('  responses: {}'.format(dict(statuses)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('urls', nargs='+', help='URLs to request.')
+    parser.add_argument(
+        '--concurrency', type=int, default=50,
+        help='Number of concurrent clients.')
+    parser.add_argument(
+        '--duration', type=float, default=20,
+        help='How long (in seconds) each URL is requested.')
+    parser.add_argument('--token', help='Authentication token.')
+    parser.add_argument(
+        '--username', help='User to obtain authentication token for.')
+    parser.add_argument('--password')
+    args = parser.parse_args()
+    token = args.token
+    if token is None and args.username:
+        token = get_token(args.urls[0], args.username, args.password)
+    for url in args.urls:
+        report(url, *run(url, token, args.concurrency, args.duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""
+Stands in for replication of SQLite database: copies primary database file
+to replica file every few seconds, so replica lags behind like a real one.
+
+    python dev/scripts/sqlite_replica.py hra/db.sqlite3 hra/replica.sqlite3
+
+and run the API with `SQLITE_REPLICA_PATH=replica.sqlite3`.
+"""
+import argparse
+import sqlite3
+import time
+
+
+def copy(primary, replica):
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('primary', help='Primary database file.')
+    parser.add_argument('replica', help='Replica database file.')
+    parser.add_argument(
+        '--interval', type=float, default=2,
+        help='Time (in seconds) between copies.')
+    parser.add_argument(
+        '--once', action='store_true', help='Copy only once and exit.')
+    args = parser.parse_args()
+    while True:
+        copy(args.primary, args.replica)
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Gunicorn configuration used by production deployments (e.g. docker image),
+loaded automatically when gunicorn is started from this directory:
+
+    gunicorn
+
+Serves WSGI application with synchronous workers or, with `HOTEL_ASGI=1`,
+ASGI application with uvicorn workers (required by async endpoints to serve
+many requests at once). Settings can be overridden with environment
+variables listed below or with `GUNICORN_CMD_ARGS`.
+"""
+import multiprocessing
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+# serve ASGI application (async endpoints) instead of WSGI one
+asgi = os.environ.get('HOTEL_ASGI', '0') == '1'
+
+bind = '0.0.0.0:{}'.format(os.environ.get('PORT', '8000'))
+
+if asgi:
+    wsgi_app = 'hra.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'hra.wsgi:application'
+    worker_class = 'sync'
+
+# sync worker serves one request at a time, so some more workers than cores
+# cover time spent waiting for the database; async worker is busy only when
+# it has CPU work to do, so one per core is enough
+workers = int(os.environ.get(
+    'WEB_CONCURRENCY',
+    multiprocessing.cpu_count() * (1 if asgi else 2) + (0 if asgi else 1)))
+
+# load application once in master process before forking workers: workers
+# start faster and share memory of loaded code, and import errors stop the
+# server instead of making workers restart in a loop
+preload_app = True
+
+# restart workers periodically (at different times) to limit memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = timeout
+# keep connections from load balancer open between requests
+keepalive = 5
+
+accesslog = '-'
+
+
+def on_starting(server):
+    """
+    Refuses to start several workers with caches in local memory: each worker
+    would have its own occupancy index, throttles, cached responses etc.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hra.settings')
+    from django.conf import settings
+
+    aliases = {'default', settings.HOTEL_RESPONSE_CACHE,
+               settings.HOTEL_THROTTLE_CACHE}
+    local = sorted(
+        alias for alias in aliases
+        if settings.CACHES[alias]['BACKEND'].endswith('.LocMemCache'))
+    if server.cfg.workers > 1 and local:
+        raise ImproperlyConfigured(
+            'Caches in local memory ({}) are not shared by {} workers; set '
+            'HOTEL_CACHE_URL to a shared cache or WEB_CONCURRENCY=1'.format(
+                ', '.join(local), server.cfg.workers))
+
+
+def worker_exit(server, worker):
+    """
+    Adds metrics of the exiting worker to totals of all workers.
+    """
+    from hotel.metrics import request_metrics
+
+    request_metrics.publish()
@@ -0,0 +1,114 @@
+"""
+Async versions of read endpoints, served under `async/` prefix.
+
+Views use async ORM, so a single ASGI worker can serve many requests waiting
+for the database at once. Under WSGI they work as well, but without any
+benefit. Requests are authenticated with tokens or sessions (basic
+authentication hashes password on every request, which would block the
+worker).
+"""
+from contextlib import nullcontext
+from inspect import isawaitable
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.response import Response
+
+from hotel.authentication import SignedTokenAuthentication
+from hotel.routers import ReplicaReadMixin
+from hotel.views import ReservationViewSet, RoomViewSet
+
+
+class AsyncViewSetMixin:
+    """
+    Serves read actions of a viewset with async handlers.
+
+    Requests pass the viewset's own authentication, permissions, throttles
+    and routing to the replica, which use the cache and the database, so
+    they run in a thread. Objects are then read with async ORM from the
+    viewset's querysets, and lists are paginated with the viewset's cursors.
+    """
+    authentication_classes = [
+        SignedTokenAuthentication, SessionAuthentication]
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        # view function returns coroutine of `dispatch`
+        return markcoroutinefunction(super().as_view(actions, **initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        """
+        Async version of DRF's `dispatch`.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        routing = self.routing() if isinstance(self, ReplicaReadMixin) \
+            else nullcontext()
+        with routing:
+            try:
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+                handler = self.http_method_not_allowed
+                if request.method.lower() in self.http_method_names:
+                    handler = getattr(
+                        self, request.method.lower(), handler)
+                response = handler(request, *args, **kwargs)
+                if isawaitable(response):
+                    response = await response
+            except Exception as exc:
+                response = self.handle_exception(exc)
+            self.response = self.finalize_response(
+                request, response, *args, **kwargs)
+        return self.response
+
+    async def list(self, request, *args, **kwargs):
+        queryset = await self._aget_queryset()
+        page = await self.paginator.apaginate_queryset(
+            queryset, request, view=self)
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data)
+
+    async def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+    async def aget_object(self):
+        """
+        Async version of `get_object`.
+        """
+        queryset = await self._aget_queryset()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError,
+                ValidationError):
+            raise Http404
+        await sync_to_async(self.check_object_permissions)(self.request, obj)
+        return obj
+
+    async def _aget_queryset(self):
+        # querysets may depend on user's permissions, which may be looked up
+        # in the database
+        return await sync_to_async(
+            lambda: self.filter_queryset(self.get_queryset()))()
+
+
+class AsyncRoomViewSet(AsyncViewSetMixin, RoomViewSet):
+    """
+    Async room list and availability. Rooms are not served from response
+    cache.
+    """
+
+    async def available(self, request):
+        # index is in memory, but can be rebuilt from the database
+        return await sync_to_async(super().available)(request)
+
+
+class AsyncReservationViewSet(AsyncViewSetMixin, ReservationViewSet):
+    """
+    Async reservation list (with the same search parameters) and details.
+    """
@@ -0,0 +1,129 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import (BaseAuthentication,
+                                           get_authorization_header)
+from rest_framework.exceptions import AuthenticationFailed
+
+TOKEN_SALT = 'hotel.authentication.token'
+# users are cached for token authentication, so that authenticating
+# requests doesn't query the database; only fields used by authentication
+# and permissions are cached (not password hash), under random version of
+# the user, changed when user changes
+TOKEN_USER_CACHE_KEY = 'hotel:token_user:{}:{}'
+TOKEN_USER_VERSION_KEY = 'hotel:token_user:version:{}'
+TOKEN_USER_CACHE_TIMEOUT = 5 * 60
+TOKEN_USER_FIELDS = {
+    'id', 'username', 'first_name', 'last_name', 'is_staff', 'is_superuser',
+    'is_active'}
+
+
+def issue_token(user: User) -> str:
+    """
+    Creates signed token identifying given user. Token expires after
+    `HOTEL_TOKEN_MAX_AGE` seconds or when user's password changes.
+    """
+    return signing.dumps(
+        {'user': user.pk, 'password': _password_key(user)},
+        salt=TOKEN_SALT)
+
+
+def user_for_token(token: str) -> User:
+    """
+    Returns active user identified by given token. Checking token is a
+    signature check, not a password hashing.
+    """
+    payload = _load_token(token)
+    # version is read before the database, so that user read before a
+    # change is cached under version the change has replaced
+    key = TOKEN_USER_CACHE_KEY.format(
+        payload['user'], _user_version(payload['user']))
+    fields = cache.get(key)
+    if fields is None:
+        user = User.objects.filter(pk=payload['user']).first()
+        if user is None:
+            raise AuthenticationFailed('Invalid token.')
+        fields = {name: getattr(user, name) for name in TOKEN_USER_FIELDS}
+        fields['password_key'] = _password_key(user)
+        cache.set(key, fields, TOKEN_USER_CACHE_TIMEOUT)
+    if (not fields['is_active']
+            or payload['password'] != fields['password_key']):
+        raise AuthenticationFailed('Invalid token.')
+    # other fields are loaded from the database if they're used
+    names = [field.attname for field in User._meta.concrete_fields
+             if field.attname in TOKEN_USER_FIELDS]
+    return User.from_db(
+        User.objects.db, names, [fields[name] for name in names])
+
+
+def _user_version(user_id) -> str:
+    key = TOKEN_USER_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        # nothing is known about earlier changes, so start over
+        cache.add(key, uuid4().hex, timeout=None)
+        # version evicted right away is not used by anyone else
+        version = cache.get(key) or uuid4().hex
+    return version
+
+
+def _load_token(token):
+    try:
+        return signing.loads(
+            token, salt=TOKEN_SALT, max_age=settings.HOTEL_TOKEN_MAX_AGE)
+    except signing.SignatureExpired:
+        raise AuthenticationFailed('Token has expired.')
+    except signing.BadSignature:
+        raise AuthenticationFailed('Invalid token.')
+
+
+def forget_token_user(user_id: int):
+    """
+    Drops cached user, e.g. when user changes, once current transaction
+    commits, by changing user's version (user cached by concurrent
+    requests before or after that is stale).
+    """
+    transaction.on_commit(lambda: cache.set(
+        TOKEN_USER_VERSION_KEY.format(user_id), uuid4().hex, timeout=None))
+
+
+def _password_key(user):
+    # changes with password, so changing password revokes issued tokens
+    return user.get_session_auth_hash()[:16]
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates requests with signed tokens issued by `auth/token/`
+    endpoint, given in header:
+
+        Authorization: Bearer <token>
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        token = self.get_token(request)
+        if token is None:
+            return None
+        return user_for_token(token), token
+
+    def get_token(self, request):
+        """
+        Returns token given in request's header, if there is any.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid token header.')
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,277 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from rest_framework import status
+
+from hotel import inventory, rollups
+from hotel.models import Reservation, Room
+from hotel.occupancy import occupancy_index
+from hotel.permissions import is_staff
+from hotel.pricing import rate_plans
+from hotel.serializers import (ReservationSerializer, atomic_booking,
+                               lock_rooms, unavailable_rooms_message)
+
+
+class ReservationBatch:
+    """
+    Creates and updates many reservations at once.
+
+    Reservations with `id` are updated (all fields are required, as in PUT),
+    others are created. All reservations are validated against each other
+    (earlier ones in the batch take precedence) and against the database
+    using a fixed number of queries, then written with bulk queries in a
+    single transaction holding locks on all reserved rooms.
+
+    In atomic mode nothing is written if any reservation is invalid. In
+    non-atomic mode valid reservations are written and invalid ones are
+    reported.
+    """
+
+    def __init__(self, items: list[dict], user, atomic: bool, context=None):
+        self.items = items
+        self.user = user
+        self.atomic = atomic
+        self.context = context or {}
+        # item index -> result of the item
+        self.results = {}
+        # item index -> (reservation being updated or None, validated data)
+        self._valid = {}
+
+    @property
+    def status_code(self):
+        if not self._errors():
+            return status.HTTP_200_OK
+        if self.atomic:
+            return status.HTTP_400_BAD_REQUEST
+        return status.HTTP_207_MULTI_STATUS
+
+    def save(self) -> list[dict]:
+        """
+        Saves valid reservations and returns results for all items, in order.
+        """
+        self._validate_items()
+        self._validate_collisions_within_batch()
+        if not (self.atomic and self._errors()):
+            errors, saved = atomic_booking(self._write)
+            self._fail(errors)
+            self._succeed(saved)
+        for i in range(len(self.items)):
+            self.results.setdefault(i, {
+                'status': status.HTTP_424_FAILED_DEPENDENCY,
+                'errors': {'non_field_errors': [
+                    'Not saved, because other reservations are invalid.']}})
+        return [self.results[i] for i in range(len(self.items))]
+
+    def _errors(self):
+        return [i for i, result in self.results.items()
+                if result['status'] >= 400]
+
+    def _fail(self, errors, status_code=status.HTTP_400_BAD_REQUEST):
+        for i, error in errors.items():
+            self._valid.pop(i, None)
+            self.results[i] = {'status': status_code, 'errors': error}
+
+    def _succeed(self, saved):
+        reservations = Reservation.objects.for_serialization().in_bulk(
+            [reservation.pk for _, reservation, _ in saved])
+        for i, reservation, created in saved:
+            self.results[i] = {
+                'status': status.HTTP_201_CREATED if created
+                else status.HTTP_200_OK,
+                'data': ReservationSerializer(
+                    reservations[reservation.pk], context=self.context).data}
+
+    def _validate_items(self):
+        instances = self._load_reservations()
+        rooms = Room.objects.in_bulk({
+            str(number)
+            for item in self.items
+            if isinstance(item.get('rooms'), list)
+            for number in item['rooms']
+            if isinstance(number, (str, int))})
+        context = self.context | {'bulk': True, 'rooms': rooms}
+        updated = set()
+        not_found = {}
+        for i, item in enumerate(self.items):
+            if 'id' in item:
+                instance = instances.get(self._id(item))
+                if instance is None:
+                    not_found[i] = {'id': ['Reservation not found.']}
+                    continue
+                if instance.pk in updated:
+                    self._fail({i: {'id': [
+                        'Reservation can be updated only once in a batch.']}})
+                    continue
+                updated.add(instance.pk)
+                data = item
+            else:
+                instance = None
+                data = {'name': self.user.last_name} | item
+            serializer = ReservationSerializer(
+                instance, data=data, context=context)
+            if serializer.is_valid():
+                self._valid[i] = (instance, serializer.validated_data)
+            else:
+                self._fail({i: serializer.errors})
+        self._fail(not_found, status.HTTP_404_NOT_FOUND)
+
+    def _load_reservations(self):
+        ids = {self._id(item) for item in self.items if 'id' in item}
+        ids.discard(None)
+        reservations = Reservation.objects.filter(pk__in=ids)
+        if not is_staff(self.user):
+            # user can update only reservations that they own
+            reservations = reservations.filter(owner=self.user)
+        return reservations.in_bulk()
+
+    @staticmethod
+    def _id(item):
+        try:
+            return int(item['id'])
+        except (TypeError, ValueError):
+            return None
+
+    def _validate_collisions_within_batch(self):
+        # room number -> sorted periods reserved by earlier reservations
+        reserved = defaultdict(list)
+        errors = {}
+        for i, (_, data) in sorted(self._valid.items()):
+            period = (data['date_from'], data['date_to'])
+            unavailable = sorted(
+                room.number for room in data['rooms']
+                if not _is_free(reserved[room.number], *period))
+            if unavailable:
+                errors[i] = {'non_field_errors': [
+                    unavailable_rooms_message(unavailable)]}
+                continue
+            for room in data['rooms']:
+                insort(reserved[room.number], period)
+        self._fail(errors)
+
+    def _collisions_with_database(self):
+        valid = self._valid.values()
+        if not valid:
+            return {}
+        rows = Reservation.rooms.through.objects.filter(
+            room_id__in={room.number for _, data in valid
+                         for room in data['rooms']},
+            reservation__date_from__lt=max(
+                data['date_to'] for _, data in valid),
+            reservation__date_to__gt=min(
+                data['date_from'] for _, data in valid)).values_list(
+            'reservation_id', 'room_id',
+            'reservation__date_from', 'reservation__date_to')
+        # reservation id -> rooms booked in the database with their periods
+        booked = defaultdict(list)
+        for reservation_id, number, date_from, date_to in rows.iterator():
+            booked[reservation_id].append((number, (date_from, date_to)))
+        errors = {}
+        while True:
+            new_errors = self._collisions_with(booked, errors)
+            if not new_errors:
+                return errors
+            # updates that failed keep their rooms at the old dates, which
+            # may collide with reservations that passed so far
+            errors |= new_errors
+
+    def _collisions_with(self, booked, errors):
+        # updated reservations are checked within the batch, but only those
+        # that will be written
+        written = {instance.pk for i, (instance, _) in self._valid.items()
+                   if instance is not None and i not in errors}
+        reserved = defaultdict(list)
+        for reservation_id, rooms in booked.items():
+            if reservation_id not in written:
+                for number, period in rooms:
+                    insort(reserved[number], period)
+        new_errors = {}
+        for i, (_, data) in self._valid.items():
+            if i in errors:
+                continue
+            unavailable = sorted(
+                room.number for room in data['rooms']
+                if not _is_free(
+                    reserved[room.number], data['date_from'], data['date_to']))
+            if unavailable:
+                new_errors[i] = {'non_field_errors': [
+                    unavailable_rooms_message(unavailable)]}
+        return new_errors
+
+    def _write(self):
+        lock_rooms({room.number for _, data in self._valid.values()
+                    for room in data['rooms']})
+        errors = self._collisions_with_database()
+        if errors and self.atomic:
+            return errors, []
+        created = []
+        updated = []
+        saved = []
+        for i, (instance, data) in sorted(self._valid.items()):
+            if i in errors:
+                continue
+            fields = {k: v for k, v in data.items() if k != 'rooms'}
+            if instance is None:
+                reservation = Reservation(owner=self.user, **fields)
+                created.append(reservation)
+            else:
+                reservation = instance
+                for attr, value in fields.items():
+                    setattr(reservation, attr, value)
+                updated.append(reservation)
+            reservation.set_duration()
+            saved.append((i, reservation, instance is None, data['rooms']))
+        through = Reservation.rooms.through
+        # rooms that stay in updated reservations keep their booked costs,
+        # unless dates of reservation change
+        booked_costs = {
+            (reservation_id, number): cost
+            for reservation_id, number, cost in through.objects.filter(
+                reservation_id__in=[
+                    r.pk for r in updated if not r.dates_changed()]
+            ).values_list('reservation_id', 'room_id', 'cost').iterator()}
+        plans = rate_plans(
+            room.room_class_id for _, _, _, rooms in saved for room in rooms)
+        # item index -> room number -> cost of room
+        costs = defaultdict(dict)
+        for i, reservation, _, rooms in saved:
+            for room in rooms:
+                cost = booked_costs.get((reservation.pk, room.number))
+                if cost is None:
+                    cost = plans[room.room_class_id].cost(
+                        reservation.date_from, reservation.date_to)
+                costs[i][room.number] = cost
+            reservation.total_cost = sum(costs[i].values())
+        Reservation.objects.bulk_create(created)
+        Reservation.objects.bulk_update(updated, [
+            'date_from', 'date_to', 'name', 'duration', 'total_cost'])
+        through.objects.filter(
+            reservation_id__in=[r.pk for r in updated]).delete()
+        through.objects.bulk_create([
+            through(
+                reservation_id=reservation.pk,
+                room_id=room.number,
+                cost=costs[i][room.number])
+            for i, reservation, _, rooms in saved
+            for room in rooms])
+        inventory.release_nights([r.pk for r in updated])
+        inventory.book_nights(
+            (reservation.pk, room.number,
+             reservation.date_from, reservation.date_to)
+            for _, reservation, _, rooms in saved
+            for room in rooms)
+        # bulk queries do not send signals
+        occupancy_index.reservations_changed(r.pk for _, r, _, _ in saved)
+        rollups.days_changed(
+            *[(r.date_from, r.date_to) for _, r, _, _ in saved],
+            # dates of updated reservations before the change
+            *[r._priced_dates for r in updated
+              if r.dates_changed()])
+        return errors, [(i, r, is_new) for i, r, is_new, _ in saved]
+
+
+def _is_free(periods, date_from, date_to):
+    """
+    Checks if period does not overlap any of sorted, non-overlapping periods.
+    """
+    i = bisect_left(periods, (date_to,))
+    return i == 0 or periods[i - 1][1] <= date_from
@@ -0,0 +1,99 @@
+import hashlib
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework.response import Response
+
+from hotel.routers import reads_from_replica
+
+# current version of cached room responses and time of last change of rooms
+ROOMS_STATE_KEY = 'hotel:rooms:state'
+ROOMS_RESPONSE_KEY = 'hotel:rooms:response:{}:{}'
+ROOMS_RESPONSE_TIMEOUT = 60 * 60
+
+
+def response_cache():
+    """
+    Returns cache backend for responses, configured by `HOTEL_RESPONSE_CACHE`
+    setting. Backend has to be shared by all workers (e.g. memcached or
+    Redis), otherwise changes are seen only by the worker that made them.
+    """
+    return caches[settings.HOTEL_RESPONSE_CACHE]
+
+
+def rooms_state() -> dict:
+    """
+    Returns version of room responses and timestamp of rooms' last change.
+    """
+    cache = response_cache()
+    state = cache.get(ROOMS_STATE_KEY)
+    if state is None:
+        # nothing is known about earlier changes, so start over now
+        cache.add(ROOMS_STATE_KEY, _new_state(), timeout=None)
+        state = cache.get(ROOMS_STATE_KEY)
+    return state
+
+
+def invalidate_rooms():
+    """
+    Drops all cached room responses after current transaction commits.
+    """
+    transaction.on_commit(lambda: response_cache().set(
+        ROOMS_STATE_KEY, _new_state(), timeout=None))
+
+
+def _new_state():
+    return {'version': uuid4().hex, 'modified': int(time.time())}
+
+
+class CachedRoomResponseMixin:
+    """
+    Serves `list` and `retrieve` actions from the response cache.
+
+    Response data is the same for all users allowed to see it, so it's
+    cached by URL until rooms change. Clients get `ETag` header and
+    `304 Not Modified` on conditional requests if nothing changed since.
+    There is no `Last-Modified` header: dates have a resolution of one
+    second, so a change made in the same second as the client's request
+    would not be seen.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def _cached_response(self, view, request, *args, **kwargs):
+        state = rooms_state()
+        url = request.build_absolute_uri()
+        etag = '"{}"'.format(hashlib.md5('{}:{}:{}'.format(
+            state['version'], request.accepted_media_type, url
+        ).encode()).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            cache = response_cache()
+            key = ROOMS_RESPONSE_KEY.format(
+                state['version'], hashlib.md5(url.encode()).hexdigest())
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                if reads_from_replica() and time.time() - state['modified'] \
+                        <= settings.HOTEL_PRIMARY_PIN_TIMEOUT:
+                    # replica may not have the latest change yet
+                    return response
+                cache.set(key, response.data, ROOMS_RESPONSE_TIMEOUT)
+        response['ETag'] = etag
+        # responses depend on credentials, so clients may keep them, but
+        # have to revalidate them
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
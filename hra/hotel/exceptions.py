@@ -5,5 +5,20 @@ from rest_framework.response import Response
 
 class RoomDeleteError(APIException):
     status_code = 400
-    default_detail = 'Cannot delete room that has reservations.'
+    default_detail = (
+        'Cannot delete room that has current or future reservations.')
     default_code = 'bad_request'
+
+
+class BookingConflictError(APIException):
+    status_code = 409
+    default_detail = 'Rooms are being booked concurrently. Try again.'
+    default_code = 'conflict'
+
+
+class ServiceOverloadedError(APIException):
+    status_code = 503
+    default_detail = 'Server is busy. Try again later.'
+    default_code = 'service_unavailable'
+    # seconds after which the request can be retried (Retry-After header)
+    wait = 1
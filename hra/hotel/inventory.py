@@ -0,0 +1,84 @@
+"""
+Inventory of booked room nights: a row per room and night booked by a
+reservation (see RoomNight model). Unique constraint on room and night makes
+the database reject double bookings that would get past availability checks.
+
+Nights are kept in the same transaction as changes of reservations: by
+reservation and room signals (see hotel/signals.py) and by bulk writes,
+which do not send signals (see hotel/bulk.py). They are deleted together
+with reservations and rooms.
+"""
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from django.db import transaction
+
+from hotel.exceptions import RoomDeleteError
+from hotel.models import Reservation, Room, RoomNight
+
+# how many nights are saved with a single query
+NIGHT_BATCH_SIZE = 1000
+
+
+def book_nights(bookings: Iterable[tuple[int, str, date, date]]):
+    """
+    Books nights of rooms for reservations, given as (reservation id, room
+    number, date from, date to). Raises IntegrityError if any of the nights
+    is booked already.
+    """
+    RoomNight.objects.bulk_create(
+        [RoomNight(
+            reservation_id=reservation_id,
+            room_id=room_id,
+            night=date_from + timedelta(n))
+         for reservation_id, room_id, date_from, date_to in bookings
+         for n in range((date_to - date_from).days)],
+        batch_size=NIGHT_BATCH_SIZE)
+
+
+def release_nights(reservation_ids: Optional[Iterable[int]] = None,
+                   rooms: Optional[Iterable[str]] = None):
+    """
+    Releases nights booked by given reservations, of given rooms (numbers),
+    or of given rooms booked by given reservations.
+    """
+    nights = RoomNight.objects.all()
+    if reservation_ids is not None:
+        nights = nights.filter(reservation_id__in=reservation_ids)
+    if rooms is not None:
+        nights = nights.filter(room_id__in=rooms)
+    nights.delete()
+
+
+def rebook_nights(reservation: Reservation):
+    """
+    Moves nights booked by reservation to its current dates.
+    """
+    release_nights([reservation.pk])
+    book_nights(
+        (reservation.pk, number, reservation.date_from, reservation.date_to)
+        for number in Reservation.rooms.through.objects.filter(
+            reservation=reservation).values_list('room_id', flat=True))
+
+
+def retire_rooms(numbers: Iterable[str]) -> list[str]:
+    """
+    Deletes given rooms (numbers) with their past bookings, checking all of
+    them with a single query. Raises RoomDeleteError naming rooms booked
+    for tonight or later, in which case no room is deleted. Returns sorted
+    numbers of deleted rooms.
+    """
+    numbers = set(numbers)
+    with transaction.atomic():
+        # rooms are locked as when booking (see hotel/serializers.py), so
+        # that they cannot be booked between the check and deleting them
+        rooms = list(Room.objects.select_for_update().filter(
+            number__in=numbers).order_by('number'))
+        booked = list(RoomNight.objects.filter(
+            room_id__in=numbers, night__gte=date.today()).order_by(
+            'room_id').values_list('room_id', flat=True).distinct())
+        if booked:
+            raise RoomDeleteError({
+                'detail': RoomDeleteError.default_detail, 'rooms': booked})
+        Room.objects.filter(number__in=numbers).delete()
+    return [room.number for room in rooms]
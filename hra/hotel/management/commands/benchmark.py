@@ -0,0 +1,323 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.test import APIClient
+
+from hotel.inventory import book_nights
+from hotel.models import Reservation, Room, RoomClass
+from hotel.occupancy import occupancy_index
+
+BATCH_SIZE = 10000
+# how much slower (in percents) a measurement may be than in baseline report
+# before it's reported as regression
+REGRESSION_THRESHOLD = 20
+# smaller slowdowns (in milliseconds) are within noise of measurements
+MIN_REGRESSION_MS = 1
+
+
+class Command(BaseCommand):
+    help = ('Measures latency of reservation searches, availability checks '
+            'and booking throughput on a synthetic hotel. Data is generated '
+            'in a throwaway test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reservations', type=int, default=100000,
+            help='Number of generated reservations.')
+        parser.add_argument(
+            '--rooms', type=int, default=1000,
+            help='Number of generated rooms.')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='How many times each request is measured.')
+        parser.add_argument(
+            '--bookings', type=int, default=200,
+            help='Number of reservations created to measure throughput.')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed of random data generator.')
+        parser.add_argument(
+            '--output', help='Save report (JSON) to given file.')
+        parser.add_argument(
+            '--compare',
+            help='Compare results with report saved earlier and fail if any '
+                 'measurement regressed.')
+        parser.add_argument(
+            '--threshold', type=float, default=REGRESSION_THRESHOLD,
+            help='Allowed slowdown (in percents) against compared report.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+        random.seed(options['seed'])
+        self.results = {}
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True)
+        # requests are throttled (and pay for it), but never rejected
+        unlimited = override_settings(REST_FRAMEWORK=dict(
+            settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={
+                scope: '1000000/s' for scope in
+                settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']}))
+        unlimited.enable()
+        try:
+            self._seed(options['rooms'], options['reservations'])
+            self.client = APIClient()
+            self.client.force_authenticate(self.staff)
+            self.stdout.write('{:<20} {:>10} {:>10} {:>8}'.format(
+                'measurement', 'median ms', 'p95 ms', 'queries'))
+            self._measure_searches(options['repeat'])
+            self._measure_availability(options['repeat'])
+            self._measure_bookings(options['bookings'])
+        finally:
+            unlimited.disable()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        report = {
+            'parameters': {
+                name: options[name] for name in [
+                    'reservations', 'rooms', 'repeat', 'bookings', 'seed']},
+            'environment': _environment(),
+            'results': self.results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if baseline is not None:
+            self._compare(baseline, report, options['threshold'])
+
+    def _seed(self, rooms_count, reservations_count):
+        started = time.perf_counter()
+        room_classes = list(RoomClass.objects.all())
+        rooms = Room.objects.bulk_create([
+            Room(number=str(n), room_class=random.choice(room_classes))
+            for n in range(rooms_count)])
+        self.owners = User.objects.bulk_create([
+            User(username='user{}'.format(n), last_name='Guest{}'.format(n))
+            for n in range(100)])
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        self.start = date.today() - timedelta(365)
+        # every room gets consecutive, non-overlapping reservations
+        next_free = {room.number: self.start for room in rooms}
+        through = Reservation.rooms.through
+        created = 0
+        while created < reservations_count:
+            batch = []
+            batch_rooms = []
+            for _ in range(min(BATCH_SIZE, reservations_count - created)):
+                room = random.choice(rooms)
+                date_from = next_free[room.number] + \
+                    timedelta(random.randint(0, 3))
+                date_to = date_from + timedelta(random.randint(1, 7))
+                next_free[room.number] = date_to
+                reservation = Reservation(
+                    date_from=date_from,
+                    date_to=date_to,
+                    # few guests have rare name, to measure selective search
+                    name=RARE_NAME if (created + len(batch)) % 100000 == 0
+                    else random.choice(NAMES),
+                    owner=random.choice(self.owners))
+                reservation.set_duration()
+                # there are no rates, so rooms cost their classes' prices
+                reservation.total_cost = \
+                    room.room_class.price * reservation.duration
+                batch.append(reservation)
+                batch_rooms.append(room)
+            Reservation.objects.bulk_create(batch)
+            through.objects.bulk_create([
+                through(
+                    reservation_id=reservation.pk,
+                    room_id=room.number,
+                    cost=reservation.total_cost)
+                for reservation, room in zip(batch, batch_rooms)])
+            book_nights(
+                (reservation.pk, room.number,
+                 reservation.date_from, reservation.date_to)
+                for reservation, room in zip(batch, batch_rooms))
+            created += len(batch)
+        self.rooms = rooms
+        self.next_free = next_free
+        self.stdout.write(
+            'Generated {} reservations of {} rooms in {:.1f} s'.format(
+                reservations_count, rooms_count,
+                time.perf_counter() - started))
+
+    def _measure_searches(self, repeat):
+        day = self.start + timedelta(30)
+        searches = {
+            'list': {},
+            'date': {'date': day},
+            'date_from': {'date_from': day},
+            'date_to': {'date_to': day},
+            'duration': {'duration': 3},
+            # no reservation is that long; without index on duration all
+            # reservations would be walked in list order looking for a page
+            'duration_none': {'duration': 14},
+            'room_number': {'room_number': self.rooms[0].number},
+            'name': {'name': NAMES[0][1:4]},
+            'name_rare': {'name': RARE_NAME[:5]},
+            'name_prefix': {'name': NAMES[0][:3], 'name_match': 'prefix'},
+            'name_fuzzy': {'name': NAMES[0] + 'e', 'name_match': 'fuzzy'},
+            'all': {'date': day, 'duration': 3, 'name': NAMES[0][1:4]},
+        }
+        for search, params in searches.items():
+            self._measure(
+                'search_' + search, repeat,
+                lambda: self.client.get('/reservations/', params))
+        self._measure(
+            'ranked_search', repeat, lambda: self.client.get(
+                '/reservations/search/', {'name': NAMES[0]}))
+        reservation = Reservation.objects.order_by('pk')[
+            Reservation.objects.count() // 2]
+        self._measure(
+            'retrieve', repeat, lambda: self.client.get(
+                '/reservations/{}/'.format(reservation.pk)))
+
+    def _measure_availability(self, repeat):
+        day = self.start + timedelta(360)
+
+        def check():
+            return self.client.get('/rooms/available/', {
+                'date_from': day, 'date_to': day + timedelta(7)})
+
+        def cold_check():
+            # occupancy index is loaded from the database by the check
+            occupancy_index.invalidate()
+            return check()
+        self._measure('availability_cold', repeat, cold_check)
+        self._measure('availability', repeat, check)
+
+    def _measure_bookings(self, bookings):
+        # bookings are made after all generated reservations, in turn in
+        # every room, so they never collide
+        day = max(self.next_free.values()) + timedelta(1)
+        owner = self.owners[0]
+        client = APIClient()
+        client.force_authenticate(owner)
+
+        def book():
+            n = next(counter)
+            room = self.rooms[n % len(self.rooms)]
+            date_from = day + timedelta(2 * (n // len(self.rooms)))
+            return client.post('/reservations/', {
+                'date_from': date_from,
+                'date_to': date_from + timedelta(2),
+                'name': owner.last_name,
+                'rooms': [room.number]}, format='json')
+        counter = iter(range(bookings))
+        started = time.perf_counter()
+        self._measure('booking', bookings, book, status_code=201)
+        self.results['booking']['per_second'] = round(
+            bookings / (time.perf_counter() - started), 1)
+        self.stdout.write('{:<20} {:>10.1f} per second'.format(
+            'booking throughput', self.results['booking']['per_second']))
+
+    def _measure(self, name, repeat, request, status_code=200):
+        """
+        Makes request given number of times and records median and 95th
+        percentile of latency and number of queries (of the last request).
+        """
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request()
+                timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == status_code, response.data
+        timings.sort()
+        self.results[name] = {
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[max(int(len(timings) * 0.95) - 1, 0)], 3),
+            'queries': len(queries),
+        }
+        self.stdout.write('{:<20} {:>10.2f} {:>10.2f} {:>8}'.format(
+            name, self.results[name]['median_ms'],
+            self.results[name]['p95_ms'], len(queries)))
+
+    def _compare(self, baseline, report, threshold):
+        if baseline['parameters'] != report['parameters']:
+            self.stderr.write(
+                'Compared report was made with different parameters: '
+                '{}'.format(baseline['parameters']))
+        self.stdout.write('\nCompared with {}:'.format(
+            baseline['environment'].get('commit') or 'baseline'))
+        self.stdout.write('{:<20} {:>12} {:>12} {:>8} {:>8}'.format(
+            'measurement', 'baseline ms', 'median ms', 'change', 'queries'))
+        regressions = compare_reports(baseline, report, threshold)
+        for name, result in report['results'].items():
+            old = baseline['results'].get(name)
+            if old is None:
+                continue
+            self.stdout.write(
+                '{:<20} {:>12.2f} {:>12.2f} {:>+7.0f}% {:>3} -> {:<3}{}'
+                .format(
+                    name, old['median_ms'], result['median_ms'],
+                    _change(old['median_ms'], result['median_ms']),
+                    old['queries'], result['queries'],
+                    ' REGRESSION' if name in regressions else ''))
+        if regressions:
+            raise CommandError('Regressions: {}'.format(
+                ', '.join(regressions)))
+
+
+def compare_reports(baseline, report, threshold=REGRESSION_THRESHOLD):
+    """
+    Returns names of measurements whose median latency grew more than
+    `threshold` percent (and at least `MIN_REGRESSION_MS`) or which make
+    more queries than in baseline report.
+    """
+    regressions = []
+    for name, result in report['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        slower = result['median_ms'] - old['median_ms'] >= \
+            MIN_REGRESSION_MS and \
+            _change(old['median_ms'], result['median_ms']) > threshold
+        if slower or result['queries'] > old['queries']:
+            regressions.append(name)
+    return regressions
+
+
+def _change(old, new):
+    return (new - old) / old * 100 if old else 0
+
+
+def _environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+RARE_NAME = 'Quirke'
+NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller',
+    'Davis', 'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Gonzalez',
+    'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+]
@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from hotel import rollups
+
+
+class Command(BaseCommand):
+    help = ('Recomputes daily occupancy rollups from reservations. Rollups '
+            'are otherwise updated when reservations change.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help='Recompute nights starting on or after given date '
+                 '(YYYY-MM-DD, first reservation by default).')
+        parser.add_argument(
+            '--until', type=date.fromisoformat,
+            help='Recompute nights before given date (YYYY-MM-DD, end of '
+                 'last reservation by default).')
+
+    def handle(self, *args, **options):
+        nights = rollups.rebuild(options['since'], options['until'])
+        self.stdout.write('Recomputed rollups of {} nights.'.format(nights))
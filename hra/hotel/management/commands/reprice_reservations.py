@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hotel import rollups
+from hotel.models import Reservation, ReservationRoom
+
+
+class Command(BaseCommand):
+    help = ('Prices rooms of reservations at current rates and recomputes '
+            'total costs of reservations. Costs are otherwise fixed when '
+            'reservations are booked.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', type=date.fromisoformat, default=date.today(),
+            help='Reprice reservations starting on or after given date '
+                 '(YYYY-MM-DD, today by default).')
+        parser.add_argument(
+            '--room-class', action='append', dest='room_classes',
+            help='Reprice only reservations of rooms of given class '
+                 '(can be given many times).')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many reservations would be repriced.')
+
+    def handle(self, *args, **options):
+        reservations = Reservation.objects.filter(
+            date_from__gte=options['since'])
+        if options['room_classes']:
+            reservations = reservations.filter(
+                pk__in=ReservationRoom.objects.filter(
+                    room__room_class__in=options['room_classes']).values(
+                    'reservation'))
+        if options['dry_run']:
+            self.stdout.write('{} reservations would be repriced.'.format(
+                reservations.count()))
+            return
+        with transaction.atomic():
+            count = reservations.update_total_costs(reprice=True)
+            rollups.reservations_changed(reservations)
+        self.stdout.write('Repriced {} reservations.'.format(count))
@@ -0,0 +1,370 @@
+"""
+Request metrics: latency, number of database queries and time spent in the
+database, per view action (e.g. `ReservationViewSet.list`).
+"""
+import hmac
+import logging
+import time
+from contextvars import ContextVar
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+# histograms of requests: name -> (description, buckets)
+HISTOGRAMS = {
+    'hotel_request_duration_seconds': (
+        'Time of handling requests.', DURATION_BUCKETS),
+    'hotel_request_db_queries': (
+        'Number of database queries made by requests.', QUERY_COUNT_BUCKETS),
+    'hotel_request_db_duration_seconds': (
+        'Time spent by requests in the database.', DURATION_BUCKETS),
+}
+# totals of all workers, increased atomically by each of them: histogram
+# buckets and sums (list index) and request counts (status) of views
+METRIC_KEY = 'hotel:metrics:{}:{}:{}'
+REQUESTS_TOTAL = 'hotel_requests_total'
+# sums are kept as integers (e.g. microseconds), to be increased atomically
+SUM_SCALE = 10 ** 6
+# (view, status) pairs seen by any worker: number of them, each of them by
+# number and whether a pair has been registered
+SERIES_COUNT_KEY = 'hotel:metrics:series'
+SERIES_KEY = 'hotel:metrics:series:{}'
+SERIES_REGISTERED_KEY = 'hotel:metrics:registered:{}:{}'
+# how many slowest queries are logged for slow requests
+SLOW_REQUEST_QUERIES = 5
+
+_current = ContextVar('hotel_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Measurements of a single request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = None
+        # (duration, SQL) of every query
+        self.queries = []
+        self.db_duration = 0.0
+
+    def query(self, sql: str, duration: float):
+        self.queries.append((duration, sql))
+        self.db_duration += duration
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper (installed on every connection, see
+    hotel/signals.py) measuring queries of requests.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.query(sql, time.perf_counter() - started)
+
+
+def view_name(request) -> str:
+    """
+    Returns name of view action handling request: `<viewset>.<action>` for
+    viewsets, `<view>.<method>` for other class based views and
+    `<module>.<function>` for function views.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = match.func
+    cls = getattr(view, 'cls', getattr(view, 'view_class', None))
+    method = request.method.lower()
+    if cls is None:
+        return '{}.{}'.format(view.__module__.rsplit('.', 1)[-1],
+                              view.__name__)
+    actions = getattr(view, 'actions', None) or {}
+    return '{}.{}'.format(cls.__name__, actions.get(method, method))
+
+
+class MetricsRegistry:
+    """
+    Metrics of requests handled by this process since they were last
+    published.
+
+    Every `HOTEL_METRICS_PUBLISH_INTERVAL` seconds, after a response is
+    sent (and when a gunicorn worker exits), they're added to totals in the
+    default cache with atomic increments, so totals of all workers sharing
+    the cache, including stopped ones, can be exposed by any of them.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._published = time.monotonic()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            # (view, status) pairs registered by this process
+            self._registered = set()
+            # histogram -> view -> bucket counts (with +Inf), sum
+            self._histograms = {name: {} for name in HISTOGRAMS}
+            # (view, status) -> count
+            self._requests = {}
+
+    def observe(self, view: str, status: int, metrics: RequestMetrics):
+        values = (
+            metrics.duration, len(metrics.queries), metrics.db_duration)
+        with self._lock:
+            for (name, (_, buckets)), value in zip(HISTOGRAMS.items(), values):
+                histogram = self._histograms[name].setdefault(
+                    view, [0] * (len(buckets) + 1) + [0])
+                histogram[_bucket(buckets, value)] += 1
+                histogram[-1] += value
+            key = (view, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'histograms': {
+                    name: {view: list(values)
+                           for view, values in histogram.items()}
+                    for name, histogram in self._histograms.items()},
+                'requests': dict(self._requests),
+            }
+
+    def publish_due(self) -> bool:
+        return time.monotonic() - self._published >= \
+            settings.HOTEL_METRICS_PUBLISH_INTERVAL
+
+    def publish(self):
+        """
+        Adds metrics of this process to the totals and clears them.
+        """
+        self._published = time.monotonic()
+        with self._lock:
+            histograms, requests = self._histograms, self._requests
+            self._histograms = {name: {} for name in HISTOGRAMS}
+            self._requests = {}
+        for view, status in requests:
+            self._register(view, status)
+        deltas = {}
+        for name, histogram in histograms.items():
+            for view, values in histogram.items():
+                values[-1] = round(values[-1] * SUM_SCALE)
+                for i, value in enumerate(values):
+                    if value:
+                        deltas[METRIC_KEY.format(name, view, i)] = value
+        for (view, status), count in requests.items():
+            deltas[METRIC_KEY.format(REQUESTS_TOTAL, view, status)] = count
+        _increase_many(deltas)
+
+    def collect(self) -> dict:
+        """
+        Returns totals of all workers (in the format of `snapshot`), with
+        current metrics of this process.
+        """
+        self.publish()
+        count = cache.get(SERIES_COUNT_KEY, 0)
+        series = list(cache.get_many(
+            [SERIES_KEY.format(n) for n in range(1, count + 1)]).values())
+        views = sorted({view for view, _ in series})
+        keys = [
+            METRIC_KEY.format(name, view, i)
+            for name, (_, buckets) in HISTOGRAMS.items() for view in views
+            for i in range(len(buckets) + 2)]
+        keys += [METRIC_KEY.format(REQUESTS_TOTAL, view, status)
+                 for view, status in series]
+        totals = cache.get_many(keys)
+        histograms = {name: {} for name in HISTOGRAMS}
+        for name, (_, buckets) in HISTOGRAMS.items():
+            for view in views:
+                values = [
+                    totals.get(METRIC_KEY.format(name, view, i), 0)
+                    for i in range(len(buckets) + 2)]
+                if any(values):
+                    values[-1] /= SUM_SCALE
+                    histograms[name][view] = values
+        return {
+            'histograms': histograms,
+            'requests': {
+                (view, status): totals.get(
+                    METRIC_KEY.format(REQUESTS_TOTAL, view, status), 0)
+                for view, status in series},
+        }
+
+    def _register(self, view, status):
+        """
+        Adds (view, status) pair to the series collected by all workers.
+        """
+        if (view, status) in self._registered:
+            return
+        # only the first worker to add the marker adds the series
+        if cache.add(SERIES_REGISTERED_KEY.format(view, status), True, None):
+            count = _increase(SERIES_COUNT_KEY, 1)
+            cache.set(SERIES_KEY.format(count), (view, status), None)
+        self._registered.add((view, status))
+
+
+def _bucket(buckets, value) -> int:
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            return i
+    return len(buckets)
+
+
+def _increase(key, delta) -> int:
+    """
+    Atomically increases counter in the cache, creating it if needed.
+    """
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # counters never expire; if two workers create it, one add fails
+        cache.add(key, 0, None)
+        return cache.incr(key, delta)
+
+
+def _increase_many(deltas: dict):
+    """
+    Atomically increases counters in the cache, creating them if needed;
+    with Redis, all of them in a single round trip.
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if not isinstance(backend, RedisCache):
+        for key, delta in deltas.items():
+            _increase(key, delta)
+        return
+    # Redis creates missing counters, without expiration; integers are
+    # stored as they are, so cache reads them back
+    pipeline = backend._cache.get_client(write=True).pipeline(
+        transaction=False)
+    for key, delta in deltas.items():
+        pipeline.incrby(backend.make_and_validate_key(key), delta)
+    pipeline.execute()
+
+
+request_metrics = MetricsRegistry()
+
+
+def publish_if_due():
+    """
+    Publishes metrics of this process if it's time to. Called when a
+    response has been sent (see hotel/signals.py), so that clients don't
+    wait for it.
+    """
+    if request_metrics.publish_due():
+        request_metrics.publish()
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures requests: adds `Server-Timing` header with time spent in the
+    database and total time of handling the request, records metrics and
+    logs requests slower than `HOTEL_SLOW_REQUEST_SECONDS` with their
+    slowest queries. Time of streaming response content is not included.
+
+    It should be the first middleware, to measure all the others as well.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, metrics)
+        return response
+
+    def _finish(self, request, response, metrics):
+        metrics.finish()
+        view = view_name(request)
+        request_metrics.observe(view, response.status_code, metrics)
+        response['Server-Timing'] = \
+            'db;dur={:.1f};desc="{} queries", total;dur={:.1f}'.format(
+                metrics.db_duration * 1000, len(metrics.queries),
+                metrics.duration * 1000)
+        if metrics.duration >= settings.HOTEL_SLOW_REQUEST_SECONDS:
+            slowest = sorted(metrics.queries, reverse=True)[
+                :SLOW_REQUEST_QUERIES]
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries, %.0f ms in '
+                'database; slowest queries:%s',
+                request.method, request.path, view, metrics.duration * 1000,
+                len(metrics.queries), metrics.db_duration * 1000,
+                ''.join('\n  {:.1f} ms: {}'.format(duration * 1000, sql)
+                        for duration, sql in slowest))
+
+
+def prometheus_metrics(request):
+    """
+    Exposes metrics of all workers in Prometheus text format, to requests
+    with `HOTEL_METRICS_TOKEN` bearer token (to anyone in debug mode, if
+    there is no token).
+    """
+    token = settings.HOTEL_METRICS_TOKEN
+    if token:
+        given = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(given.encode(),
+                                   'Bearer {}'.format(token).encode()):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+    totals = request_metrics.collect()
+    lines = []
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines += [
+            '# HELP {} {}'.format(name, description),
+            '# TYPE {} histogram'.format(name)]
+        for view, values in sorted(totals['histograms'][name].items()):
+            count = 0
+            for bound, bucket_count in zip(
+                    [str(b) for b in buckets] + ['+Inf'], values):
+                count += bucket_count
+                lines.append('{}_bucket{{view="{}",le="{}"}} {}'.format(
+                    name, view, bound, count))
+            lines += [
+                '{}_sum{{view="{}"}} {}'.format(name, view, values[-1]),
+                '{}_count{{view="{}"}} {}'.format(name, view, count)]
+    lines += [
+        '# HELP hotel_requests_total Number of handled requests.',
+        '# TYPE hotel_requests_total counter']
+    for (view, status), count in sorted(totals['requests'].items()):
+        lines.append('hotel_requests_total{{view="{}",status="{}"}} {}'.format(
+            view, status, count))
+    return HttpResponse(
+        '\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4')
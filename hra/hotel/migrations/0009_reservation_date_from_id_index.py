@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0008_auto_20210727_1259'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['date_from', 'id'], name='reservation_date_from_id'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+
+def set_durations(apps, schema_editor):
+    Reservation = apps.get_model('hotel', 'Reservation')
+    reservations = []
+    for reservation in Reservation.objects.only(
+            'date_from', 'date_to').iterator(chunk_size=1000):
+        reservation.duration = (
+            reservation.date_to - reservation.date_from).days
+        reservations.append(reservation)
+        if len(reservations) == 1000:
+            Reservation.objects.bulk_update(reservations, ['duration'])
+            reservations = []
+    Reservation.objects.bulk_update(reservations, ['duration'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0009_reservation_date_from_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='duration',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='duration of reservation in days'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_durations, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['owner', 'date_from', 'id'], name='reservation_owner_date_from'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['date_to', 'date_from', 'id'], name='reservation_date_to_from'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['duration', 'date_from', 'id'], name='reservation_duration'),
+        ),
+    ]
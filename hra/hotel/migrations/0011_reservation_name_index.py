@@ -0,0 +1,80 @@
+from django.db import migrations
+
+SQLITE_CREATE = [
+    # FTS5 table with trigram tokenizer indexing names of reservations
+    # (hotel/search.py), kept in sync by triggers
+    """
+    CREATE VIRTUAL TABLE hotel_reservation_name USING fts5(
+        name,
+        content='hotel_reservation',
+        content_rowid='id',
+        tokenize='trigram')
+    """,
+    """
+    CREATE TRIGGER hotel_reservation_name_insert
+    AFTER INSERT ON hotel_reservation BEGIN
+        INSERT INTO hotel_reservation_name(rowid, name)
+        VALUES (new.id, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER hotel_reservation_name_delete
+    AFTER DELETE ON hotel_reservation BEGIN
+        INSERT INTO hotel_reservation_name(hotel_reservation_name, rowid, name)
+        VALUES ('delete', old.id, old.name);
+    END
+    """,
+    """
+    CREATE TRIGGER hotel_reservation_name_update
+    AFTER UPDATE OF name ON hotel_reservation BEGIN
+        INSERT INTO hotel_reservation_name(hotel_reservation_name, rowid, name)
+        VALUES ('delete', old.id, old.name);
+        INSERT INTO hotel_reservation_name(rowid, name)
+        VALUES (new.id, new.name);
+    END
+    """,
+    """
+    INSERT INTO hotel_reservation_name(hotel_reservation_name)
+    VALUES ('rebuild')
+    """,
+]
+SQLITE_DROP = [
+    'DROP TRIGGER hotel_reservation_name_insert',
+    'DROP TRIGGER hotel_reservation_name_delete',
+    'DROP TRIGGER hotel_reservation_name_update',
+    'DROP TABLE hotel_reservation_name',
+]
+POSTGRESQL_CREATE = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    """
+    CREATE INDEX hotel_reservation_name_trgm
+    ON hotel_reservation USING gin (name gin_trgm_ops)
+    """,
+]
+POSTGRESQL_DROP = [
+    'DROP INDEX hotel_reservation_name_trgm',
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0010_reservation_duration_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({
+                'sqlite': SQLITE_CREATE,
+                'postgresql': POSTGRESQL_CREATE}),
+            run_for_vendor({
+                'sqlite': SQLITE_DROP,
+                'postgresql': POSTGRESQL_DROP})),
+    ]
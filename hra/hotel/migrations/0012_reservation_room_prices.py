@@ -0,0 +1,77 @@
+from decimal import Decimal
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+name_index = import_module('hotel.migrations.0011_reservation_name_index')
+
+
+def price_reservations(apps, schema_editor):
+    Reservation = apps.get_model('hotel', 'Reservation')
+    ReservationRoom = apps.get_model('hotel', 'ReservationRoom')
+    Room = apps.get_model('hotel', 'Room')
+    # existing reservations are priced at current prices of room classes
+    ReservationRoom.objects.update(price=models.Subquery(
+        Room.objects.filter(number=models.OuterRef('room_id')).values(
+            'room_class__price')[:1]))
+    daily_cost = ReservationRoom.objects.filter(
+        reservation=models.OuterRef('pk')).values('reservation').annotate(
+        cost=models.Sum('price')).values('cost')
+    Reservation.objects.update(total_cost=models.ExpressionWrapper(
+        Coalesce(
+            models.Subquery(daily_cost), models.Value(Decimal('0'))) *
+        models.F('duration'),
+        output_field=models.DecimalField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0011_reservation_name_index'),
+    ]
+
+    operations = [
+        # table of many-to-many relation is kept, only its model is declared
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ReservationRoom',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hotel.reservation')),
+                        ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hotel.room')),
+                    ],
+                    options={
+                        'db_table': 'hotel_reservation_rooms',
+                        'unique_together': {('reservation', 'room')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='reservation',
+                    name='rooms',
+                    field=models.ManyToManyField(related_name='reservations', through='hotel.ReservationRoom', to='hotel.room'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reservationroom',
+            name='price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=7, null=True, verbose_name="room's price for one day at the time of booking"),
+        ),
+        # SQLite rebuilds reservations table to add a column, which drops
+        # triggers of the name index, so the index is recreated afterwards
+        migrations.RunPython(
+            name_index.run_for_vendor({'sqlite': name_index.SQLITE_DROP}),
+            name_index.run_for_vendor({'sqlite': name_index.SQLITE_CREATE})),
+        migrations.AddField(
+            model_name='reservation',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=12, verbose_name='total cost of reservation'),
+        ),
+        migrations.RunPython(
+            name_index.run_for_vendor({'sqlite': name_index.SQLITE_CREATE}),
+            name_index.run_for_vendor({'sqlite': name_index.SQLITE_DROP})),
+        migrations.RunPython(price_reservations, migrations.RunPython.noop),
+    ]
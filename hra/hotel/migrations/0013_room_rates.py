@@ -0,0 +1,60 @@
+import django.core.validators
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def multiply_by_duration(apps, schema_editor):
+    Reservation = apps.get_model('hotel', 'Reservation')
+    ReservationRoom = apps.get_model('hotel', 'ReservationRoom')
+    # daily prices of rooms become costs of rooms for whole reservations
+    ReservationRoom.objects.update(cost=models.F('cost') * models.Subquery(
+        Reservation.objects.filter(pk=models.OuterRef('reservation_id')).values(
+            'duration')[:1]))
+
+
+def divide_by_duration(apps, schema_editor):
+    Reservation = apps.get_model('hotel', 'Reservation')
+    ReservationRoom = apps.get_model('hotel', 'ReservationRoom')
+    ReservationRoom.objects.exclude(reservation__duration=0).update(
+        cost=models.F('cost') / models.Subquery(
+            Reservation.objects.filter(
+                pk=models.OuterRef('reservation_id')).values(
+                'duration')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0012_reservation_room_prices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_from', models.DateField(verbose_name='first night of the rate')),
+                ('date_to', models.DateField(verbose_name='day after the last night of the rate')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=7, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))], verbose_name="room's price for one night")),
+                ('weekdays', models.PositiveSmallIntegerField(default=127, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(127)], verbose_name='days of week the rate applies to')),
+                ('priority', models.IntegerField(default=0, verbose_name='priority over overlapping rates')),
+                ('room_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rates', to='hotel.roomclass')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room_class', 'date_from'], name='room_rate_class_date_from')],
+            },
+        ),
+        migrations.RenameField(
+            model_name='reservationroom',
+            old_name='price',
+            new_name='cost',
+        ),
+        migrations.AlterField(
+            model_name='reservationroom',
+            name='cost',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='cost of the room for the whole reservation'),
+        ),
+        migrations.RunPython(multiply_by_duration, divide_by_duration),
+    ]
@@ -0,0 +1,27 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0013_room_rates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='night')),
+                ('rooms_sold', models.PositiveIntegerField(default=0, verbose_name='number of rooms sold')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14, verbose_name='revenue from rooms sold')),
+                ('room_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='hotel.roomclass')),
+            ],
+            options={
+                'unique_together': {('day', 'room_class')},
+            },
+        ),
+    ]
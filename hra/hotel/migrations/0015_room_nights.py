@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# how many nights are saved with a single query
+BATCH_SIZE = 1000
+
+
+def book_nights(apps, schema_editor):
+    ReservationRoom = apps.get_model('hotel', 'ReservationRoom')
+    RoomNight = apps.get_model('hotel', 'RoomNight')
+    bookings = ReservationRoom.objects.values_list(
+        'reservation_id', 'room_id',
+        'reservation__date_from', 'reservation__date_to').order_by(
+        'reservation_id')
+    nights = []
+    for reservation_id, room_id, date_from, date_to in bookings.iterator():
+        nights += [
+            RoomNight(
+                reservation_id=reservation_id,
+                room_id=room_id,
+                night=date_from + timedelta(n))
+            for n in range((date_to - date_from).days)]
+        if len(nights) >= BATCH_SIZE:
+            # nights double booked before the constraint existed stay with
+            # the reservation saved first
+            RoomNight.objects.bulk_create(nights, ignore_conflicts=True)
+            nights = []
+    RoomNight.objects.bulk_create(nights, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0014_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField(verbose_name='night')),
+                ('reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nights', to='hotel.reservation')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nights', to='hotel.room')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room', 'night'), name='room_night_booked_once')],
+            },
+        ),
+        migrations.RunPython(book_nights, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
 from decimal import Decimal
 
-from django.core.validators import MinValueValidator, RegexValidator
+from django.core.validators import (MaxValueValidator, MinValueValidator,
+                                    RegexValidator)
 from django.db import models
 
+# bit mask of all days of week, Monday being the lowest bit
+ALL_WEEKDAYS = 0b1111111
+
 
 class RoomClass(models.Model):
     room_class = models.CharField(
@@ -12,6 +16,7 @@ class RoomClass(models.Model):
         max_length=1,
         validators=[
             RegexValidator('[A-Z]')])
+    # applies to nights that are not covered by any rate
     price = models.DecimalField(
         "room's class' price for one day",
         decimal_places=2,
@@ -30,6 +35,79 @@ class Room(models.Model):
     room_class = models.ForeignKey(
         RoomClass, on_delete=models.CASCADE, related_name='rooms+')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        room = super().from_db(db, field_names, values)
+        # class that nights of the room are counted in
+        room._saved_room_class_id = room.__dict__.get('room_class_id')
+        return room
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_room_class_id = self.room_class_id
+
+    def room_class_changed(self) -> bool:
+        """
+        Checks if room was moved to another class since it was saved (or
+        loaded). Valid in signals sent when room is saved.
+        """
+        return getattr(self, '_saved_room_class_id', None) != \
+            self.room_class_id
+
+
+class RoomRate(models.Model):
+    """
+    Price of a night in rooms of given class within given period (end date
+    excluded), e.g. a season, weekends or an event. Rate can apply only to
+    nights starting on some days of week. Where rates overlap, the one with
+    higher priority applies (the latest one, if priorities are equal).
+    """
+    room_class = models.ForeignKey(
+        RoomClass, on_delete=models.CASCADE, related_name='rates')
+    date_from = models.DateField('first night of the rate')
+    date_to = models.DateField('day after the last night of the rate')
+    price = models.DecimalField(
+        "room's price for one night",
+        decimal_places=2,
+        max_digits=7,
+        validators=[
+            MinValueValidator(
+                Decimal('0.00'))])
+    # bit mask of days of week, Monday being the lowest bit
+    weekdays = models.PositiveSmallIntegerField(
+        'days of week the rate applies to',
+        default=ALL_WEEKDAYS,
+        validators=[
+            MinValueValidator(1),
+            MaxValueValidator(ALL_WEEKDAYS)])
+    priority = models.IntegerField(
+        'priority over overlapping rates', default=0)
+
+    class Meta:
+        indexes = [
+            # rates of room class are loaded at once (see hotel/pricing.py)
+            models.Index(
+                fields=['room_class', 'date_from'],
+                name='room_rate_class_date_from')]
+
+
+class ReservationQuerySet(models.QuerySet):
+    def for_serialization(self):
+        """
+        Loads owners and rooms of reservations, so that serializing any
+        number of reservations takes a constant number of queries.
+        """
+        return self.select_related('owner').prefetch_related('rooms')
+
+    def update_total_costs(self, reprice: bool = False) -> int:
+        """
+        Stores total costs of reservations computed from costs of their
+        rooms. Rooms that are not priced yet (or all rooms, if `reprice` is
+        set) are priced at current rates first (see hotel/pricing.py).
+        """
+        from hotel.pricing import price_reservations
+        return price_reservations(self, reprice)
+
 
 class Reservation(models.Model):
     date_from = models.DateField('start date of reservation')
@@ -39,17 +117,143 @@ class Reservation(models.Model):
     rooms = models.ManyToManyField(
         Room,
         # symmetrical=False,
+        through='ReservationRoom',
         related_name='reservations')
     owner = models.ForeignKey(
         'auth.User',
         related_name='reservations',
         on_delete=models.CASCADE)
+    # stored, so that reservations can be searched by duration using index
+    duration = models.PositiveIntegerField(
+        'duration of reservation in days', editable=False)
+    # computed from rates at the time of booking, so that changes of rates
+    # do not change costs of existing reservations
+    total_cost = models.DecimalField(
+        'total cost of reservation',
+        decimal_places=2,
+        max_digits=12,
+        default=Decimal('0'),
+        editable=False)
+
+    objects = ReservationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # ordering of paginated reservations list
+            models.Index(
+                fields=['date_from', 'id'],
+                name='reservation_date_from_id'),
+            # ordering of paginated list of user's reservations
+            models.Index(
+                fields=['owner', 'date_from', 'id'],
+                name='reservation_owner_date_from'),
+            # searching by end date or by duration, with list ordering
+            models.Index(
+                fields=['date_to', 'date_from', 'id'],
+                name='reservation_date_to_from'),
+            models.Index(
+                fields=['duration', 'date_from', 'id'],
+                name='reservation_duration')]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        reservation = super().from_db(db, field_names, values)
+        # dates that costs of rooms were computed for
+        reservation._priced_dates = (
+            reservation.__dict__.get('date_from'),
+            reservation.__dict__.get('date_to'))
+        return reservation
+
+    def save(self, *args, **kwargs):
+        self.set_duration()
+        update_fields = kwargs.get('update_fields')
+        dates_saved = update_fields is None or \
+            bool({'date_from', 'date_to'} & set(update_fields))
+        if update_fields is not None and dates_saved:
+            kwargs['update_fields'] = {*update_fields, 'duration'}
+        reprice = dates_saved and not self._state.adding and \
+            self.dates_changed()
+        super().save(*args, **kwargs)
+        if reprice:
+            # rooms are priced after they're added (see signals), but
+            # changing dates changes costs of all rooms
+            Reservation.objects.filter(pk=self.pk).update_total_costs(
+                reprice=True)
+            self.refresh_from_db(fields=['total_cost'])
+        if dates_saved:
+            self._priced_dates = (self.date_from, self.date_to)
 
-    @property
-    def total_cost(self):
-        return sum(
-            r.room_class.price for r in self.rooms.iterator()) * self.duration
+    def set_duration(self):
+        """
+        Updates stored duration from reservation dates. Has to be called
+        explicitly when reservations are saved in bulk.
+        """
+        self.duration = (self.date_to - self.date_from).days
+
+    def dates_changed(self) -> bool:
+        """
+        Checks if dates changed since costs of rooms were computed.
+        """
+        return getattr(self, '_priced_dates', None) != (
+            self.date_from, self.date_to)
+
+
+class ReservationRoom(models.Model):
+    """
+    Room booked by reservation, with cost of the room for the whole
+    reservation at the time of booking.
+    """
+    # table was created automatically for many-to-many relation, with
+    # default primary key
+    reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE)
+    room = models.ForeignKey(Room, on_delete=models.CASCADE)
+    # empty until room is priced, just after it's added to reservation
+    cost = models.DecimalField(
+        'cost of the room for the whole reservation',
+        decimal_places=2,
+        max_digits=12,
+        null=True,
+        editable=False)
+
+    class Meta:
+        db_table = 'hotel_reservation_rooms'
+        unique_together = [['reservation', 'room']]
+
+
+class RoomNight(models.Model):
+    """
+    Night of a room booked by reservation. Nights follow rooms and dates of
+    reservations (see hotel/inventory.py), so that the database itself
+    rejects double bookings and checking if a room is free is an index
+    lookup.
+    """
+    room = models.ForeignKey(
+        Room, on_delete=models.CASCADE, related_name='nights')
+    night = models.DateField('night')
+    reservation = models.ForeignKey(
+        Reservation, on_delete=models.CASCADE, related_name='nights')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['room', 'night'], name='room_night_booked_once')]
+
+
+class DailyRollup(models.Model):
+    """
+    Rooms of given class sold for a night and revenue from them, maintained
+    from reservations (see hotel/rollups.py) for occupancy reports. Revenue
+    of a room is spread evenly over nights of reservation.
+    """
+    day = models.DateField('night')
+    room_class = models.ForeignKey(
+        RoomClass, on_delete=models.CASCADE, related_name='rollups')
+    rooms_sold = models.PositiveIntegerField('number of rooms sold', default=0)
+    revenue = models.DecimalField(
+        'revenue from rooms sold',
+        decimal_places=2,
+        max_digits=14,
+        default=Decimal('0'))
 
-    @property
-    def duration(self):
-        return (self.date_to - self.date_from).days
+    class Meta:
+        unique_together = [['day', 'room_class']]
@@ -0,0 +1,155 @@
+from bisect import bisect_left, insort
+from datetime import date
+from threading import RLock
+from typing import Iterable, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+from hotel.models import Reservation, Room
+
+GENERATION_KEY = 'hotel:occupancy:generation'
+
+
+class OccupancyIndex:
+    """
+    In-memory index of room occupancy.
+
+    For every room, index keeps reserved periods as sorted, non-overlapping
+    intervals, so checking if room is free within given period is a binary
+    search instead of a query on reservations.
+
+    Index is loaded lazily and kept up to date by reservation and room
+    signals (see hotel/signals.py). Changes are applied only after
+    transaction commits. Every change also bumps generation counter stored
+    in the cache, so other processes sharing the cache backend rebuild
+    their copy of the index on next use.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._generation = None
+        # room number -> room class
+        self._rooms = None
+        # room number -> sorted list of (date_from, date_to, reservation id)
+        self._intervals = {}
+        # reservation id -> set of room numbers
+        self._reservations = {}
+
+    def available_rooms(
+            self,
+            date_from: date,
+            date_to: date,
+            room_class: Optional[str] = None) -> list[tuple[str, str]]:
+        """
+        Returns (number, room class) pairs of rooms that are free within
+        given period, sorted by room number.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return [
+                (number, number_class)
+                for number, number_class in sorted(self._rooms.items())
+                if (room_class is None or number_class == room_class) and
+                self._is_free(number, date_from, date_to)]
+
+    def invalidate(self):
+        """
+        Drops index, so it's rebuilt from the database on next use.
+        """
+        with self._lock:
+            self._rooms = None
+
+    def reservations_changed(self, reservation_ids: Iterable[int]):
+        reservation_ids = set(reservation_ids)
+        self._on_commit(self._refresh_reservations, reservation_ids)
+
+    def reservation_deleted(self, reservation_id: int):
+        self._on_commit(self._discard_reservation, reservation_id)
+
+    def room_changed(self, number: str, room_class: str):
+        self._on_commit(self._set_room, number, room_class)
+
+    def room_deleted(self, number: str):
+        self._on_commit(self._discard_room, number)
+
+    def _is_free(self, number, date_from, date_to):
+        intervals = self._intervals.get(number, [])
+        # last interval starting before given period ends is the only one
+        # that can overlap it, because intervals do not overlap each other
+        i = bisect_left(intervals, (date_to,))
+        return i == 0 or intervals[i - 1][1] <= date_from
+
+    def _ensure_loaded(self):
+        if self._rooms is None or \
+                cache.get(GENERATION_KEY, 0) != self._generation:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._generation = cache.get(GENERATION_KEY, 0)
+        self._rooms = dict(
+            Room.objects.values_list('number', 'room_class_id').iterator())
+        self._intervals = {}
+        self._reservations = {}
+        self._add_intervals(
+            Reservation.rooms.through.objects.values_list(
+                'room_id',
+                'reservation_id',
+                'reservation__date_from',
+                'reservation__date_to').iterator())
+
+    def _add_intervals(self, rows):
+        for number, reservation_id, date_from, date_to in rows:
+            insort(
+                self._intervals.setdefault(number, []),
+                (date_from, date_to, reservation_id))
+            self._reservations.setdefault(reservation_id, set()).add(number)
+
+    def _on_commit(self, change, *args):
+        def apply():
+            with self._lock:
+                loaded = self._rooms is not None and \
+                    cache.get(GENERATION_KEY, 0) == self._generation
+                generation = self._bump_generation()
+                if loaded and generation == self._generation + 1:
+                    # no other process changed data in the meantime, so
+                    # index can be patched instead of rebuilt
+                    change(*args)
+                    self._generation = generation
+                else:
+                    self._rooms = None
+        transaction.on_commit(apply)
+
+    def _bump_generation(self):
+        try:
+            return cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, 0, timeout=None)
+            return cache.incr(GENERATION_KEY)
+
+    def _refresh_reservations(self, reservation_ids):
+        for reservation_id in reservation_ids:
+            self._discard_reservation(reservation_id)
+        self._add_intervals(
+            Reservation.rooms.through.objects.filter(
+                reservation_id__in=reservation_ids).values_list(
+                'room_id',
+                'reservation_id',
+                'reservation__date_from',
+                'reservation__date_to').iterator())
+
+    def _discard_reservation(self, reservation_id):
+        for number in self._reservations.pop(reservation_id, ()):
+            self._intervals[number] = [
+                i for i in self._intervals[number] if i[2] != reservation_id]
+
+    def _set_room(self, number, room_class):
+        self._rooms[number] = room_class
+
+    def _discard_room(self, number):
+        self._rooms.pop(number, None)
+        for _, _, reservation_id in self._intervals.pop(number, []):
+            self._reservations[reservation_id].discard(number)
+
+
+occupancy_index = OccupancyIndex()
@@ -0,0 +1,120 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       _reverse_ordering)
+
+
+class HotelCursorPagination(CursorPagination):
+    """
+    Keyset pagination, so that fetching any page costs the same as fetching
+    the first one. Ordering has to be on indexed, (together) unique columns.
+
+    DRF positions cursors by the first ordering field only and skips rows
+    sharing its value with an offset. Here cursors hold values of all
+    ordering fields, so a page deep inside rows with the same first value
+    (e.g. reservations starting on the same day) is found with the index as
+    well, and offsets are never needed.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._set_page(
+            list(self._page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async version of `paginate_queryset`, for async views.
+        """
+        queryset = self._page_queryset(queryset, request, view)
+        return self._set_page([obj async for obj in queryset])
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        self._reverse = self.cursor is not None and self.cursor.reverse
+        self._position = self.cursor.position \
+            if self.cursor is not None else None
+        ordering = _reverse_ordering(self.ordering) if self._reverse \
+            else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self._position is not None:
+            try:
+                queryset = queryset.filter(
+                    following(ordering, json.loads(self._position)))
+            except (ValueError, TypeError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        self.page = results[:self.page_size]
+        following_position = self._get_position_from_instance(
+            results[-1], self.ordering) \
+            if len(results) > self.page_size else None
+        if self._reverse:
+            self.page.reverse()
+            self.has_next = self._position is not None
+            self.next_position = self._position
+            self.has_previous = following_position is not None
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.next_position = following_position
+            self.has_previous = self._position is not None
+            self.previous_position = self._position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None:
+            return None
+        # positions are unique, so offsets are not used
+        return Cursor(offset=0, reverse=cursor.reverse,
+                      position=cursor.position)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps([
+            str(instance[field] if isinstance(instance, dict)
+                else getattr(instance, field))
+            for field in (order.lstrip('-') for order in ordering)])
+
+
+def following(ordering, values) -> Q:
+    """
+    Builds condition of rows following given values of ordering fields, e.g.
+    `a > x OR (a = x AND b > y)` for ordering ('a', 'b').
+    """
+    if len(values) != len(ordering):
+        raise ValueError('Position does not match ordering')
+    (order, *ordering), (value, *values) = ordering, values
+    field = order.lstrip('-')
+    lookup = '__lt' if order.startswith('-') else '__gt'
+    condition = Q(**{field + lookup: value})
+    if ordering:
+        condition |= Q(**{field: value}) & following(ordering, values)
+    return condition
+
+
+class RoomPagination(HotelCursorPagination):
+    ordering = 'number'
+
+
+class RoomRatePagination(HotelCursorPagination):
+    ordering = 'id'
+
+
+class ReservationPagination(HotelCursorPagination):
+    ordering = ('date_from', 'id')
+
+
+class UserPagination(HotelCursorPagination):
+    ordering = 'id'
@@ -1,15 +1,85 @@
+from typing import Iterable, Optional
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
 from rest_framework.permissions import BasePermission
 from rest_framework.request import Request
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
 
 DETAIL_ACTIONS = ['retrieve', 'update', 'partial_update', 'destroy']
 LIST_ACTIONS = ['list', 'create']
 
+# staff group membership is cached per user under keys with random versions
+# of all users' and of the user's membership, so that entries are invalidated
+# by changing a version, and entries written late (or under versions evicted
+# from the cache) are never read
+STAFF_CACHE_KEY = 'hotel:is_staff:{}:{}:{}'
+STAFF_CACHE_VERSION_KEY = 'hotel:is_staff:version'
+STAFF_USER_VERSION_KEY = 'hotel:is_staff:version:{}'
+STAFF_CACHE_TIMEOUT = 60 * 60
+
 
 def is_staff(user):
-    return user.is_staff or user.groups.filter(
-        name='staff').exists()
+    """
+    Checks if user is admin or member of 'staff' group.
+
+    Group membership is memoized on the user object (so it's checked once
+    per request) and cached across requests until user's groups change
+    (see `invalidate_staff`).
+    """
+    if user.is_staff:
+        return True
+    if not user.is_authenticated:
+        return False
+    try:
+        return user._is_staff_member
+    except AttributeError:
+        pass
+    # versions are read before the database, so that membership read before
+    # a change is cached under versions the change has replaced
+    key = STAFF_CACHE_KEY.format(user.pk, *_staff_versions(user.pk))
+    member = cache.get(key)
+    if member is None:
+        member = user.groups.filter(name='staff').exists()
+        cache.set(key, member, STAFF_CACHE_TIMEOUT)
+    user._is_staff_member = member
+    return member
+
+
+def _staff_versions(user_id) -> list[str]:
+    keys = [STAFF_CACHE_VERSION_KEY, STAFF_USER_VERSION_KEY.format(user_id)]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # nothing is known about earlier changes, so start over
+        for key in missing:
+            cache.add(key, uuid4().hex, timeout=None)
+        versions.update(cache.get_many(missing))
+    # version evicted right away is not used by anyone else
+    return [versions.get(key) or uuid4().hex for key in keys]
+
+
+def invalidate_staff(user_ids: Optional[Iterable[int]] = None):
+    """
+    Drops cached staff group membership of given users or, if no users are
+    given, of all users, once current transaction commits, by changing
+    their versions (membership cached by concurrent requests before or
+    after that is stale).
+    """
+    if user_ids is not None:
+        user_ids = list(user_ids)
+    transaction.on_commit(lambda: _drop_staff(user_ids))
+
+
+def _drop_staff(user_ids):
+    if user_ids is None:
+        keys = [STAFF_CACHE_VERSION_KEY]
+    else:
+        keys = [STAFF_USER_VERSION_KEY.format(pk) for pk in user_ids]
+    cache.set_many({key: uuid4().hex for key in keys}, timeout=None)
 
 
 class UserViewSetPermissions(BasePermission):
@@ -76,9 +146,37 @@ class RoomViewSetPermissions(BasePermission):
         user = request.user
         if user.is_anonymous:
             return False
-        if view.action in ['list', 'retrieve']:
-            # all users can list rooms
+        if view.action in ['list', 'retrieve', 'available']:
+            # all users can list rooms and search for available ones
             return True
         if not is_staff(user):
             return False
         return True
+
+
+class RoomRateViewSetPermissions(BasePermission):
+    """
+    Permissions for room rates endpoint.
+    """
+
+    def has_permission(self, request: Request, view: ModelViewSet):
+        user = request.user
+        if user.is_anonymous:
+            return False
+        if view.action in ['list', 'retrieve']:
+            # all users can see rates
+            return True
+        return is_staff(user)
+
+
+class ReportPermissions(BasePermission):
+    """
+    Permissions for reports endpoints.
+    """
+
+    def has_permission(self, request: Request, view: APIView):
+        user = request.user
+        if user.is_anonymous:
+            return False
+        # reports are for management only
+        return is_staff(user)
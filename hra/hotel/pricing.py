@@ -0,0 +1,156 @@
+from bisect import bisect_right
+from datetime import date
+from decimal import Decimal
+from typing import Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from hotel.models import ReservationRoom, RoomClass
+
+# compiled rate plans are cached per room class until its rates change
+RATE_PLAN_CACHE_KEY = 'hotel:rate_plan:{}'
+RATE_PLAN_CACHE_TIMEOUT = 24 * 60 * 60
+# how many rooms are priced at once when reservations are repriced
+PRICING_CHUNK_SIZE = 1000
+
+
+class RatePlan:
+    """
+    Rates of a room class compiled into a timeline of non-overlapping
+    segments, each with a price of a night for every day of week.
+
+    Pricing a stay is a binary search for the segment where the stay begins
+    and a walk over segments until it ends, counting nights per day of week
+    in each of them, so it doesn't depend on the number of nights.
+    """
+
+    def __init__(self, base_price: Decimal, rates: Iterable[tuple]):
+        """
+        Compiles rates given as (date_from, date_to, price, weekdays,
+        priority, id) tuples. Nights not covered by any rate cost
+        `base_price`.
+        """
+        self.base_price = base_price
+        # segment i lasts from starts[i] until starts[i + 1], nights before
+        # the first segment and in the last one are not covered by rates
+        self._starts = []
+        self._prices = []
+        # rates with higher priority (or later ones) go first
+        rates = sorted(rates, key=lambda r: (r[4], r[5]), reverse=True)
+        boundaries = sorted({r[0] for r in rates} | {r[1] for r in rates})
+        for start in boundaries:
+            covering = [r for r in rates if r[0] <= start < r[1]]
+            prices = tuple(
+                next((r[2] for r in covering if r[3] >> weekday & 1),
+                     base_price)
+                for weekday in range(7))
+            if not self._prices or prices != self._prices[-1]:
+                self._starts.append(start)
+                self._prices.append(prices)
+
+    def cost(self, date_from: date, date_to: date) -> Decimal:
+        """
+        Returns cost of nights from `date_from` until `date_to` (excluded).
+        """
+        base = (self.base_price,) * 7
+        total = Decimal('0')
+        i = bisect_right(self._starts, date_from) - 1
+        day = date_from
+        while day < date_to:
+            end = date_to
+            if i + 1 < len(self._starts):
+                end = min(end, self._starts[i + 1])
+            prices = self._prices[i] if i >= 0 else base
+            total += _nights_cost(day, end, prices)
+            day = end
+            i += 1
+        return total
+
+
+def _nights_cost(date_from, date_to, prices):
+    weeks, nights = divmod((date_to - date_from).days, 7)
+    first = date_from.weekday()
+    return sum(prices) * weeks + sum(
+        prices[(first + night) % 7] for night in range(nights))
+
+
+def rate_plans(room_classes: Iterable[str]) -> dict[str, RatePlan]:
+    """
+    Returns compiled rate plans of given room classes. Plans that are not
+    cached are loaded with a single query.
+    """
+    keys = {RATE_PLAN_CACHE_KEY.format(c): c for c in set(room_classes)}
+    plans = {
+        keys[key]: plan for key, plan in cache.get_many(keys).items()}
+    missing = set(keys.values()) - plans.keys()
+    if missing:
+        base_prices = {}
+        rates = {room_class: [] for room_class in missing}
+        for room_class, base_price, *rate in RoomClass.objects.filter(
+                pk__in=missing).values_list(
+                'room_class', 'price', 'rates__date_from', 'rates__date_to',
+                'rates__price', 'rates__weekdays', 'rates__priority',
+                'rates__id').iterator():
+            base_prices[room_class] = base_price
+            if rate[-1] is not None:
+                rates[room_class].append(tuple(rate))
+        compiled = {
+            room_class: RatePlan(base_price, rates[room_class])
+            for room_class, base_price in base_prices.items()}
+        cache.set_many(
+            {RATE_PLAN_CACHE_KEY.format(c): plan
+             for c, plan in compiled.items()},
+            RATE_PLAN_CACHE_TIMEOUT)
+        plans.update(compiled)
+    return plans
+
+
+def invalidate_rate_plan(room_class: str):
+    """
+    Drops cached rate plan of given room class, now and once more after
+    current transaction commits, in case plan is loaded in the meantime by
+    other transaction, that doesn't see the change yet.
+    """
+    key = RATE_PLAN_CACHE_KEY.format(room_class)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def price_reservations(reservations, reprice: bool = False) -> int:
+    """
+    Computes costs of rooms of given reservations that are not priced yet
+    (or of all rooms, if `reprice` is set) at current rates and stores
+    total costs of reservations. Returns the number of reservations.
+    """
+    booked = ReservationRoom.objects.filter(reservation__in=reservations)
+    if not reprice:
+        booked = booked.filter(cost__isnull=True)
+    booked = booked.order_by('pk').values_list(
+        'pk', 'reservation__date_from', 'reservation__date_to',
+        'room__room_class_id')
+    last = 0
+    while True:
+        # rooms are read in chunks by primary key, because they're updated
+        # while being read
+        rows = list(booked.filter(pk__gt=last)[:PRICING_CHUNK_SIZE])
+        if not rows:
+            break
+        _price_rooms(rows)
+        last = rows[-1][0]
+    rooms_cost = ReservationRoom.objects.filter(
+        reservation=OuterRef('pk')).values('reservation').annotate(
+        cost=Sum('cost')).values('cost')
+    return reservations.update(total_cost=Coalesce(
+        Subquery(rooms_cost), Value(Decimal('0')),
+        output_field=DecimalField()))
+
+
+def _price_rooms(rows):
+    plans = rate_plans(room_class for _, _, _, room_class in rows)
+    ReservationRoom.objects.bulk_update([
+        ReservationRoom(
+            pk=pk, cost=plans[room_class].cost(date_from, date_to))
+        for pk, date_from, date_to, room_class in rows], ['cost'])
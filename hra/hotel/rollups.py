@@ -0,0 +1,220 @@
+"""
+Daily rollups of rooms sold and revenue per room class, for occupancy
+reports.
+
+Rollups of nights touched by reservation changes are recomputed from
+reservations after transaction commits (see hotel/signals.py), so reports
+read a row per night and room class instead of all reservations.
+`rebuild_rollups` command recomputes them for the whole history.
+"""
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import ROUND_DOWN, Decimal
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+
+from hotel.models import (DailyRollup, Reservation, ReservationRoom, Room,
+                          RoomClass)
+
+CENT = Decimal('0.01')
+ONE_DAY = timedelta(1)
+# how many nights are recomputed at once when rebuilding rollups
+REBUILD_CHUNK_DAYS = 90
+# how many rollups are saved with a single query
+ROLLUP_BATCH_SIZE = 1000
+
+# periods waiting for recomputation, per thread
+_pending = threading.local()
+
+
+def days_changed(*periods: tuple[date, date]):
+    """
+    Schedules recomputation of rollups of nights within given periods
+    (date from, date to excluded) after current transaction commits.
+    """
+    if not hasattr(_pending, 'periods'):
+        _pending.periods = []
+    _pending.periods.extend(periods)
+    # the first callback of transaction recomputes all pending periods, the
+    # others have nothing left to do
+    transaction.on_commit(_recompute_pending)
+
+
+def reservations_changed(reservations, since: Optional[date] = None):
+    """
+    Schedules recomputation of rollups of nights of given reservations
+    (queryset), only of nights on or after given date if there is one.
+    """
+    if since is not None:
+        reservations = reservations.filter(date_to__gt=since)
+    period = reservations.aggregate(
+        date_from=Min('date_from'), date_to=Max('date_to'))
+    if period['date_from'] is None:
+        return
+    date_from = period['date_from']
+    if since is not None:
+        date_from = max(date_from, since)
+    days_changed((date_from, period['date_to']))
+
+
+def _recompute_pending():
+    periods = getattr(_pending, 'periods', [])
+    _pending.periods = []
+    for date_from, date_to in _merge(periods):
+        recompute(date_from, date_to)
+
+
+def _merge(periods):
+    merged = []
+    for date_from, date_to in sorted(periods):
+        if merged and date_from <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], date_to))
+        else:
+            merged.append((date_from, date_to))
+    return merged
+
+
+def recompute(date_from: date, date_to: date):
+    """
+    Recomputes rollups of nights within given period (end date excluded)
+    from reservations.
+    """
+    room_classes = list(RoomClass.objects.values_list('pk', flat=True))
+    with transaction.atomic():
+        # recomputations of the same nights wait for each other, so that the
+        # later one reads changes committed by the earlier one
+        list(DailyRollup.objects.select_for_update().filter(
+            day__gte=date_from, day__lt=date_to).values_list('pk'))
+        sold = defaultdict(int)
+        revenue = defaultdict(Decimal)
+        # reservations are looked up by dates first, so that the index on
+        # dates is used instead of scanning all booked rooms
+        reservations = Reservation.objects.filter(
+            date_from__lt=date_to, date_to__gt=date_from)
+        rooms = ReservationRoom.objects.filter(
+            reservation__in=reservations.values('pk'),
+        ).values_list(
+            'reservation__date_from', 'reservation__date_to',
+            'room__room_class_id', 'cost')
+        for booked_from, booked_to, room_class, cost in rooms.iterator():
+            nights = (booked_to - booked_from).days
+            share, first_share = _nightly_revenue(cost or Decimal(0), nights)
+            day = max(booked_from, date_from)
+            while day < min(booked_to, date_to):
+                sold[day, room_class] += 1
+                revenue[day, room_class] += \
+                    first_share if day == booked_from else share
+                day += ONE_DAY
+        days = [date_from + timedelta(n)
+                for n in range((date_to - date_from).days)]
+        DailyRollup.objects.bulk_create(
+            [DailyRollup(
+                day=day,
+                room_class_id=room_class,
+                rooms_sold=sold[day, room_class],
+                revenue=revenue[day, room_class])
+             for day in days for room_class in room_classes],
+            batch_size=ROLLUP_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['day', 'room_class'],
+            update_fields=['rooms_sold', 'revenue'])
+
+
+def _nightly_revenue(cost: Decimal, nights: int) -> tuple[Decimal, Decimal]:
+    """
+    Splits cost of room evenly over nights. Returns revenue of every night
+    but the first one, and revenue of the first night (with remainder).
+    """
+    share = (cost / nights).quantize(CENT, rounding=ROUND_DOWN)
+    return share, cost - share * (nights - 1)
+
+
+def rebuild(date_from: Optional[date] = None,
+            date_to: Optional[date] = None) -> int:
+    """
+    Recomputes rollups of nights within given period (missing bounds are
+    taken from reservations) or, by default, of all nights with
+    reservations, dropping all other rollups. Nights are recomputed in
+    chunks. Returns number of recomputed nights.
+    """
+    full = date_from is None and date_to is None
+    if date_from is None or date_to is None:
+        period = ReservationRoom.objects.aggregate(
+            date_from=Min('reservation__date_from'),
+            date_to=Max('reservation__date_to'))
+        date_from = date_from or period['date_from']
+        date_to = date_to or period['date_to']
+    if full:
+        # rollups of nights without reservations are dropped
+        stale = DailyRollup.objects.all()
+        if date_from is not None:
+            stale = stale.exclude(day__gte=date_from, day__lt=date_to)
+        stale.delete()
+    if date_from is None or date_to is None or date_from >= date_to:
+        return 0
+    start = date_from
+    while start < date_to:
+        end = min(start + timedelta(REBUILD_CHUNK_DAYS), date_to)
+        recompute(start, end)
+        start = end
+    return (date_to - date_from).days
+
+
+def occupancy_report(date_from: date,
+                     date_to: date,
+                     room_class: Optional[str] = None,
+                     daily: bool = False) -> dict:
+    """
+    Reports occupancy, average daily rate (ADR) and revenue per available
+    room (RevPAR) of nights within given period (end date excluded), per
+    room class and in total, optionally for every night. Rooms available
+    are the rooms existing now.
+    """
+    rollups = DailyRollup.objects.filter(day__gte=date_from, day__lt=date_to)
+    rooms = Room.objects.all()
+    if room_class is not None:
+        rollups = rollups.filter(room_class=room_class)
+        rooms = rooms.filter(room_class=room_class)
+    rooms = dict(rooms.values_list('room_class').annotate(Count('pk')))
+    nights = (date_to - date_from).days
+    totals = {
+        room_class: (sold, revenue)
+        for room_class, sold, revenue in rollups.values_list(
+            'room_class').annotate(Sum('rooms_sold'), Sum('revenue'))}
+    report = {
+        'date_from': date_from,
+        'date_to': date_to,
+        'room_classes': [
+            {'room_class': room_class,
+             **_indicators(rooms.get(room_class, 0), nights,
+                           *totals.get(room_class, (0, Decimal(0))))}
+            for room_class in sorted(set(rooms) | set(totals))],
+        'total': _indicators(
+            sum(rooms.values()), nights,
+            sum(sold for sold, _ in totals.values()),
+            sum((revenue for _, revenue in totals.values()), Decimal(0))),
+    }
+    if daily:
+        report['days'] = [
+            {'day': day,
+             'room_class': room_class,
+             **_indicators(rooms.get(room_class, 0), 1, sold, revenue)}
+            for day, room_class, sold, revenue in rollups.order_by(
+                'day', 'room_class').values_list(
+                'day', 'room_class', 'rooms_sold', 'revenue')]
+    return report
+
+
+def _indicators(rooms: int, nights: int, sold: int, revenue: Decimal):
+    available = rooms * nights
+    return {
+        'rooms': rooms,
+        'rooms_sold': sold,
+        'revenue': revenue,
+        'occupancy': round(sold / available, 4) if available else None,
+        'adr': (revenue / sold).quantize(CENT) if sold else None,
+        'revpar': (revenue / available).quantize(CENT) if available else None,
+    }
@@ -0,0 +1,124 @@
+"""
+Routing of read queries to replica database.
+
+Views opt in with `ReplicaReadMixin`: their read-only actions query the
+replica configured by `HOTEL_REPLICA_DATABASE` setting, everything else
+goes to the primary database. Replica may lag behind, so users who have
+just written something are pinned to the primary for
+`HOTEL_PRIMARY_PIN_TIMEOUT` seconds to read their own writes. Pins are
+kept in the default cache, which has to be shared by all workers.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+# marks user who has recently written to the primary database
+PRIMARY_PIN_KEY = 'hotel:primary-pin:{}'
+
+
+class _RequestState:
+    """
+    Routing state of a request handled by a view with replica reads.
+    """
+
+    def __init__(self):
+        self.replica = False
+        self.wrote = False
+
+
+_request_state = ContextVar('hotel_request_state', default=None)
+
+
+def reads_from_replica() -> bool:
+    """
+    Tells if reads of current request are routed to the replica.
+    """
+    state = _request_state.get()
+    return state is not None and state.replica
+
+
+def pin_to_primary(user):
+    """
+    Routes reads of given user to the primary database for a while.
+    """
+    cache.set(
+        PRIMARY_PIN_KEY.format(user.pk), True,
+        settings.HOTEL_PRIMARY_PIN_TIMEOUT)
+
+
+def pinned_to_primary(user) -> bool:
+    return cache.get(PRIMARY_PIN_KEY.format(user.pk), False)
+
+
+class ReplicaRouter:
+    """
+    Routes reads of views with replica reads to the replica database, if
+    there is one, and all writes to the primary database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if reads_from_replica():
+            return settings.HOTEL_REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            # request reads its own writes from now on
+            state.replica = False
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both databases have the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replica gets schema changes from the primary
+        if db == settings.HOTEL_REPLICA_DATABASE:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serves `replica_actions` from the replica database, unless user is
+    pinned to the primary database after a recent write. Users are pinned
+    by requests that write anything.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        with self.routing():
+            return super().dispatch(request, *args, **kwargs)
+
+    @contextmanager
+    def routing(self):
+        """
+        Routes queries of the request handled within.
+        """
+        state = _RequestState()
+        token = _request_state.set(state)
+        try:
+            yield
+        finally:
+            _request_state.reset(token)
+        if state.wrote and self.request.user.is_authenticated:
+            pin_to_primary(self.request.user)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if settings.HOTEL_REPLICA_DATABASE is not None and \
+                self.action in self.replica_actions and \
+                not pinned_to_primary(request.user):
+            _request_state.get().replica = True
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if reads_from_replica():
+            # querysets evaluated after the request is handled (e.g. streamed
+            # responses) have to read from the replica as well
+            queryset = queryset.using(queryset.db)
+        return queryset
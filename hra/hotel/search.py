@@ -0,0 +1,173 @@
+import heapq
+import re
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import BooleanField, F, FloatField, Func, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+
+# FTS5 table indexing reservation names on SQLite (see migration 0011)
+NAME_INDEX = 'hotel_reservation_name'
+NAME_MATCHES = ['contains', 'prefix', 'fuzzy']
+# minimal trigram similarity of fuzzily matched names, as in pg_trgm
+FUZZY_THRESHOLD = 0.3
+# how many best candidates from full-text index are ranked on SQLite
+RANKED_CANDIDATES = 1000
+
+
+def search_reservations(queryset, params):
+    """
+    Narrows down reservations with search query parameters (`room_number`,
+    `name` with `name_match`, `date`, `date_from`, `date_to`, `duration`).
+    """
+    if 'room_number' in params:
+        queryset = queryset.filter(
+            rooms__number=params['room_number'])
+    if 'name' in params:
+        queryset = filter_name(
+            queryset, params['name'], name_match(params))
+    if 'date' in params:
+        try:
+            queryset = queryset.filter(
+                date_from__lte=params['date'],
+                date_to__gte=params['date'])
+        except DjangoValidationError as e:
+            raise ValidationError(e.message, e.code)
+    if 'date_from' in params:
+        try:
+            queryset = queryset.filter(date_from=params['date_from'])
+        except DjangoValidationError as e:
+            raise ValidationError(e.message, e.code)
+    if 'date_to' in params:
+        try:
+            queryset = queryset.filter(date_to=params['date_to'])
+        except DjangoValidationError as e:
+            raise ValidationError(e.message, e.code)
+    if 'duration' in params:
+        try:
+            duration = int(params['duration'])
+        except ValueError as e:
+            raise ValidationError(e.__cause__)
+        if duration < 1:
+            raise ValidationError(
+                'reservation duration cannot be negative')
+        queryset = queryset.filter(duration=duration)
+    return queryset
+
+
+def name_match(params) -> str:
+    """
+    Returns name matching selected with `name_match` query parameter.
+    """
+    match = params.get('name_match', 'contains')
+    if match not in NAME_MATCHES:
+        raise ValidationError(
+            'name_match has to be one of: ' + ', '.join(NAME_MATCHES))
+    return match
+
+
+def filter_name(queryset, name: str, match: str = 'contains'):
+    """
+    Filters reservations whose name contains, starts with or is similar to
+    given name (case-insensitively, except for `contains` on PostgreSQL).
+    Uses trigram index, so it doesn't scan reservations table.
+    """
+    if connections[queryset.db].vendor == 'sqlite' and len(name) >= 3:
+        # trigram index can't be used for names shorter than a trigram
+        query = _fts_query(name, match)
+        if match == 'fuzzy':
+            sql = 'SELECT rowid FROM {0} WHERE {0} MATCH %s ' \
+                'ORDER BY rank LIMIT {1}'.format(NAME_INDEX, RANKED_CANDIDATES)
+            return queryset.filter(pk__in=RawSQL(sql, [query]))
+        # joined with the index, so that matches can be ordered by its rank
+        return queryset.extra(
+            tables=[NAME_INDEX],
+            where=['{}.rowid = {}.id'.format(
+                       NAME_INDEX, queryset.model._meta.db_table),
+                   '{} MATCH %s'.format(NAME_INDEX)],
+            params=[query])
+    if match == 'prefix':
+        return queryset.filter(name__istartswith=name)
+    if match == 'fuzzy':
+        if connections[queryset.db].vendor == 'postgresql':
+            # similarity operator uses pg_trgm index and the same threshold
+            return queryset.filter(Func(
+                F('name'), Value(name),
+                arg_joiner=' %% ',
+                template='%(expressions)s',
+                output_field=BooleanField()))
+        return queryset.filter(name__icontains=name)
+    # PostgreSQL uses pg_trgm index for LIKE by itself
+    return queryset.filter(name__contains=name)
+
+
+def rank_by_name(reservations, name: str, match: str, limit: int) -> list:
+    """
+    Returns at most `limit` reservations (already filtered by `filter_name`)
+    with the most similar names first. On SQLite, only `RANKED_CANDIDATES`
+    best ranked by the full-text index are compared.
+    """
+    if connections[reservations.db].vendor == 'postgresql':
+        reservations = reservations.annotate(
+            name_similarity=_similarity(name))
+        return list(reservations.order_by('-name_similarity', 'id')[:limit])
+    # there is no similarity function in SQLite, so candidates found with
+    # full-text index are ranked in Python, the same way pg_trgm does it
+    candidates = reservations.prefetch_related(None).values_list(
+        'pk', 'name')
+    if match != 'fuzzy' and len(name) >= 3:
+        # only the matches best ranked by the index are compared (fuzzy
+        # matches are limited by `filter_name` already), not every
+        # reservation with a common name
+        candidates = candidates.extra(
+            order_by=['{}.rank'.format(NAME_INDEX)])[:RANKED_CANDIDATES]
+    ranked = []
+    for pk, candidate in candidates.iterator():
+        score = similarity(name, candidate)
+        if match != 'fuzzy' or score >= FUZZY_THRESHOLD:
+            ranked.append((-score, pk))
+    best = [pk for _, pk in heapq.nsmallest(limit, ranked)]
+    # best candidates have passed all filters already, so they're loaded by
+    # their keys alone, without matching names again
+    reservations = reservations.model.objects.using(
+        reservations.db).for_serialization().in_bulk(best)
+    return [reservations[pk] for pk in best]
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Trigram similarity of two strings, as computed by pg_trgm.
+    """
+    a, b = _trigrams(a), _trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _trigrams(text):
+    trigrams = set()
+    for word in re.findall(r'\w+', text.lower()):
+        word = '  ' + word + ' '
+        trigrams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return trigrams
+
+
+def _fts_query(name, match):
+    def phrase(text):
+        return '"' + text.replace('"', '""') + '"'
+    if match == 'prefix':
+        return '^' + phrase(name)
+    if match == 'fuzzy':
+        # any common trigram makes a candidate, best candidates share most
+        name = name.lower()
+        return ' OR '.join(sorted(
+            {phrase(name[i:i + 3]) for i in range(len(name) - 2)}))
+    return phrase(name)
+
+
+def _similarity(name):
+    return Func(
+        F('name'), Value(name),
+        function='similarity',
+        output_field=FloatField())
@@ -1,11 +1,83 @@
+import random
+import time
 from datetime import date
+from functools import partial
 
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db import IntegrityError, OperationalError, transaction
 from rest_framework import serializers
 
-from hotel.models import Reservation, Room, RoomClass
+from hotel.exceptions import BookingConflictError
+from hotel.models import Reservation, Room, RoomClass, RoomNight, RoomRate
+
+# how many times booking is attempted when it fails because of concurrent
+# writes and how long to wait (in seconds) before first retry; wait time
+# doubles with each attempt
+BOOKING_ATTEMPTS = 4
+BOOKING_RETRY_DELAY = 0.05
+# how many reservations can be created or updated with a single request
+MAX_BULK_RESERVATIONS = 1000
+# how many rooms can be retired with a single request
+MAX_RETIRED_ROOMS = 1000
+
+
+def atomic_booking(book):
+    """
+    Runs booking function in a transaction. Transactions failing because of
+    concurrent writes (e.g. deadlock, locked database or a night booked in
+    the meantime) are retried with exponential backoff.
+    """
+    # transaction cannot be retried if it's a part of an outer one
+    attempts = 1 if transaction.get_connection().in_atomic_block \
+        else BOOKING_ATTEMPTS
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(
+                BOOKING_RETRY_DELAY * 2 ** (attempt - 1) *
+                random.uniform(0.5, 1.5))
+        try:
+            with transaction.atomic():
+                return book()
+        except (OperationalError, IntegrityError):
+            pass
+    raise BookingConflictError()
+
+
+def unavailable_rooms_message(numbers: list[str]) -> str:
+    return (
+        'Selected rooms are not available for reservation within given '
+        'time: {}. Try different rooms or different reservation '
+        'time.'.format(
+            ', '.join(numbers)))
+
+
+def lock_rooms(numbers) -> list[Room]:
+    """
+    Locks rooms until the end of current transaction.
+    """
+    # rooms are always locked in the same order to avoid deadlocks
+    return list(Room.objects.select_for_update().filter(
+        number__in=numbers).order_by('number'))
+
+
+class RoomRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Room relation resolving room numbers from rooms preloaded into
+    serializer's context (under 'rooms' key, by number), if there are any,
+    instead of querying rooms one by one.
+    """
+
+    def to_internal_value(self, data):
+        rooms = self.context.get('rooms')
+        if rooms is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool) or not isinstance(data, (str, int)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return rooms[str(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
 
 
 class RoomClassSerializer(serializers.ModelSerializer):
@@ -20,9 +92,79 @@ class RoomSerializer(serializers.ModelSerializer):
         fields = ['number', 'room_class']
 
 
+class RoomRetirementSerializer(serializers.Serializer):
+    """
+    Validates body of rooms retirement request.
+    """
+    rooms = serializers.ListField(
+        child=serializers.CharField(max_length=5),
+        allow_empty=False,
+        max_length=MAX_RETIRED_ROOMS)
+
+
+class RoomRateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RoomRate
+        fields = [
+            'id',
+            'room_class',
+            'date_from',
+            'date_to',
+            'price',
+            'weekdays',
+            'priority']
+        read_only_fields = ['id']
+
+    def validate(self, data):
+        date_from = data.get(
+            'date_from', getattr(self.instance, 'date_from', None))
+        date_to = data.get('date_to', getattr(self.instance, 'date_to', None))
+        if date_from >= date_to:
+            raise serializers.ValidationError(
+                'Start date must be before end date')
+        return data
+
+
+class RoomAvailabilitySerializer(serializers.Serializer):
+    """
+    Validates query parameters of room availability search.
+    """
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    room_class = serializers.CharField(required=False, max_length=1)
+
+    def validate(self, data):
+        if data['date_from'] >= data['date_to']:
+            raise serializers.ValidationError(
+                'Start date must be before end date')
+        return data
+
+
+class OccupancyReportSerializer(serializers.Serializer):
+    """
+    Validates query parameters of occupancy report.
+    """
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    room_class = serializers.CharField(required=False, max_length=1)
+    daily = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data['date_from'] >= data['date_to']:
+            raise serializers.ValidationError(
+                'Start date must be before end date')
+        return data
+
+
 class ReservationSerializer(serializers.ModelSerializer):
     owner = serializers.ReadOnlyField(source='owner.username')
     name = serializers.CharField(required=False, max_length=100)
+    rooms = RoomRelatedField(many=True, queryset=Room.objects.all())
+    total_cost = serializers.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        coerce_to_string=False,
+        read_only=True)
 
     class Meta:
         model = Reservation
@@ -50,11 +192,78 @@ class ReservationSerializer(serializers.ModelSerializer):
         return rooms
 
     def validate(self, data):
-        self._validate_dates(data['date_from'], data['date_to'])
-        self._validate_rooms_available(
-            data['rooms'], data['date_from'], data['date_to'])
+        date_from, date_to, rooms = self._merged(data)
+        self._validate_dates(date_from, date_to)
+        if not self.context.get('bulk'):
+            # in bulk, availability is checked for all reservations at once
+            self._validate_rooms_available(
+                self._rooms_to_check(rooms, date_from, date_to),
+                date_from, date_to)
         return data
 
+    def create(self, validated_data):
+        return self._book(super().create, validated_data)
+
+    def update(self, instance, validated_data):
+        return self._book(partial(self._update, instance), validated_data)
+
+    def _update(self, instance, validated_data):
+        if 'rooms' in validated_data and (
+                validated_data.get('date_from', instance.date_from),
+                validated_data.get('date_to', instance.date_to)) != (
+                instance.date_from, instance.date_to):
+            # rooms leaving reservation are released before its nights are
+            # moved to new dates, where the rooms may be booked already
+            instance.rooms.remove(*set(instance.rooms.all()).difference(
+                validated_data['rooms']))
+        return super().update(instance, validated_data)
+
+    def _book(self, save, validated_data):
+        """
+        Saves reservation holding locks on reserved rooms.
+
+        Availability is checked again under the locks, so concurrent bookings
+        of the same room are serialized and cannot both pass the check, while
+        bookings of other rooms are not blocked.
+        """
+        def book():
+            self._lock_and_validate_rooms(validated_data)
+            return save(validated_data)
+        return atomic_booking(book)
+
+    def _lock_and_validate_rooms(self, validated_data):
+        date_from, date_to, rooms = self._merged(validated_data)
+        rooms = self._rooms_to_check(rooms, date_from, date_to)
+        if rooms:
+            self._validate_rooms_available(
+                lock_rooms([r.number for r in rooms]), date_from, date_to)
+
+    def _merged(self, data) -> tuple[date, date, list[Room]]:
+        """
+        Returns dates and rooms of reservation, taking those that are not
+        given (in partial update) from updated reservation.
+        """
+        if self.instance is None:
+            return data['date_from'], data['date_to'], data['rooms']
+        return (
+            data.get('date_from', self.instance.date_from),
+            data.get('date_to', self.instance.date_to),
+            data['rooms'] if 'rooms' in data
+            else list(self.instance.rooms.all()))
+
+    def _rooms_to_check(self, rooms, date_from, date_to) -> list[Room]:
+        """
+        Returns rooms whose availability has to be checked: all rooms of a
+        new reservation or of one extended to other nights, otherwise only
+        rooms added to updated reservation, as it holds nights of the
+        others already (see RoomNight).
+        """
+        if self.instance is None or date_from < self.instance.date_from or \
+                date_to > self.instance.date_to:
+            return rooms
+        booked = {room.number for room in self.instance.rooms.all()}
+        return [room for room in rooms if room.number not in booked]
+
     def _validate_dates(self, date_from, date_to):
         if date_from >= date_to:
             raise serializers.ValidationError(
@@ -64,29 +273,43 @@ class ReservationSerializer(serializers.ModelSerializer):
         """
         Checks if all rooms are available within given time period.
         """
-        if any(not self._is_available(r, date_from, date_to)
-               for r in rooms):
+        if not rooms:
+            return
+        unavailable = self._unavailable_rooms(rooms, date_from, date_to)
+        if unavailable:
             raise serializers.ValidationError(
-                'Selected rooms are not available for reservation within given time. '
-                'Try different rooms or different reservation time.')
+                unavailable_rooms_message(unavailable))
 
-    def _is_available(
+    def _unavailable_rooms(
             self,
-            room: Room,
+            rooms: list[Room],
             date_from: date,
-            date_to: date) -> bool:
-        # room is available if both date_from and date_to are before other
-        # reservations' start date or after other reservations' end date
-        reservation_collisions = Reservation.objects.filter(
-            (Q(date_from__lt=date_from) | Q(date_from__lt=date_to)) &
-            (Q(date_to__gt=date_from) | Q(date_to__gt=date_to)),
-            rooms__number=room.number)
+            date_to: date) -> list[str]:
+        """
+        Returns sorted numbers of rooms that collide with other reservations
+        within given time period, using a single query on booked nights.
+        """
+        collisions = RoomNight.objects.filter(
+            room_id__in=[r.number for r in rooms],
+            night__gte=date_from,
+            night__lt=date_to)
         if self.instance is not None:
             # Updating existing reservation, so remove it from collisions
-            reservation_collisions = reservation_collisions.exclude(
-                pk=self.instance.id)
-        # If any reservation passes above test, room is not available
-        return not reservation_collisions.count()
+            collisions = collisions.exclude(reservation_id=self.instance.id)
+        return list(collisions.order_by('room_id').values_list(
+            'room_id', flat=True).distinct())
+
+
+class BulkReservationSerializer(serializers.Serializer):
+    """
+    Validates body of bulk reservations request. Reservations themselves are
+    validated by ReservationSerializer.
+    """
+    reservations = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=MAX_BULK_RESERVATIONS)
+    atomic = serializers.BooleanField(default=True)
 
 
 class UserSerializer(serializers.ModelSerializer):
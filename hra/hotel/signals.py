@@ -0,0 +1,187 @@
+from datetime import date
+
+from django.contrib.auth.models import Group, User
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from hotel import inventory, rollups
+from hotel.authentication import forget_token_user
+from hotel.caching import invalidate_rooms
+from hotel.metrics import publish_if_due, record_query
+from hotel.models import Reservation, Room, RoomClass, RoomRate
+from hotel.occupancy import occupancy_index
+from hotel.permissions import invalidate_staff
+from hotel.pricing import invalidate_rate_plan
+
+
+@receiver(connection_created)
+def sqlite_connection_created(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        # readers do not block writer and writer does not block readers;
+        # with WAL, syncing only at checkpoints is still safe from corruption
+        cursor.execute('PRAGMA journal_mode = WAL')
+        cursor.execute('PRAGMA synchronous = NORMAL')
+
+
+@receiver(connection_created)
+def connection_instrumented(sender, connection, **kwargs):
+    # signal is sent again when connection is reopened
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(request_finished)
+def request_metrics_sent(sender, **kwargs):
+    # metrics are published after the response is sent, off the request path
+    publish_if_due()
+
+
+@receiver(post_save, sender=Reservation)
+def reservation_saved(sender, instance, created, **kwargs):
+    occupancy_index.reservations_changed([instance.pk])
+    if created:
+        # new reservation has no rooms yet
+        return
+    if instance.dates_changed():
+        inventory.rebook_nights(instance)
+    # dates before the change (see Reservation.save)
+    old_from, old_to = getattr(instance, '_priced_dates', (None, None))
+    rollups.days_changed(
+        (instance.date_from, instance.date_to),
+        *[(old_from, old_to)] if old_from and old_to else [])
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_deleted(sender, instance, **kwargs):
+    occupancy_index.reservation_deleted(instance.pk)
+    rollups.days_changed((instance.date_from, instance.date_to))
+
+
+@receiver(m2m_changed, sender=Reservation.rooms.through)
+def reservation_rooms_changed(
+        sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not reverse:
+        occupancy_index.reservations_changed([instance.pk])
+    elif pk_set:
+        occupancy_index.reservations_changed(pk_set)
+    else:
+        # reservations removed from the room are not known after clearing
+        occupancy_index.invalidate()
+
+
+@receiver(m2m_changed, sender=Reservation.rooms.through)
+def reservation_rooms_booked(
+        sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_add' and not reverse:
+        inventory.book_nights(
+            (instance.pk, number, instance.date_from, instance.date_to)
+            for number in pk_set)
+    elif action == 'post_add':
+        inventory.book_nights(
+            (pk, instance.number, date_from, date_to)
+            for pk, date_from, date_to in Reservation.objects.filter(
+                pk__in=pk_set).values_list('pk', 'date_from', 'date_to'))
+    elif action == 'post_remove' and not reverse:
+        inventory.release_nights([instance.pk], pk_set)
+    elif action == 'post_remove':
+        inventory.release_nights(pk_set, [instance.number])
+    elif action == 'post_clear' and not reverse:
+        inventory.release_nights([instance.pk])
+    elif action == 'post_clear':
+        inventory.release_nights(rooms=[instance.number])
+
+
+@receiver(m2m_changed, sender=Reservation.rooms.through)
+def reservation_rooms_priced(
+        sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # reservations losing the room are not known after clearing
+        instance._cleared_reservations = list(sender.objects.filter(
+            room=instance).values_list('reservation_id', flat=True))
+        return
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not reverse:
+        Reservation.objects.filter(pk=instance.pk).update_total_costs()
+        instance.refresh_from_db(fields=['total_cost'])
+        rollups.days_changed((instance.date_from, instance.date_to))
+    else:
+        if action == 'post_clear':
+            pk_set = instance.__dict__.pop('_cleared_reservations', [])
+        reservations = Reservation.objects.filter(pk__in=pk_set)
+        reservations.update_total_costs()
+        rollups.reservations_changed(reservations)
+
+
+@receiver(post_save, sender=Room)
+def room_saved(sender, instance, created, **kwargs):
+    occupancy_index.room_changed(instance.number, instance.room_class_id)
+    invalidate_rooms()
+    if not created and instance.room_class_changed():
+        rollups.reservations_changed(
+            Reservation.objects.filter(rooms=instance))
+
+
+@receiver(pre_delete, sender=Room)
+def room_deleting(sender, instance, **kwargs):
+    # reservations lose the room when it's deleted; rollups of past nights
+    # are kept as history
+    rollups.reservations_changed(
+        Reservation.objects.filter(rooms=instance), since=date.today())
+
+
+@receiver(post_delete, sender=Room)
+def room_deleted(sender, instance, **kwargs):
+    occupancy_index.room_deleted(instance.number)
+    invalidate_rooms()
+
+
+@receiver(post_save, sender=RoomClass)
+@receiver(post_delete, sender=RoomClass)
+def room_class_changed(sender, instance, **kwargs):
+    invalidate_rooms()
+    invalidate_rate_plan(instance.room_class)
+
+
+@receiver(post_save, sender=RoomRate)
+@receiver(post_delete, sender=RoomRate)
+def room_rate_changed(sender, instance, **kwargs):
+    invalidate_rate_plan(instance.room_class_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not reverse:
+        invalidate_staff([instance.pk])
+    elif pk_set:
+        invalidate_staff(pk_set)
+    else:
+        # users removed from the group are not known after clearing
+        invalidate_staff()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    # group could be renamed from or to 'staff'
+    invalidate_staff()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    forget_token_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_staff([instance.pk])
+    forget_token_user(instance.pk)
@@ -0,0 +1,186 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from hotel.authentication import issue_token
+from hotel.models import Reservation, Room, RoomClass
+from hotel.occupancy import occupancy_index
+from hotel.routers import ReplicaRouter
+from hotel.test_throttling import rates
+
+
+class AsyncViewsTest(TestCase):
+    """
+    Test suite for async/ endpoints.
+    """
+    uri = '/async/'
+
+    def setUp(self):
+        occupancy_index.invalidate()
+        self.room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('30'))
+        self.rooms = [
+            Room.objects.create(number=str(n), room_class=self.room_class)
+            for n in range(100, 105)]
+        self.owner = User.objects.create(username='test', last_name='Brown')
+        self.other = User.objects.create(username='other')
+        self.staff = User.objects.create(username='admin', is_staff=True)
+        self.reservation = self._reserve(self.owner, 'Smith', self.rooms[0])
+        self.other_reservation = self._reserve(
+            self.other, 'Jones', self.rooms[1])
+
+    def tearDown(self):
+        cache.clear()
+
+    def _reserve(self, owner, name, room):
+        reservation = Reservation.objects.create(
+            date_from=date.today() + timedelta(1),
+            date_to=date.today() + timedelta(3),
+            name=name,
+            owner=owner)
+        reservation.rooms.set([room])
+        return reservation
+
+    async def _get(self, uri, user=None):
+        headers = {}
+        if user is not None:
+            headers['Authorization'] = 'Bearer ' + issue_token(user)
+        return await self.async_client.get(self.uri + uri, headers=headers)
+
+    async def test_authentication_is_required(self):
+        response = await self._get('rooms/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+    async def test_invalid_token(self):
+        response = await self.async_client.get(
+            self.uri + 'rooms/', headers={'Authorization': 'Bearer x'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'detail': 'Invalid token.'})
+
+    async def test_session_authentication(self):
+        # `aforce_login` is not available in Django 4.2
+        await sync_to_async(self.async_client.force_login)(self.owner)
+        response = await self.async_client.get(self.uri + 'rooms/')
+        self.assertEqual(response.status_code, 200)
+
+    async def test_only_get_is_allowed(self):
+        response = await self.async_client.post(
+            self.uri + 'rooms/',
+            headers={'Authorization': 'Bearer ' + issue_token(self.staff)})
+        self.assertEqual(response.status_code, 405)
+
+    async def test_rooms_are_paginated(self):
+        response = await self._get('rooms/?page_size=3', self.owner)
+        self.assertEqual(response.status_code, 200)
+        first_page = response.json()
+        self.assertEqual(
+            [r['number'] for r in first_page['results']],
+            ['100', '101', '102'])
+        self.assertIsNone(first_page['previous'])
+        response = await self.async_client.get(
+            first_page['next'],
+            headers={'Authorization': 'Bearer ' + issue_token(self.owner)})
+        second_page = response.json()
+        self.assertEqual(
+            [r['number'] for r in second_page['results']], ['103', '104'])
+        self.assertIsNone(second_page['next'])
+        response = await self.async_client.get(
+            second_page['previous'],
+            headers={'Authorization': 'Bearer ' + issue_token(self.owner)})
+        self.assertEqual(response.json()['results'], first_page['results'])
+
+    async def test_invalid_cursor(self):
+        response = await self._get('rooms/?cursor=x', self.owner)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_available_rooms(self):
+        response = await self._get(
+            'rooms/available/?date_from={}&date_to={}'.format(
+                date.today() + timedelta(2), date.today() + timedelta(4)),
+            self.owner)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r['number'] for r in response.json()],
+            ['102', '103', '104'])
+
+    async def test_available_rooms_require_dates(self):
+        response = await self._get('rooms/available/', self.owner)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date_from', response.json())
+
+    async def test_user_lists_own_reservations(self):
+        response = await self._get('reservations/', self.owner)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['id'] for r in results], [self.reservation.pk])
+        self.assertEqual(results[0]['rooms'], ['100'])
+        self.assertEqual(results[0]['owner'], 'test')
+        self.assertEqual(results[0]['total_cost'], 60)
+
+    async def test_staff_lists_all_reservations(self):
+        response = await self._get('reservations/?name=Jon', self.staff)
+        self.assertEqual(
+            [r['id'] for r in response.json()['results']],
+            [self.other_reservation.pk])
+
+    async def test_reservations_are_paginated(self):
+        response = await self._get('reservations/?page_size=1', self.staff)
+        first_page = response.json()
+        response = await self.async_client.get(
+            first_page['next'],
+            headers={'Authorization': 'Bearer ' + issue_token(self.staff)})
+        second_page = response.json()
+        self.assertEqual(
+            {r['id'] for r in first_page['results'] + second_page['results']},
+            {self.reservation.pk, self.other_reservation.pk})
+        self.assertIsNone(second_page['next'])
+
+    async def test_invalid_search_parameters(self):
+        response = await self._get('reservations/?date=x', self.owner)
+        self.assertEqual(response.status_code, 400)
+
+    async def test_reservation_detail(self):
+        response = await self._get(
+            'reservations/{}/'.format(self.reservation.pk), self.owner)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Smith')
+
+    async def test_reservation_detail_of_other_user(self):
+        uri = 'reservations/{}/'.format(self.other_reservation.pk)
+        response = await self._get(uri, self.owner)
+        self.assertEqual(response.status_code, 403)
+        response = await self._get(uri, self.staff)
+        self.assertEqual(response.status_code, 200)
+
+    async def test_missing_reservation(self):
+        response = await self._get('reservations/0/', self.owner)
+        self.assertEqual(response.status_code, 404)
+
+    @rates(user='1/min')
+    async def test_requests_are_throttled(self):
+        response = await self._get('reservations/', self.owner)
+        self.assertEqual(response.status_code, 200)
+        response = await self._get('rooms/', self.owner)
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(HOTEL_REPLICA_DATABASE='default')
+    async def test_reservations_are_read_from_replica(self):
+        reads = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            db = db_for_read(router, model, **hints)
+            reads.append(db)
+            return db
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            response = await self._get(
+                'reservations/{}/'.format(self.reservation.pk), self.owner)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('default', reads)
@@ -0,0 +1,130 @@
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from hotel.authentication import (
+    TOKEN_USER_CACHE_KEY, TOKEN_USER_VERSION_KEY, issue_token)
+
+
+class SignedTokenAuthenticationTest(APITestCase):
+    """
+    Test suite for token authentication and auth/token/ endpoints.
+    """
+    uri = '/reservations/'
+
+    def setUp(self):
+        self.password = 'testpass'
+        self.user = User.objects.create(
+            username='test',
+            last_name='Brown',
+            password=make_password(self.password))
+
+    def tearDown(self):
+        # users' ids are reused by other tests
+        cache.clear()
+
+    def _authorize(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+
+    def test_obtain_token(self):
+        response = self.client.post('/auth/token/', {
+            'username': self.user.username, 'password': self.password})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self._authorize(response.data['token'])
+        response = self.client.get(self.uri)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_obtain_token_with_wrong_password(self):
+        response = self.client.post('/auth/token/', {
+            'username': self.user.username, 'password': 'wrong'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_refresh_token(self):
+        self._authorize(issue_token(self.user))
+        response = self.client.post('/auth/token/refresh/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self._authorize(response.data['token'])
+        self.assertEqual(
+            self.client.get(self.uri).status_code, status.HTTP_200_OK)
+
+    def test_refresh_requires_token(self):
+        self.client.login(
+            username=self.user.username, password=self.password)
+        response = self.client.post('/auth/token/refresh/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_authentication_does_not_hash_password_or_query_user(self):
+        self._authorize(issue_token(self.user))
+        self.client.get(self.uri)
+        with mock.patch(
+                'django.contrib.auth.hashers.PBKDF2PasswordHasher.encode') \
+                as encode, \
+                self.assertNumQueries(1):
+            # reservations list only (staff role and user are cached)
+            response = self.client.get(self.uri)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        encode.assert_not_called()
+
+    def test_invalid_token(self):
+        self._authorize(issue_token(self.user) + 'x')
+        response = self.client.get(self.uri)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token(self):
+        self._authorize(issue_token(self.user))
+        with override_settings(HOTEL_TOKEN_MAX_AGE=-1):
+            response = self.client.get(self.uri)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_changing_password_revokes_token(self):
+        self._authorize(issue_token(self.user))
+        self.client.get(self.uri)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('newpass')
+            self.user.save()
+        response = self.client.get(self.uri)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_read_before_change_is_not_used(self):
+        self._authorize(issue_token(self.user))
+        first = QuerySet.first
+        changes = [lambda: setattr(self.user, 'is_active', False)]
+
+        def first_before_change(queryset):
+            result = first(queryset)
+            # user is deactivated before the request caches what it read
+            if changes:
+                with self.captureOnCommitCallbacks(execute=True):
+                    changes.pop()()
+                    self.user.save()
+            return result
+
+        with mock.patch.object(QuerySet, 'first', first_before_change):
+            response = self.client.get(self.uri)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(self.uri)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_hash_is_not_cached(self):
+        self._authorize(issue_token(self.user))
+        self.client.get(self.uri)
+        version = cache.get(TOKEN_USER_VERSION_KEY.format(self.user.pk))
+        cached = cache.get(TOKEN_USER_CACHE_KEY.format(self.user.pk, version))
+        self.assertTrue(cached['is_active'])
+        self.assertNotIn('password', cached)
+        self.assertNotIn(self.user.password, cached.values())
+
+    def test_deactivated_user_token(self):
+        self._authorize(issue_token(self.user))
+        self.client.get(self.uri)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        response = self.client.get(self.uri)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,140 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from hotel.management.commands.benchmark import compare_reports
+from hotel.models import DailyRollup, Reservation, Room, RoomClass
+
+
+class RepriceReservationsCommandTest(TestCase):
+    """
+    Test suite for reprice_reservations command.
+    """
+
+    def setUp(self):
+        self.room_class_t = RoomClass.objects.create(
+            room_class='T', price=Decimal('50'))
+        self.room_class_s = RoomClass.objects.create(
+            room_class='S', price=Decimal('75'))
+        room_t = Room.objects.create(room_class=self.room_class_t, number='1T')
+        room_s = Room.objects.create(room_class=self.room_class_s, number='1S')
+        owner = User.objects.create(username='test', last_name='Brown')
+        self.past = Reservation.objects.create(
+            name='Smith',
+            date_from=date.today() - timedelta(2),
+            date_to=date.today(),
+            owner=owner)
+        self.past.rooms.set([room_t])
+        self.future_t = Reservation.objects.create(
+            name='Smith',
+            date_from=date.today() + timedelta(1),
+            date_to=date.today() + timedelta(3),
+            owner=owner)
+        self.future_t.rooms.set([room_t])
+        self.future_s = Reservation.objects.create(
+            name='Smith',
+            date_from=date.today() + timedelta(1),
+            date_to=date.today() + timedelta(3),
+            owner=owner)
+        self.future_s.rooms.set([room_s])
+        for room_class in [self.room_class_t, self.room_class_s]:
+            room_class.price = Decimal('100')
+            room_class.save()
+
+    def _reprice(self, *args):
+        out = StringIO()
+        call_command('reprice_reservations', *args, stdout=out)
+        return out.getvalue()
+
+    def _costs(self):
+        return [
+            Reservation.objects.get(pk=r.pk).total_cost
+            for r in [self.past, self.future_t, self.future_s]]
+
+    def test_future_reservations_are_repriced(self):
+        self.assertIn('Repriced 2 reservations', self._reprice())
+        self.assertEqual(self._costs(), [100, 200, 200])
+
+    def test_reservations_since_date_are_repriced(self):
+        self._reprice('--since', self.past.date_from.isoformat())
+        self.assertEqual(self._costs(), [200, 200, 200])
+
+    def test_reservations_of_room_class_are_repriced(self):
+        self._reprice('--room-class', 'S')
+        self.assertEqual(self._costs(), [100, 100, 200])
+
+    def test_dry_run(self):
+        self.assertIn(
+            '2 reservations would be repriced', self._reprice('--dry-run'))
+        self.assertEqual(self._costs(), [100, 100, 150])
+
+
+class RebuildRollupsCommandTest(TestCase):
+    """
+    Test suite for rebuild_rollups command.
+    """
+
+    def setUp(self):
+        room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('50'))
+        room = Room.objects.create(room_class=room_class, number='1T')
+        self.reservation = Reservation.objects.create(
+            name='Smith',
+            date_from=date(2030, 1, 1),
+            date_to=date(2030, 1, 4),
+            owner=User.objects.create(username='test', last_name='Brown'))
+        self.reservation.rooms.set([room])
+
+    def _rebuild(self, *args):
+        out = StringIO()
+        call_command('rebuild_rollups', *args, stdout=out)
+        return out.getvalue()
+
+    def test_rollups_are_rebuilt(self):
+        self.assertIn('Recomputed rollups of 3 nights', self._rebuild())
+        self.assertEqual(
+            list(DailyRollup.objects.filter(room_class='T').order_by(
+                'day').values_list('rooms_sold', 'revenue')),
+            [(1, 50), (1, 50), (1, 50)])
+
+    def test_rollups_of_period_are_rebuilt(self):
+        self._rebuild('--since', '2030-01-02', '--until', '2030-01-03')
+        self.assertEqual(
+            set(DailyRollup.objects.values_list('day', flat=True)),
+            {date(2030, 1, 2)})
+
+
+class BenchmarkReportTest(SimpleTestCase):
+    """
+    Test suite for comparing reports of benchmark command.
+    """
+
+    def _report(self, **results):
+        return {'results': {
+            name: {'median_ms': median, 'p95_ms': median, 'queries': queries}
+            for name, (median, queries) in results.items()}}
+
+    def test_slower_measurements_are_regressions(self):
+        baseline = self._report(list=(10, 2), search=(10, 2), create=(10, 5))
+        report = self._report(list=(11, 2), search=(13, 2), create=(8, 5))
+        self.assertEqual(compare_reports(baseline, report), ['search'])
+        self.assertEqual(compare_reports(baseline, report, 50), [])
+
+    def test_small_slowdowns_are_noise(self):
+        baseline = self._report(availability=(1, 0))
+        report = self._report(availability=(1.5, 0))
+        self.assertEqual(compare_reports(baseline, report), [])
+
+    def test_more_queries_are_regressions(self):
+        baseline = self._report(create=(10, 5))
+        report = self._report(create=(5, 6))
+        self.assertEqual(compare_reports(baseline, report), ['create'])
+
+    def test_new_measurements_are_skipped(self):
+        baseline = self._report()
+        report = self._report(create=(10, 5))
+        self.assertEqual(compare_reports(baseline, report), [])
@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from rest_framework.test import APITestCase
+
+from hotel.models import Reservation, Room, RoomClass, RoomNight
+from hotel.serializers import ReservationSerializer
+
+DAY = date.today() + timedelta(7)
+
+
+class RoomNightsTest(APITestCase):
+    """
+    Test suite for maintaining booked room nights.
+    """
+
+    def setUp(self):
+        room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('30'))
+        self.rooms = [
+            Room.objects.create(number=str(n), room_class=room_class)
+            for n in range(101, 104)]
+        self.owner = User.objects.create(username='test', last_name='Brown')
+        self.reservation = self._reserve(DAY, DAY + timedelta(2), 0, 1)
+
+    def _reserve(self, date_from, date_to, *rooms):
+        reservation = Reservation.objects.create(
+            name='Brown',
+            date_from=date_from,
+            date_to=date_to,
+            owner=self.owner)
+        reservation.rooms.set([self.rooms[i] for i in rooms])
+        return reservation
+
+    def _nights(self, reservation=None):
+        return sorted(
+            ((night - DAY).days, room)
+            for night, room in RoomNight.objects.filter(
+                reservation=reservation or self.reservation).values_list(
+                'night', 'room'))
+
+    def test_nights_of_rooms_are_booked(self):
+        self.assertEqual(
+            self._nights(),
+            [(0, '101'), (0, '102'), (1, '101'), (1, '102')])
+
+    def test_nights_move_with_dates(self):
+        self.reservation.date_from = DAY + timedelta(1)
+        self.reservation.date_to = DAY + timedelta(3)
+        self.reservation.save()
+        self.assertEqual(
+            self._nights(),
+            [(1, '101'), (1, '102'), (2, '101'), (2, '102')])
+
+    def test_nights_of_removed_rooms_are_released(self):
+        self.reservation.rooms.remove(self.rooms[0])
+        self.assertEqual(self._nights(), [(0, '102'), (1, '102')])
+        self.rooms[1].reservations.clear()
+        self.assertEqual(self._nights(), [])
+
+    def test_nights_of_deleted_reservation_are_released(self):
+        self.reservation.delete()
+        self.assertFalse(RoomNight.objects.exists())
+
+    def test_database_rejects_double_booking(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._reserve(DAY + timedelta(1), DAY + timedelta(3), 1, 2)
+        self._reserve(DAY + timedelta(2), DAY + timedelta(3), 1, 2)
+
+    def test_rooms_can_be_swapped_when_dates_change(self):
+        # room leaving reservation is booked at its new dates
+        other = self._reserve(DAY + timedelta(2), DAY + timedelta(4), 0)
+        serializer = ReservationSerializer(self.reservation, data={
+            'date_from': DAY + timedelta(2),
+            'date_to': DAY + timedelta(4),
+            'rooms': ['103']}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(self._nights(), [(2, '103'), (3, '103')])
+        self.assertEqual(self._nights(other), [(2, '101'), (3, '101')])
+
+    def test_bulk_booking(self):
+        self.client.force_authenticate(self.owner)
+        self.client.post('/reservations/bulk/', {'reservations': [
+            {'id': self.reservation.pk,
+             'date_from': DAY + timedelta(1),
+             'date_to': DAY + timedelta(2),
+             'name': 'Brown',
+             'rooms': ['102']},
+            {'date_from': DAY,
+             'date_to': DAY + timedelta(1),
+             'rooms': ['102']}]})
+        created = Reservation.objects.exclude(pk=self.reservation.pk).get()
+        self.assertEqual(self._nights(), [(1, '102')])
+        self.assertEqual(self._nights(created), [(0, '102')])
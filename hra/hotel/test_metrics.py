@@ -0,0 +1,166 @@
+import re
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.core.signals import request_finished
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from hotel.authentication import issue_token
+from hotel.metrics import (MetricsRegistry, RequestMetrics,
+                           RequestMetricsMiddleware, request_metrics)
+from hotel.models import Reservation, Room, RoomClass
+
+
+@override_settings(HOTEL_METRICS_TOKEN='secret')
+class RequestMetricsTest(APITestCase):
+    """
+    Test suite for request metrics.
+    """
+
+    def setUp(self):
+        request_metrics.clear()
+        room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('30'))
+        self.user = User.objects.create(username='test', last_name='Brown')
+        reservation = Reservation.objects.create(
+            date_from=date.today() + timedelta(1),
+            date_to=date.today() + timedelta(3),
+            name='Brown',
+            owner=self.user)
+        reservation.rooms.set(
+            [Room.objects.create(number='101', room_class=room_class)])
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        cache.clear()
+        request_metrics.clear()
+
+    def _metrics(self):
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content.decode()
+
+    def test_server_timing(self):
+        response = self.client.get('/reservations/')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="[1-9]\d* queries", total;dur=[\d.]+$')
+
+    def test_metrics_of_view_actions(self):
+        self.client.get('/reservations/')
+        self.client.get('/reservations/')
+        self.client.get('/reservations/0/')
+        metrics = self._metrics()
+        self.assertIn(
+            'hotel_request_duration_seconds_count'
+            '{view="ReservationViewSet.list"} 2', metrics)
+        self.assertIn(
+            'hotel_request_db_queries_bucket'
+            '{view="ReservationViewSet.list",le="+Inf"} 2', metrics)
+        self.assertIn(
+            'hotel_requests_total'
+            '{view="ReservationViewSet.retrieve",status="404"} 1', metrics)
+
+    def test_histogram_buckets_are_cumulative(self):
+        self.client.get('/reservations/')
+        counts = [int(count) for count in re.findall(
+            r'hotel_request_db_queries_bucket'
+            r'\{view="ReservationViewSet.list",le="[^"]+"\} (\d+)',
+            self._metrics())]
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(counts[-1], 1)
+
+    def test_extra_actions_and_function_views(self):
+        self.client.get('/rooms/available/')
+        self.client.get(
+            '/async/rooms/',
+            HTTP_AUTHORIZATION='Bearer ' + issue_token(self.user))
+        metrics = self._metrics()
+        self.assertIn('view="RoomViewSet.available"', metrics)
+        self.assertIn('view="AsyncRoomViewSet.list"', metrics)
+
+    def test_metrics_of_other_workers_are_added(self):
+        other = MetricsRegistry()
+        with mock.patch('hotel.metrics.request_metrics', other):
+            self.client.get('/reservations/')
+            self.client.get('/reservations/0/')
+            # e.g. when worker exits
+            other.publish()
+        self.client.get('/reservations/')
+        metrics = self._metrics()
+        self.assertIn(
+            'hotel_request_duration_seconds_count'
+            '{view="ReservationViewSet.list"} 2', metrics)
+        self.assertIn(
+            'hotel_requests_total'
+            '{view="ReservationViewSet.retrieve",status="404"} 1', metrics)
+
+    @override_settings(HOTEL_METRICS_PUBLISH_INTERVAL=0)
+    def test_metrics_are_published_after_response(self):
+        other = MetricsRegistry()
+        middleware = RequestMetricsMiddleware(lambda request: HttpResponse())
+        with mock.patch('hotel.metrics.request_metrics', other), \
+                mock.patch.object(other, 'publish') as publish:
+            middleware(RequestFactory().get('/'))
+            publish.assert_not_called()
+            request_finished.send(sender=self.__class__)
+        publish.assert_called_once_with()
+
+    def test_increments_are_pipelined_with_redis(self):
+        backend = RedisCache('redis://localhost:6379/0', {})
+        # client is created lazily
+        backend.__dict__['_cache'] = client = mock.Mock()
+        pipeline = client.get_client.return_value.pipeline.return_value
+        other = MetricsRegistry()
+        metrics = RequestMetrics()
+        metrics.finish()
+        other.observe('ReservationViewSet.list', 200, metrics)
+        other.observe('ReservationViewSet.list', 200, metrics)
+        with mock.patch('hotel.metrics.caches', {'default': backend}):
+            other.publish()
+        pipeline.incrby.assert_any_call(
+            backend.make_and_validate_key(
+                'hotel:metrics:hotel_requests_total:'
+                'ReservationViewSet.list:200'),
+            2)
+        pipeline.execute.assert_called_once_with()
+        client.get_client.return_value.incr.assert_not_called()
+
+    def test_totals_are_kept(self):
+        self.client.get('/reservations/')
+        self._metrics()
+        self.client.get('/reservations/')
+        self.assertIn(
+            'hotel_requests_total'
+            '{view="ReservationViewSet.list",status="200"} 2',
+            self._metrics())
+
+    def test_token_is_required(self):
+        self.assertEqual(
+            self.client.get('/metrics').status_code,
+            status.HTTP_403_FORBIDDEN)
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer other')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(HOTEL_METRICS_TOKEN=None)
+    def test_no_metrics_without_token(self):
+        self.assertEqual(
+            self.client.get('/metrics').status_code,
+            status.HTTP_403_FORBIDDEN)
+
+    @override_settings(HOTEL_SLOW_REQUEST_SECONDS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('hotel.metrics', 'WARNING') as logs:
+            self.client.get('/reservations/')
+        self.assertIn('GET /reservations/ (ReservationViewSet.list)',
+                      logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
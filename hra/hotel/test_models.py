@@ -6,7 +6,7 @@ from django.contrib.auth.models import User
 from django.db.utils import IntegrityError
 from django.test import TestCase
 
-from hotel.models import Reservation, Room, RoomClass
+from hotel.models import Reservation, ReservationRoom, Room, RoomClass
 
 
 class RoomClassTest(TestCase):
@@ -106,6 +106,62 @@ class ReservationTest(TestCase):
         self.assertEqual(reservation.total_cost, 125)
         self.assertEqual(reservation.duration, 1)
 
+    def test_reservation_duration_is_stored(self):
+        reservation = Reservation.objects.create(
+            name='Smith',
+            date_from=date.today(),
+            date_to=date.today() + timedelta(1),
+            owner=self.owner
+        )
+        reservation.date_to = date.today() + timedelta(4)
+        reservation.save(update_fields=['date_to'])
+        self.assertEqual(
+            Reservation.objects.filter(duration=4).get(), reservation)
+
+    def test_reservation_cost_is_fixed_at_booking(self):
+        reservation = Reservation.objects.create(
+            name='Smith',
+            date_from=date.today(),
+            date_to=date.today() + timedelta(2),
+            owner=self.owner)
+        reservation.rooms.set([self.room_t])
+        self.assertEqual(reservation.total_cost, 100)
+        self.room_class_t.price = Decimal('60')
+        self.room_class_t.save()
+        reservation.rooms.add(self.room_s)
+        reservation = Reservation.objects.get(pk=reservation.pk)
+        # booked room keeps its price, added room is priced at current price
+        self.assertEqual(reservation.total_cost, 250)
+        self.assertEqual(
+            dict(ReservationRoom.objects.values_list('room', 'cost')),
+            {'1T': 100, '1S': 150})
+
+    def test_reservation_cost_follows_dates_and_rooms(self):
+        reservation = Reservation.objects.create(
+            name='Smith',
+            date_from=date.today(),
+            date_to=date.today() + timedelta(1),
+            owner=self.owner)
+        reservation.rooms.set([self.room_s, self.room_t])
+        self.room_class_t.price = Decimal('60')
+        self.room_class_t.save()
+        reservation.name = 'Smithson'
+        reservation.save()
+        self.assertEqual(
+            Reservation.objects.get(pk=reservation.pk).total_cost, 125)
+        reservation.date_to = date.today() + timedelta(3)
+        reservation.save(update_fields=['date_to'])
+        # changing dates prices rooms again, at current prices
+        self.assertEqual(reservation.total_cost, 405)
+        self.assertEqual(
+            Reservation.objects.get(pk=reservation.pk).total_cost, 405)
+        self.room_s.reservations.remove(reservation)
+        self.assertEqual(
+            Reservation.objects.get(pk=reservation.pk).total_cost, 180)
+        self.room_t.reservations.clear()
+        self.assertEqual(
+            Reservation.objects.get(pk=reservation.pk).total_cost, 0)
+
     @unittest.expectedFailure
     def test_reservation_without_rooms(self):
         # from documentation:
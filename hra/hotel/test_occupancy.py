@@ -0,0 +1,113 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from hotel.models import Reservation, Room, RoomClass
+from hotel.occupancy import occupancy_index
+
+
+class OccupancyIndexTest(TestCase):
+    """
+    Test suite for room occupancy index.
+    """
+
+    def setUp(self):
+        occupancy_index.invalidate()
+        self.room_class_t = RoomClass.objects.create(
+            room_class='T', price=Decimal('50'))
+        self.room_class_s = RoomClass.objects.create(
+            room_class='S', price=Decimal('75'))
+        self.room_t = Room.objects.create(
+            number='1T', room_class=self.room_class_t)
+        self.room_s = Room.objects.create(
+            number='1S', room_class=self.room_class_s)
+        self.owner = User.objects.create(username='test', last_name='Brown')
+        self.start = date.today() + timedelta(10)
+        self.reservation = self._reserve(
+            self.start, self.start + timedelta(3), [self.room_t])
+
+    def _reserve(self, date_from, date_to, rooms):
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = Reservation.objects.create(
+                name='Smith',
+                date_from=date_from,
+                date_to=date_to,
+                owner=self.owner)
+            reservation.rooms.set(rooms)
+        return reservation
+
+    def _available(self, date_from, date_to, room_class=None):
+        return [number for number, _ in occupancy_index.available_rooms(
+            date_from, date_to, room_class)]
+
+    def test_room_is_not_available_within_overlapping_period(self):
+        self.assertEqual(
+            self._available(
+                self.start + timedelta(1), self.start + timedelta(2)),
+            [self.room_s.number])
+        self.assertEqual(
+            self._available(
+                self.start - timedelta(1), self.start + timedelta(1)),
+            [self.room_s.number])
+        self.assertEqual(
+            self._available(
+                self.start + timedelta(2), self.start + timedelta(5)),
+            [self.room_s.number])
+
+    def test_room_is_available_right_before_and_after_reservation(self):
+        self.assertEqual(
+            self._available(self.start - timedelta(2), self.start),
+            [self.room_s.number, self.room_t.number])
+        self.assertEqual(
+            self._available(
+                self.start + timedelta(3), self.start + timedelta(4)),
+            [self.room_s.number, self.room_t.number])
+
+    def test_available_rooms_of_room_class(self):
+        self.assertEqual(
+            self._available(self.start - timedelta(2), self.start, 'T'),
+            [self.room_t.number])
+
+    def test_search_does_not_query_database_once_loaded(self):
+        self._available(self.start, self.start + timedelta(1))
+        with self.assertNumQueries(0):
+            self._available(self.start, self.start + timedelta(1))
+
+    def test_index_follows_reservation_changes(self):
+        self._available(self.start, self.start + timedelta(1))
+        reservation = self._reserve(
+            self.start + timedelta(5), self.start + timedelta(7),
+            [self.room_s])
+        self.assertEqual(
+            self._available(
+                self.start + timedelta(6), self.start + timedelta(7)),
+            [self.room_t.number])
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.date_from = self.start + timedelta(10)
+            reservation.date_to = self.start + timedelta(11)
+            reservation.save()
+        self.assertEqual(
+            self._available(
+                self.start + timedelta(6), self.start + timedelta(7)),
+            [self.room_s.number, self.room_t.number])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reservation.rooms.set([self.room_s])
+        self.assertEqual(
+            self._available(self.start, self.start + timedelta(1)),
+            [self.room_t.number])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reservation.delete()
+        self.assertEqual(
+            self._available(self.start, self.start + timedelta(1)),
+            [self.room_s.number, self.room_t.number])
+
+    def test_index_follows_room_changes(self):
+        self._available(self.start, self.start + timedelta(1))
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(number='2T', room_class=self.room_class_t)
+            self.room_t.delete()
+        self.assertEqual(
+            self._available(self.start, self.start + timedelta(1)),
+            [self.room_s.number, '2T'])
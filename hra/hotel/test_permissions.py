@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.test import TestCase
+
+from hotel.permissions import (STAFF_CACHE_KEY, STAFF_CACHE_VERSION_KEY,
+                               STAFF_USER_VERSION_KEY, is_staff)
+
+
+class IsStaffTest(TestCase):
+    """
+    Test suite for staff role resolution.
+    """
+
+    def setUp(self):
+        self.staff_group, _ = Group.objects.get_or_create(name='staff')
+        self.user = User.objects.create(username='test')
+
+    def tearDown(self):
+        # users' ids are reused by other tests
+        cache.clear()
+
+    def _fresh_user(self):
+        # as loaded by authentication in each request
+        return User.objects.get(pk=self.user.pk)
+
+    def test_admin_is_staff(self):
+        admin = User.objects.create(username='admin', is_staff=True)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_staff(admin))
+
+    def test_anonymous_user_is_not_staff(self):
+        with self.assertNumQueries(0):
+            self.assertFalse(is_staff(AnonymousUser()))
+
+    def test_staff_group_member_is_staff(self):
+        self.user.groups.add(self.staff_group)
+        self.assertTrue(is_staff(self._fresh_user()))
+
+    def test_staff_role_is_memoized_on_user(self):
+        user = self._fresh_user()
+        with self.assertNumQueries(1):
+            self.assertFalse(is_staff(user))
+            self.assertFalse(is_staff(user))
+
+    def test_staff_role_is_cached_across_requests(self):
+        is_staff(self._fresh_user())
+        user = self._fresh_user()
+        with self.assertNumQueries(0):
+            self.assertFalse(is_staff(user))
+
+    def _commit(self):
+        # cache is invalidated when changes are committed
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def test_cache_is_invalidated_when_groups_change(self):
+        self.assertFalse(is_staff(self._fresh_user()))
+        with self._commit():
+            self.user.groups.add(self.staff_group)
+        self.assertTrue(is_staff(self._fresh_user()))
+        with self._commit():
+            self.staff_group.user_set.remove(self.user)
+        self.assertFalse(is_staff(self._fresh_user()))
+        with self._commit():
+            self.staff_group.user_set.add(self.user)
+        self.assertTrue(is_staff(self._fresh_user()))
+        with self._commit():
+            self.staff_group.user_set.clear()
+        self.assertFalse(is_staff(self._fresh_user()))
+
+    def test_cache_is_invalidated_when_group_is_renamed(self):
+        with self._commit():
+            self.user.groups.add(self.staff_group)
+        self.assertTrue(is_staff(self._fresh_user()))
+        with self._commit():
+            self.staff_group.name = 'former staff'
+            self.staff_group.save()
+        self.assertFalse(is_staff(self._fresh_user()))
+
+    def test_membership_cached_before_commit_is_dropped(self):
+        is_staff(self._fresh_user())
+        key = STAFF_CACHE_KEY.format(
+            self.user.pk, cache.get(STAFF_CACHE_VERSION_KEY),
+            cache.get(STAFF_USER_VERSION_KEY.format(self.user.pk)))
+        with self._commit():
+            self.user.groups.add(self.staff_group)
+            # concurrent request still sees membership before the change
+            cache.set(key, False)
+        self.assertTrue(is_staff(self._fresh_user()))
+
+    def test_membership_read_before_change_is_not_used(self):
+        with self._commit():
+            self.user.groups.add(self.staff_group)
+        exists = QuerySet.exists
+        changes = [lambda: self.staff_group.user_set.remove(self.user)]
+
+        def exists_before_change(queryset):
+            result = exists(queryset)
+            # membership is revoked before the request caches what it read
+            if changes:
+                with self._commit():
+                    changes.pop()()
+            return result
+
+        with mock.patch.object(QuerySet, 'exists', exists_before_change):
+            self.assertTrue(is_staff(self._fresh_user()))
+        self.assertFalse(is_staff(self._fresh_user()))
+
+    def test_evicted_versions_start_over(self):
+        with self._commit():
+            self.user.groups.add(self.staff_group)
+        self.assertTrue(is_staff(self._fresh_user()))
+        with self._commit():
+            self.staff_group.name = 'former staff'
+            self.staff_group.save()
+        cache.delete_many([
+            STAFF_CACHE_VERSION_KEY,
+            STAFF_USER_VERSION_KEY.format(self.user.pk)])
+        self.assertFalse(is_staff(self._fresh_user()))
@@ -0,0 +1,126 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from hotel.models import Reservation, Room, RoomClass, RoomRate
+from hotel.pricing import RatePlan, rate_plans
+
+# Monday
+MONDAY = date(2030, 1, 7)
+# Friday and Saturday nights
+WEEKEND = 0b0110000
+
+
+class RatePlanTest(TestCase):
+    """
+    Test suite for compiled rate plans.
+    """
+
+    def _plan(self, *rates):
+        return RatePlan(Decimal('50'), [
+            rate + (i,) for i, rate in enumerate(rates)])
+
+    def _days(self, start, end):
+        return MONDAY + timedelta(start), MONDAY + timedelta(end)
+
+    def test_base_price_without_rates(self):
+        self.assertEqual(self._plan().cost(*self._days(0, 3)), 150)
+
+    def test_season(self):
+        plan = self._plan(self._days(2, 5) + (Decimal('80'), 127, 0))
+        self.assertEqual(plan.cost(*self._days(0, 3)), 50 + 50 + 80)
+        self.assertEqual(plan.cost(*self._days(3, 4)), 80)
+        self.assertEqual(plan.cost(*self._days(4, 7)), 80 + 50 + 50)
+        self.assertEqual(plan.cost(*self._days(-10, 10)), 20 * 50 + 3 * 30)
+
+    def test_weekends(self):
+        plan = self._plan(self._days(0, 365) + (Decimal('70'), WEEKEND, 0))
+        self.assertEqual(plan.cost(*self._days(0, 7)), 5 * 50 + 2 * 70)
+        self.assertEqual(plan.cost(*self._days(5, 6)), 70)
+        self.assertEqual(plan.cost(*self._days(3, 33)), 30 * 50 + 9 * 20)
+
+    def test_higher_priority_wins(self):
+        plan = self._plan(
+            self._days(0, 30) + (Decimal('80'), 127, 1),
+            self._days(5, 10) + (Decimal('200'), 127, 2),
+            self._days(5, 10) + (Decimal('100'), WEEKEND, 0))
+        self.assertEqual(plan.cost(*self._days(4, 7)), 80 + 200 + 200)
+
+    def test_later_rate_wins_with_equal_priority(self):
+        plan = self._plan(
+            self._days(0, 30) + (Decimal('80'), 127, 0),
+            self._days(0, 30) + (Decimal('90'), 127, 0))
+        self.assertEqual(plan.cost(*self._days(0, 1)), 90)
+
+    def test_rate_applies_only_to_its_weekdays(self):
+        plan = self._plan(
+            self._days(0, 30) + (Decimal('80'), 127, 0),
+            self._days(0, 30) + (Decimal('10'), WEEKEND, 1))
+        self.assertEqual(plan.cost(*self._days(0, 7)), 5 * 80 + 2 * 10)
+
+
+class RatePlansTest(TestCase):
+    """
+    Test suite for loading and pricing with rates of room classes.
+    """
+
+    def setUp(self):
+        self.room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('50'))
+        self.rate = RoomRate.objects.create(
+            room_class=self.room_class,
+            date_from=MONDAY,
+            date_to=MONDAY + timedelta(7),
+            price=Decimal('80'))
+        self.rooms = [
+            Room.objects.create(number=str(n), room_class=self.room_class)
+            for n in range(10)]
+        self.owner = User.objects.create(username='test', last_name='Brown')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_plans_are_loaded_with_single_query_and_cached(self):
+        RoomClass.objects.create(room_class='S', price=Decimal('75'))
+        with self.assertNumQueries(1):
+            plans = rate_plans(['T', 'S'])
+        with self.assertNumQueries(0):
+            self.assertEqual(rate_plans(['T', 'S']).keys(), plans.keys())
+        self.assertEqual(
+            plans['T'].cost(MONDAY, MONDAY + timedelta(8)), 7 * 80 + 50)
+        self.assertEqual(plans['S'].cost(MONDAY, MONDAY + timedelta(1)), 75)
+
+    def test_plan_is_invalidated_when_rates_change(self):
+        rate_plans(['T'])
+        self.rate.price = Decimal('90')
+        self.rate.save()
+        self.assertEqual(
+            rate_plans(['T'])['T'].cost(MONDAY, MONDAY + timedelta(1)), 90)
+        self.rate.delete()
+        self.assertEqual(
+            rate_plans(['T'])['T'].cost(MONDAY, MONDAY + timedelta(1)), 50)
+
+    def test_plan_is_invalidated_when_base_price_changes(self):
+        rate_plans(['T'])
+        self.room_class.price = Decimal('60')
+        self.room_class.save()
+        self.assertEqual(
+            rate_plans(['T'])['T'].cost(
+                MONDAY - timedelta(1), MONDAY), 60)
+
+    def test_reservation_is_priced_with_rates(self):
+        reservation = Reservation.objects.create(
+            name='Smith',
+            date_from=MONDAY - timedelta(2),
+            date_to=MONDAY + timedelta(28),
+            owner=self.owner)
+        rate_plans(['T'])
+        # rooms are priced and their nights booked with fixed number of
+        # queries
+        with self.assertNumQueries(9):
+            reservation.rooms.set(self.rooms)
+        self.assertEqual(
+            reservation.total_cost, 10 * (2 * 50 + 7 * 80 + 21 * 50))
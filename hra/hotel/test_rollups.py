@@ -0,0 +1,200 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from hotel import rollups
+from hotel.models import DailyRollup, Reservation, Room, RoomClass
+
+DAY = date(2030, 1, 7)
+
+
+class RollupsTest(APITestCase):
+    """
+    Test suite for maintaining daily rollups.
+    """
+
+    def setUp(self):
+        self.room_class_t = RoomClass.objects.create(
+            room_class='T', price=Decimal('100'))
+        self.room_class_s = RoomClass.objects.create(
+            room_class='S', price=Decimal('50'))
+        self.room_t = Room.objects.create(
+            number='1', room_class=self.room_class_t)
+        self.room_s = Room.objects.create(
+            number='2', room_class=self.room_class_s)
+        self.owner = User.objects.create(username='test', last_name='Brown')
+
+    def tearDown(self):
+        cache.clear()
+
+    def _reserve(self, date_from, date_to, *rooms):
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = Reservation.objects.create(
+                name='Brown',
+                date_from=date_from,
+                date_to=date_to,
+                owner=self.owner)
+            reservation.rooms.set(rooms)
+        return reservation
+
+    def _rollups(self):
+        return {
+            ((day - DAY).days, room_class): (sold, revenue)
+            for day, room_class, sold, revenue in DailyRollup.objects.filter(
+                rooms_sold__gt=0).values_list(
+                'day', 'room_class', 'rooms_sold', 'revenue')}
+
+    def test_booking_updates_rollups(self):
+        self._reserve(DAY, DAY + timedelta(2), self.room_t, self.room_s)
+        self.assertEqual(self._rollups(), {
+            (0, 'T'): (1, 100), (1, 'T'): (1, 100),
+            (0, 'S'): (1, 50), (1, 'S'): (1, 50)})
+
+    def test_revenue_is_spread_evenly(self):
+        self.room_class_t.price = Decimal('33.34')
+        self.room_class_t.save()
+        self._reserve(DAY, DAY + timedelta(3), self.room_t)
+        self.assertEqual(self._rollups(), {
+            (0, 'T'): (1, Decimal('33.34')),
+            (1, 'T'): (1, Decimal('33.34')),
+            (2, 'T'): (1, Decimal('33.34'))})
+        self.assertEqual(
+            sum(r.revenue for r in DailyRollup.objects.all()),
+            Decimal('100.02'))
+
+    def test_changing_dates_moves_nights(self):
+        reservation = self._reserve(DAY, DAY + timedelta(2), self.room_t)
+        reservation.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.date_from = DAY + timedelta(5)
+            reservation.date_to = DAY + timedelta(6)
+            reservation.save()
+        self.assertEqual(self._rollups(), {(5, 'T'): (1, 100)})
+
+    def test_changing_rooms(self):
+        reservation = self._reserve(DAY, DAY + timedelta(1), self.room_t)
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.rooms.set([self.room_s])
+        self.assertEqual(self._rollups(), {(0, 'S'): (1, 50)})
+
+    def test_deleting_reservation(self):
+        reservation = self._reserve(DAY, DAY + timedelta(1), self.room_t)
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.delete()
+        self.assertEqual(self._rollups(), {})
+
+    def test_moving_room_to_other_class(self):
+        self._reserve(DAY, DAY + timedelta(1), self.room_t)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room_t.room_class = self.room_class_s
+            self.room_t.save()
+        self.assertEqual(self._rollups(), {(0, 'S'): (1, 100)})
+
+    def test_saving_room_in_same_class(self):
+        self._reserve(DAY, DAY + timedelta(1), self.room_t)
+        with mock.patch('hotel.rollups.days_changed') as days_changed, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.room_t.save()
+            Room.objects.get(pk=self.room_t.pk).save()
+        days_changed.assert_not_called()
+        with self.captureOnCommitCallbacks(execute=True):
+            room = Room.objects.get(pk=self.room_t.pk)
+            room.room_class = self.room_class_s
+            room.save()
+        self.assertEqual(self._rollups(), {(0, 'S'): (1, 100)})
+
+    def test_bulk_booking_updates_rollups(self):
+        self.client.force_authenticate(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/reservations/bulk/', {
+                'reservations': [{
+                    'date_from': DAY,
+                    'date_to': DAY + timedelta(1),
+                    'rooms': ['1', '2']}]})
+        self.assertEqual(response.data[0]['status'], 201)
+        self.assertEqual(self._rollups(), {
+            (0, 'T'): (1, 100), (0, 'S'): (1, 50)})
+
+    def test_rebuild(self):
+        self._reserve(DAY, DAY + timedelta(2), self.room_t, self.room_s)
+        self._reserve(DAY + timedelta(2), DAY + timedelta(4), self.room_s)
+        expected = self._rollups()
+        DailyRollup.objects.all().delete()
+        DailyRollup.objects.create(
+            day=DAY - timedelta(10), room_class=self.room_class_t,
+            rooms_sold=1)
+        self.assertEqual(rollups.rebuild(), 4)
+        self.assertEqual(self._rollups(), expected)
+
+
+class OccupancyReportViewTest(APITestCase):
+    """
+    Test suite for reports/occupancy/ endpoint.
+    """
+    uri = '/reports/occupancy/'
+
+    def setUp(self):
+        room_class_t = RoomClass.objects.create(
+            room_class='T', price=Decimal('100'))
+        room_class_s = RoomClass.objects.create(
+            room_class='S', price=Decimal('50'))
+        for n in range(4):
+            Room.objects.create(
+                number='T{}'.format(n), room_class=room_class_t)
+        Room.objects.create(number='S0', room_class=room_class_s)
+        for day in range(10):
+            DailyRollup.objects.create(
+                day=DAY + timedelta(day), room_class=room_class_t,
+                rooms_sold=2, revenue=Decimal('200'))
+            DailyRollup.objects.create(
+                day=DAY + timedelta(day), room_class=room_class_s,
+                rooms_sold=0, revenue=Decimal('0'))
+        self.staff = User.objects.create(username='admin', is_staff=True)
+
+    def tearDown(self):
+        cache.clear()
+
+    def _get(self, **params):
+        params.setdefault('date_from', DAY)
+        params.setdefault('date_to', DAY + timedelta(5))
+        return self.client.get(self.uri, params)
+
+    def test_report_is_for_staff_only(self):
+        self.assertEqual(
+            self._get().status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(User.objects.create(username='test'))
+        self.assertEqual(self._get().status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_report_per_room_class(self):
+        self.client.force_authenticate(self.staff)
+        with self.assertNumQueries(2):
+            response = self._get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['room_classes'], [
+            {'room_class': 'S', 'rooms': 1, 'rooms_sold': 0,
+             'revenue': 0, 'occupancy': 0.0, 'adr': None, 'revpar': 0},
+            {'room_class': 'T', 'rooms': 4, 'rooms_sold': 10,
+             'revenue': 1000, 'occupancy': 0.5, 'adr': 100, 'revpar': 50}])
+        self.assertEqual(response.data['total'], {
+            'rooms': 5, 'rooms_sold': 10, 'revenue': 1000,
+            'occupancy': 0.4, 'adr': 100, 'revpar': 40})
+        self.assertNotIn('days', response.data)
+
+    def test_daily_report_of_room_class(self):
+        self.client.force_authenticate(self.staff)
+        response = self._get(room_class='T', daily=True)
+        self.assertEqual(len(response.data['room_classes']), 1)
+        self.assertEqual(len(response.data['days']), 5)
+        self.assertEqual(response.data['days'][0], {
+            'day': DAY, 'room_class': 'T', 'rooms': 4, 'rooms_sold': 2,
+            'revenue': 200, 'occupancy': 0.5, 'adr': 100, 'revpar': 50})
+
+    def test_invalid_period(self):
+        self.client.force_authenticate(self.staff)
+        response = self._get(date_to=DAY)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,122 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from hotel.models import Reservation, Room, RoomClass
+from hotel.routers import ReplicaRouter
+
+# test database stands in for the replica, reads routed to it are told apart
+# from reads left to the default database (routed to None)
+REPLICA = 'default'
+
+
+@override_settings(HOTEL_REPLICA_DATABASE=REPLICA)
+class ReplicaRouterTest(APITestCase):
+    """
+    Test suite for routing of reads to the replica database.
+    """
+
+    def setUp(self):
+        self.room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('30'))
+        self.room = Room.objects.create(
+            number='101', room_class=self.room_class)
+        self.user = User.objects.create(username='test', last_name='Brown')
+        self.other = User.objects.create(username='other')
+        self.reservation = Reservation.objects.create(
+            date_from=date.today() + timedelta(1),
+            date_to=date.today() + timedelta(3),
+            name='Brown',
+            owner=self.user)
+        self.reservation.rooms.set([self.room])
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def _request(self, method, uri, **kwargs):
+        """
+        Makes request and returns response with databases its reads were
+        routed to.
+        """
+        reads = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            db = db_for_read(router, model, **hints)
+            reads.append(db)
+            return db
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            response = getattr(self.client, method)(uri, **kwargs)
+        return response, reads
+
+    def _reserve(self):
+        return self._request('post', '/reservations/', data={
+            'date_from': date.today() + timedelta(5),
+            'date_to': date.today() + timedelta(6),
+            'rooms': ['101']})
+
+    def test_list_reads_from_replica(self):
+        response, reads = self._request('get', '/reservations/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(REPLICA, reads)
+
+    def test_search_reads_from_replica(self):
+        response, reads = self._request(
+            'get', '/reservations/search/?name=Brown')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(REPLICA, reads)
+
+    @override_settings(HOTEL_REPLICA_DATABASE=None)
+    def test_reads_from_primary_without_replica(self):
+        response, reads = self._request('get', '/reservations/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(REPLICA, reads)
+
+    def test_writes_read_from_primary(self):
+        response, reads = self._reserve()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn(REPLICA, reads)
+
+    def test_user_reads_own_writes_from_primary(self):
+        self._reserve()
+        response, reads = self._request('get', '/reservations/')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotIn(REPLICA, reads)
+        # pin expires
+        cache.clear()
+        response, reads = self._request('get', '/reservations/')
+        self.assertIn(REPLICA, reads)
+
+    def test_other_users_read_from_replica(self):
+        self._reserve()
+        self.client.force_authenticate(self.other)
+        response, reads = self._request('get', '/reservations/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(REPLICA, reads)
+
+    def test_recently_changed_rooms_are_not_cached_from_replica(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(number='102', room_class=self.room_class)
+        self.client.get('/rooms/')
+        response, reads = self._request('get', '/rooms/')
+        self.assertIn(REPLICA, reads)
+        with mock.patch('hotel.caching.time') as clock:
+            # replica has caught up
+            clock.time.return_value = time.time() + 10
+            self.client.get('/rooms/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/rooms/')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_replica_is_not_migrated(self):
+        self.assertIs(
+            ReplicaRouter().allow_migrate(REPLICA, 'hotel'), False)
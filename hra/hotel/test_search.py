@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from hotel.models import Reservation
+from hotel.search import filter_name, rank_by_name, similarity
+
+
+class NameSearchTest(TestCase):
+    """
+    Test suite for searching reservations by name.
+    """
+
+    def setUp(self):
+        owner = User.objects.create(username='test', last_name='Brown')
+        for name in ['Smith', 'Smithson', 'Goldsmith', 'Smyth', 'Johnson',
+                     'Jo']:
+            Reservation.objects.create(
+                date_from=date.today(),
+                date_to=date.today() + timedelta(1),
+                name=name,
+                owner=owner)
+
+    def _names(self, name, match):
+        return sorted(r.name for r in filter_name(
+            Reservation.objects.all(), name, match))
+
+    def test_contains(self):
+        self.assertEqual(
+            self._names('smit', 'contains'),
+            ['Goldsmith', 'Smith', 'Smithson'])
+
+    def test_contains_short_name(self):
+        self.assertEqual(self._names('Jo', 'contains'), ['Jo', 'Johnson'])
+
+    def test_prefix(self):
+        self.assertEqual(
+            self._names('Smi', 'prefix'), ['Smith', 'Smithson'])
+        self.assertEqual(self._names('J', 'prefix'), ['Jo', 'Johnson'])
+
+    def test_fuzzy(self):
+        names = [r.name for r in rank_by_name(
+            filter_name(Reservation.objects.all(), 'Smithe', 'fuzzy'),
+            'Smithe', 'fuzzy', 10)]
+        self.assertEqual(names, ['Smith', 'Smithson'])
+
+    def test_ranking(self):
+        names = [r.name for r in rank_by_name(
+            filter_name(Reservation.objects.all(), 'smith', 'contains'),
+            'smith', 'contains', 2)]
+        self.assertEqual(names, ['Smith', 'Smithson'])
+
+    def test_ranked_candidates_are_limited(self):
+        other = User.objects.create(username='other')
+        smith = Reservation.objects.create(
+            date_from=date.today(),
+            date_to=date.today() + timedelta(1),
+            name='Smithfield',
+            owner=other)
+        reservations = filter_name(
+            Reservation.objects.filter(owner=other), 'smith', 'contains')
+        with mock.patch('hotel.search.RANKED_CANDIDATES', 1):
+            # better candidates of other owners don't take the place
+            self.assertEqual(
+                rank_by_name(reservations, 'smith', 'contains', 10), [smith])
+            self.assertEqual(
+                len(rank_by_name(
+                    filter_name(Reservation.objects.all(), 'smith',
+                                'contains'),
+                    'smith', 'contains', 10)),
+                1)
+
+    def test_index_follows_name_changes(self):
+        Reservation.objects.filter(name='Smyth').update(name='Smithy')
+        Reservation.objects.filter(name='Goldsmith').delete()
+        self.assertEqual(
+            self._names('smith', 'contains'),
+            ['Smith', 'Smithson', 'Smithy'])
+
+    def test_similarity(self):
+        self.assertEqual(similarity('Smith', 'smith'), 1)
+        self.assertEqual(similarity('Smith', 'Jones'), 0)
+        # example from pg_trgm documentation
+        self.assertAlmostEqual(similarity('word', 'two words'), 4 / 11)
@@ -1,12 +1,16 @@
 from decimal import Decimal
 from datetime import date, timedelta
+from unittest import mock
 from django.contrib.auth.models import User
 
-from django.test import TestCase
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase
+from rest_framework.exceptions import ValidationError
 
+from hotel.exceptions import BookingConflictError
 from hotel.models import Reservation, Room, RoomClass
-from hotel.serializers import (ReservationSerializer, RoomClassSerializer,
-                               RoomSerializer)
+from hotel.serializers import (BOOKING_ATTEMPTS, ReservationSerializer,
+                               RoomClassSerializer, RoomSerializer)
 
 
 class RoomClassSerializerTest(TestCase):
@@ -236,3 +240,99 @@ class ReservationSerializerTest(TestCase):
     def test_start_date_in_the_past(self):
         self._test_invalid_fields_deserialization(
             date_from=date.today() - timedelta(1))
+
+    def test_unavailable_rooms_are_named_in_error(self):
+        deserializer = ReservationSerializer(
+            data=self.reservation_deserializer_valid_data | {
+                'date_from': self.reservation.date_from.isoformat(),
+                'date_to': self.reservation.date_to.isoformat(),
+                'rooms': [self.room_t.number, self.room_s.number]})
+        self.assertFalse(deserializer.is_valid())
+        error = str(deserializer.errors['non_field_errors'][0])
+        self.assertIn(self.room_t.number, error)
+        self.assertNotIn(self.room_s.number, error)
+
+    def test_room_availability_is_checked_in_single_query(self):
+        rooms = [
+            Room.objects.create(number=str(n), room_class=self.room_class_s)
+            for n in range(20)]
+        with self.assertNumQueries(1):
+            unavailable = self.deserializer._unavailable_rooms(
+                rooms + [self.room_t],
+                self.reservation.date_from,
+                self.reservation.date_to)
+        self.assertEqual(unavailable, [self.room_t.number])
+
+    def test_updated_reservation_does_not_collide_with_itself(self):
+        deserializer = ReservationSerializer(
+            self.reservation,
+            data={'date_to': (self.reservation.date_to +
+                              timedelta(1)).isoformat()},
+            partial=True)
+        self.assertEqual(
+            deserializer._unavailable_rooms(
+                [self.room_t],
+                self.reservation.date_from,
+                self.reservation.date_to + timedelta(1)),
+            [])
+
+    def test_availability_is_checked_again_when_saving(self):
+        # another reservation is made after validation, but before saving
+        self.assertTrue(self.deserializer.is_valid())
+        Reservation.objects.create(
+            date_from=date.today(),
+            date_to=date.today() + timedelta(1),
+            name='Jones',
+            owner=self.owner).rooms.set([self.room_s])
+        with self.assertRaises(ValidationError):
+            self.deserializer.save(owner=self.owner)
+        self.assertEqual(Reservation.objects.count(), 2)
+
+
+class ReservationSerializerConcurrencyTest(TransactionTestCase):
+    """
+    Test suite for saving reservations under concurrent writes.
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create(username='test', last_name='Brown')
+        room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('10'))
+        Room.objects.create(number='T1', room_class=room_class)
+        self.data = {
+            'date_from': date.today().isoformat(),
+            'date_to': (date.today() + timedelta(3)).isoformat(),
+            'name': 'Smith',
+            'rooms': ['T1']
+        }
+
+    def _locking_fails(self, times):
+        failures = iter(range(times))
+        original = ReservationSerializer._lock_and_validate_rooms
+
+        def lock_and_validate_rooms(serializer, validated_data):
+            if next(failures, None) is not None:
+                raise OperationalError('database is locked')
+            return original(serializer, validated_data)
+        return mock.patch.object(
+            ReservationSerializer,
+            '_lock_and_validate_rooms',
+            lock_and_validate_rooms)
+
+    def test_booking_is_retried(self):
+        deserializer = ReservationSerializer(data=self.data)
+        self.assertTrue(deserializer.is_valid())
+        with self._locking_fails(BOOKING_ATTEMPTS - 1), \
+                mock.patch('hotel.serializers.time.sleep') as sleep:
+            deserializer.save(owner=self.owner)
+        self.assertEqual(sleep.call_count, BOOKING_ATTEMPTS - 1)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_booking_retries_are_bounded(self):
+        deserializer = ReservationSerializer(data=self.data)
+        self.assertTrue(deserializer.is_valid())
+        with self._locking_fails(BOOKING_ATTEMPTS), \
+                mock.patch('hotel.serializers.time.sleep'):
+            with self.assertRaises(BookingConflictError):
+                deserializer.save(owner=self.owner)
+        self.assertEqual(Reservation.objects.count(), 0)
@@ -0,0 +1,20 @@
+from django.db import connection
+from django.test import TestCase
+
+
+class SqliteConnectionTest(TestCase):
+    """
+    Test suite for tuning of SQLite connections.
+    """
+
+    def _pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA ' + name)
+            return cursor.fetchone()[0]
+
+    def test_connection_is_tuned(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        # NORMAL
+        self.assertEqual(self._pragma('synchronous'), 1)
+        self.assertEqual(self._pragma('busy_timeout'), 20000)
@@ -0,0 +1,168 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from hotel.models import Room, RoomClass
+from hotel.exceptions import ServiceOverloadedError
+from hotel.throttling import (ADMISSION_SLOT_KEY, TokenBucketThrottle,
+                              admission_limiter, throttle_cache)
+
+DAY = date.today() + timedelta(7)
+
+
+def rates(**rates):
+    """
+    Overrides throttle rates of given scopes, other scopes are not limited.
+    """
+    return override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates))
+
+
+class ThrottlingTest(APITestCase):
+    """
+    Test suite for throttling of requests.
+    """
+
+    def setUp(self):
+        cache.clear()
+        room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('30'))
+        for n in range(101, 106):
+            Room.objects.create(number=str(n), room_class=room_class)
+        self.user = User.objects.create(username='test', last_name='Brown')
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def _book(self, room, nights=1):
+        return self.client.post('/reservations/', {
+            'date_from': DAY,
+            'date_to': DAY + timedelta(nights),
+            'rooms': [str(room)]})
+
+    @rates(booking='2/min')
+    def test_bookings_are_throttled(self):
+        self.assertEqual(self._book(101).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._book(102).status_code, status.HTTP_201_CREATED)
+        response = self._book(103)
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(int(response['Retry-After']), 30)
+        # other actions and other users are not limited by the bookings
+        self.assertEqual(
+            self.client.get('/reservations/').status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(
+            User.objects.create(username='other', last_name='Smith'))
+        self.assertEqual(self._book(103).status_code, status.HTTP_201_CREATED)
+
+    @rates(booking='2/min')
+    def test_bucket_is_refilled(self):
+        with patch.object(TokenBucketThrottle, 'timer', return_value=1000):
+            self._book(101)
+            self._book(102)
+        # a token per 30 seconds
+        with patch.object(TokenBucketThrottle, 'timer', return_value=1029):
+            self.assertEqual(
+                self._book(103).status_code,
+                status.HTTP_429_TOO_MANY_REQUESTS)
+        with patch.object(TokenBucketThrottle, 'timer', return_value=1030):
+            self.assertEqual(
+                self._book(103).status_code, status.HTTP_201_CREATED)
+            self.assertEqual(
+                self._book(104).status_code,
+                status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @rates(anon='1/min')
+    def test_anonymous_requests_are_throttled(self):
+        # e.g. guessing passwords
+        self.client.force_authenticate(None)
+        credentials = {'username': 'test', 'password': 'secret'}
+        response = self.client.post('/auth/token/', credentials)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/auth/token/', credentials)
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+@rates()
+class AdmissionControlTest(APITestCase):
+    """
+    Test suite for limiting concurrent expensive requests.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test', last_name='Brown')
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def _free_slots(self):
+        return [i for i in range(settings.HOTEL_MAX_CONCURRENT_REQUESTS)
+                if cache.get(ADMISSION_SLOT_KEY.format(i)) is None]
+
+    @override_settings(HOTEL_MAX_CONCURRENT_REQUESTS=2)
+    def test_requests_are_rejected_when_busy(self):
+        slots = [admission_limiter.acquire() for _ in range(2)]
+        response = self.client.get('/reservations/search/', {'name': 'Bro'})
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        # cheap requests are not limited
+        self.assertEqual(
+            self.client.get('/reservations/').status_code, status.HTTP_200_OK)
+        admission_limiter.release(slots[0])
+        response = self.client.get('/reservations/search/', {'name': 'Bro'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_rejecting_takes_single_round_trip(self):
+        slots = [admission_limiter.acquire()
+                 for _ in range(settings.HOTEL_MAX_CONCURRENT_REQUESTS)]
+        self.assertEqual(self._free_slots(), [])
+        limiter_cache = throttle_cache()
+        with patch.object(limiter_cache, 'add') as add, \
+                patch.object(limiter_cache, 'get_many',
+                             wraps=limiter_cache.get_many) as get_many:
+            with self.assertRaises(ServiceOverloadedError):
+                admission_limiter.acquire()
+        get_many.assert_called_once()
+        add.assert_not_called()
+        admission_limiter.release(slots[3])
+        self.assertEqual(len(self._free_slots()), 1)
+        admission_limiter.acquire()
+        self.assertEqual(self._free_slots(), [])
+
+    @override_settings(HOTEL_MAX_CONCURRENT_REQUESTS=2)
+    def test_slot_is_released_after_request(self):
+        self.client.get('/reservations/search/')
+        self.assertEqual(len(self._free_slots()), 2)
+
+    @override_settings(HOTEL_MAX_CONCURRENT_REQUESTS=2)
+    def test_slot_is_released_after_unhandled_exception(self):
+        self.client.raise_request_exception = False
+        with patch('hotel.views.rank_by_name', side_effect=RuntimeError):
+            response = self.client.get(
+                '/reservations/search/', {'name': 'Bro'})
+        self.assertEqual(
+            response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(len(self._free_slots()), 2)
+
+    @override_settings(HOTEL_MAX_CONCURRENT_REQUESTS=2)
+    def test_slot_is_held_until_export_is_streamed(self):
+        response = self.client.get('/reservations/export/')
+        self.assertEqual(len(self._free_slots()), 1)
+        b''.join(response.streaming_content)
+        self.assertEqual(len(self._free_slots()), 2)
+
+    @override_settings(HOTEL_MAX_CONCURRENT_REQUESTS=None)
+    def test_no_limit(self):
+        self.assertIsNone(admission_limiter.acquire())
@@ -1,13 +1,24 @@
+import csv
+import io
+import json
+import time
 from datetime import date, timedelta
 from decimal import Decimal
+from unittest import mock
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
 
 from rest_framework.test import APITestCase
 from rest_framework import status
 from hotel.exceptions import RoomDeleteError
 
 from hotel.models import Reservation, Room, RoomClass
+from hotel.occupancy import occupancy_index
+from hotel.pagination import ReservationPagination
 
 
 class RoomViewsTest(APITestCase):
@@ -23,13 +34,19 @@ class RoomViewsTest(APITestCase):
             number='123', room_class=self.room_class)
         self.room_uri = self.uri + self.room.number + '/'
 
+    def tearDown(self):
+        # room responses are cached
+        cache.clear()
+
     def test_list_rooms(self):
         response = self.client.get(self.uri)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['number'], self.room.number)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(
+            response.data['results'][0]['number'],
+            self.room.number)
         self.assertEqual(
-            response.data[0]['room_class'],
+            response.data['results'][0]['room_class'],
             self.room_class.room_class)
 
     def test_create_room(self):
@@ -83,6 +100,89 @@ class RoomViewsTest(APITestCase):
             RoomDeleteError.default_detail)
 
 
+class RoomDeleteViewsTest(APITestCase):
+    """
+    Test suite for deleting and retiring rooms.
+    """
+    uri = '/rooms/retire/'
+
+    def setUp(self):
+        room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('30'))
+        self.rooms = {
+            number: Room.objects.create(number=number, room_class=room_class)
+            for number in ['1', '101', '102', '103']}
+        self.owner = User.objects.create(username='test', last_name='Brown')
+        self.past = self._reserve(-3, -1, '102')
+        self._reserve(-1, 1, '103')
+        self._reserve(5, 7, '101')
+        self.client.force_authenticate(
+            User.objects.create(username='admin', is_staff=True))
+
+    def tearDown(self):
+        cache.clear()
+
+    def _reserve(self, start, end, number):
+        reservation = Reservation.objects.create(
+            date_from=date.today() + timedelta(start),
+            date_to=date.today() + timedelta(end),
+            name='Smith',
+            owner=self.owner)
+        reservation.rooms.set([self.rooms[number]])
+        return reservation
+
+    def test_room_is_not_blocked_by_reservations_of_other_rooms(self):
+        # room number is a part of number of a reserved room
+        response = self.client.delete('/rooms/1/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Room.objects.filter(number='1').exists())
+
+    def test_room_booked_for_future_cannot_be_deleted(self):
+        response = self.client.delete('/rooms/101/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['detail'], RoomDeleteError.default_detail)
+        self.assertEqual(response.data['rooms'], ['101'])
+
+    def test_room_with_current_reservation_cannot_be_deleted(self):
+        response = self.client.delete('/rooms/103/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_room_with_past_reservations_can_be_deleted(self):
+        response = self.client.delete('/rooms/102/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.past.refresh_from_db()
+        self.assertEqual(self.past.total_cost, 2 * 30)
+
+    def test_rooms_are_retired(self):
+        response = self.client.post(
+            self.uri, {'rooms': ['1', '102', '104']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rooms'], ['1', '102'])
+        self.assertEqual(
+            sorted(Room.objects.values_list('number', flat=True)),
+            ['101', '103'])
+
+    def test_no_room_is_retired_if_any_is_booked(self):
+        response = self.client.post(
+            self.uri, {'rooms': ['1', '101', '102', '103']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['rooms'], ['101', '103'])
+        self.assertEqual(Room.objects.count(), 4)
+
+    def test_rooms_are_checked_with_single_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.uri, {'rooms': ['101']}, format='json')
+        self.assertEqual(
+            len([q for q in queries if 'hotel_roomnight' in q['sql']]), 1)
+
+    def test_only_staff_can_retire_rooms(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(
+            self.uri, {'rooms': ['1']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
 class ReservationViewsTest(APITestCase):
     """
     Test suite for reservations/ endpoint.
@@ -114,7 +214,7 @@ class ReservationViewsTest(APITestCase):
     def test_list_reservations(self):
         response = self.client.get(self.uri)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_create_reservation(self):
         response = self.client.post(self.uri,
@@ -136,6 +236,87 @@ class ReservationViewsTest(APITestCase):
             self.owner.last_name, [
                 r['name'] for r in Reservation.objects.values('name').iterator()])
 
+    def test_number_of_list_queries_does_not_depend_on_page_size(self):
+        self.client.force_authenticate(self.owner)
+        # staff role is cached after first request
+        self.client.get(self.uri)
+        with CaptureQueriesContext(connection) as single:
+            response = self.client.get(self.uri)
+        self.assertEqual(len(response.data['results']), 1)
+        for n in range(2, 12):
+            rooms = [
+                Room.objects.create(
+                    number=number, room_class=self.room_class)
+                for number in [str(n), '{}B'.format(n)]]
+            Reservation.objects.create(
+                date_from=date.today(),
+                date_to=date.today() + timedelta(n),
+                name='Smith',
+                owner=self.owner
+            ).rooms.set(rooms)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.uri)
+        self.assertEqual(len(response.data['results']), 11)
+        self.assertEqual(
+            response.data['results'][-1]['total_cost'], 11 * 2 * 30)
+        self.assertEqual(len(many), len(single))
+        # reservations with owners, rooms
+        self.assertEqual(len(many), 2)
+
+    def test_reservations_are_paginated(self):
+        for n in range(1, 6):
+            Reservation.objects.create(
+                date_from=date.today() + timedelta(10 - n),
+                date_to=date.today() + timedelta(10),
+                name='Smith',
+                owner=self.owner
+            ).rooms.set([Room.objects.create(
+                number=str(n), room_class=self.room_class)])
+        response = self.client.get(self.uri + '?page_size=4')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page = response.data['results']
+        self.assertEqual(len(first_page), 4)
+        self.assertIsNone(response.data['previous'])
+        response = self.client.get(response.data['next'])
+        second_page = response.data['results']
+        self.assertEqual(len(second_page), 2)
+        self.assertIsNone(response.data['next'])
+        dates = [r['date_from'] for r in first_page + second_page]
+        self.assertEqual(dates, sorted(dates))
+
+    def test_pages_of_reservations_starting_on_the_same_day(self):
+        day = date.today() + timedelta(5)
+        for n in range(1, 6):
+            Reservation.objects.create(
+                date_from=day,
+                date_to=day + timedelta(1),
+                name='Smith',
+                owner=self.owner
+            ).rooms.set([Room.objects.create(
+                number=str(n), room_class=self.room_class)])
+        ids = list(Reservation.objects.order_by(
+            'date_from', 'id').values_list('id', flat=True))
+        response = self.client.get(self.uri + '?page_size=2')
+        response = self.client.get(response.data['next'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(response.data['next'])
+        # rows are selected by position, without skipping any with offset
+        self.assertFalse(any('OFFSET' in q['sql'] for q in queries))
+        self.assertEqual(
+            [r['id'] for r in response.data['results']], ids[4:6])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(
+            [r['id'] for r in response.data['results']], ids[2:4])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.uri + '?cursor=cD1baW52YWxpZF0=')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(ReservationPagination, 'max_page_size', 1):
+            response = self.client.get(self.uri + '?page_size=1000')
+        self.assertEqual(len(response.data['results']), 1)
+
     def test_reservation_detail(self):
         response = self.client.get(self.reservation_uri)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -159,6 +340,57 @@ class ReservationViewsTest(APITestCase):
         self.reservation.refresh_from_db()
         self.assertEqual(self.reservation.duration, 1)
 
+    def _availability_queries(self, queries):
+        return [q for q in queries if 'FROM "hotel_roomnight"' in q['sql']
+                and q['sql'].startswith('SELECT')]
+
+    def test_name_update_does_not_check_availability(self):
+        with CaptureQueriesContext(connection) as queries:
+            # form data is parsed into immutable QueryDict
+            response = self.client.patch(
+                self.reservation_uri, 'name=Jones',
+                content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Jones')
+        self.assertEqual(response.data['rooms'], ['123'])
+        self.assertEqual(self._availability_queries(queries), [])
+
+    def test_shortened_reservation_does_not_check_availability(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                self.reservation_uri, {
+                    'date_to': self.reservation.date_to - timedelta(1)},
+                format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['duration'], 2)
+        self.assertEqual(self._availability_queries(queries), [])
+
+    def test_extended_reservation_is_checked(self):
+        other = Reservation.objects.create(
+            date_from=self.reservation.date_to,
+            date_to=self.reservation.date_to + timedelta(2),
+            name='Jones',
+            owner=self.owner)
+        other.rooms.set([self.room])
+        response = self.client.patch(
+            self.reservation_uri, {
+                'date_to': self.reservation.date_to + timedelta(1)},
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_only_added_rooms_are_checked(self):
+        Room.objects.create(number='124', room_class=self.room_class)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                self.reservation_uri, {'rooms': ['123', '124']},
+                format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rooms'], ['123', '124'])
+        checks = self._availability_queries(queries)
+        # checked when validating and again under lock
+        self.assertEqual(len(checks), 2)
+        self.assertNotIn("'123'", checks[0]['sql'])
+
     def test_delete_reservation(self):
         response = self.client.delete(self.reservation_uri)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
@@ -197,11 +429,11 @@ class ReservationSearchTest(APITestCase):
 
     def _assert_response_pos(self, response):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def _assert_response_neg(self, response):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
 
     def _assert_response_exc(self, response):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -315,3 +547,499 @@ class ReservationSearchTest(APITestCase):
                                                          timedelta(1)))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['id'], self.reservation.id)
+
+
+class RoomAvailabilityViewsTest(APITestCase):
+    """
+    Test suite for rooms/available/ endpoint.
+    """
+    uri = '/rooms/available/'
+
+    def setUp(self):
+        occupancy_index.invalidate()
+        self.room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('30'))
+        self.room = Room.objects.create(
+            number='123', room_class=self.room_class)
+        self.free_room = Room.objects.create(
+            number='124', room_class=self.room_class)
+        self.owner = User.objects.create(username='test', last_name='Brown')
+        self.reservation = Reservation.objects.create(
+            date_from=date.today() + timedelta(1),
+            date_to=date.today() + timedelta(3),
+            name='Smith',
+            owner=self.owner
+        )
+        self.reservation.rooms.set([self.room])
+        self.client.force_authenticate(self.owner)
+
+    def _search_uri(self, **kwargs):
+        return self.uri + '?' + '&'.join(k + '=' + str(v)
+                                         for k, v in kwargs.items())
+
+    def test_available_rooms(self):
+        response = self.client.get(self._search_uri(
+            date_from=date.today() + timedelta(2),
+            date_to=date.today() + timedelta(4)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            [{'number': self.free_room.number,
+              'room_class': self.room_class.room_class}])
+
+    def test_available_rooms_of_room_class(self):
+        response = self.client.get(self._search_uri(
+            date_from=date.today() + timedelta(3),
+            date_to=date.today() + timedelta(4),
+            room_class='S'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+    def test_available_rooms_invalid_period(self):
+        response = self.client.get(self._search_uri(
+            date_from=date.today() + timedelta(3),
+            date_to=date.today() + timedelta(3)))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self._search_uri(date_from='something'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_created_reservation_is_reflected(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/reservations/', {
+                'rooms': [self.free_room.number],
+                'date_from': date.today() + timedelta(7),
+                'date_to': date.today() + timedelta(9)})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(self._search_uri(
+            date_from=date.today() + timedelta(8),
+            date_to=date.today() + timedelta(9)))
+        self.assertEqual(
+            [r['number'] for r in response.data], [self.room.number])
+
+
+class RoomResponseCacheTest(APITestCase):
+    """
+    Test suite for caching of rooms/ endpoint responses.
+    """
+    uri = '/rooms/'
+
+    def setUp(self):
+        self.room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('30'))
+        self.room = Room.objects.create(
+            number='123', room_class=self.room_class)
+        self.room_uri = self.uri + self.room.number + '/'
+        self.client.force_authenticate(User.objects.create(username='test'))
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_list_is_served_from_cache(self):
+        self.client.get(self.uri)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.uri)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['results'],
+            [{'number': '123', 'room_class': 'T'}])
+
+    def test_detail_is_served_from_cache(self):
+        self.client.get(self.room_uri)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.room_uri)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['number'], '123')
+
+    def test_missing_room_is_not_cached(self):
+        self.client.get(self.uri + '124/')
+        Room.objects.create(number='124', room_class=self.room_class)
+        response = self.client.get(self.uri + '124/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_not_modified_for_matching_etag(self):
+        response = self.client.get(self.uri)
+        self.assertIn('ETag', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        response = self.client.get(
+            self.uri, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(response.content)
+
+    def test_modification_date_is_not_used(self):
+        # change within the same second would not be noticed
+        response = self.client.get(self.room_uri)
+        self.assertNotIn('Last-Modified', response)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.room_class = RoomClass.objects.create(
+                room_class='S', price=Decimal('50'))
+            self.room.save()
+        response = self.client.get(
+            self.room_uri, HTTP_IF_MODIFIED_SINCE=http_date(time.time()))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['room_class'], 'S')
+
+    def test_etag_differs_between_urls(self):
+        self.assertNotEqual(
+            self.client.get(self.uri)['ETag'],
+            self.client.get(self.room_uri)['ETag'])
+
+    def test_cache_is_invalidated_when_room_is_added(self):
+        etag = self.client.get(self.uri)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(number='124', room_class=self.room_class)
+        response = self.client.get(self.uri, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cache_is_invalidated_when_room_is_deleted(self):
+        self.client.get(self.room_uri)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.delete()
+        response = self.client.get(self.room_uri)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cache_is_invalidated_when_room_class_is_deleted(self):
+        self.client.get(self.uri)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room_class.delete()
+        response = self.client.get(self.uri)
+        self.assertEqual(response.data['results'], [])
+
+    def test_cache_is_not_invalidated_before_commit(self):
+        etag = self.client.get(self.uri)['ETag']
+        with self.captureOnCommitCallbacks(execute=False):
+            Room.objects.create(number='124', room_class=self.room_class)
+        self.assertEqual(self.client.get(self.uri)['ETag'], etag)
+
+    def test_anonymous_user_gets_no_cached_response(self):
+        self.client.get(self.uri)
+        self.client.force_authenticate(None)
+        response = self.client.get(self.uri)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RoomRateViewsTest(APITestCase):
+    """
+    Test suite for rates/ endpoint.
+    """
+    uri = '/rates/'
+
+    def setUp(self):
+        self.room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('30'))
+        RoomClass.objects.create(room_class='S', price=Decimal('40'))
+        self.user = User.objects.create(username='test')
+        self.staff = User.objects.create(username='admin', is_staff=True)
+        self.rate = {
+            'room_class': 'T',
+            'date_from': date.today(),
+            'date_to': date.today() + timedelta(7),
+            'price': '45.00',
+            'weekdays': 0b0110000}
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_staff_creates_rate(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.post(self.uri, self.rate)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['priority'], 0)
+        self.assertEqual(self.room_class.rates.get().price, 45)
+
+    def test_user_cannot_create_rate(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(self.uri, self.rate)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_rate_has_to_end_after_start(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.post(
+            self.uri, self.rate | {'date_to': date.today()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_rates_of_room_class(self):
+        self.client.force_authenticate(self.staff)
+        self.client.post(self.uri, self.rate)
+        self.client.post(self.uri, self.rate | {'room_class': 'S'})
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.uri + '?room_class=S')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['room_class'] for r in response.data['results']], ['S'])
+
+    def test_new_reservations_are_priced_with_rates(self):
+        self.client.force_authenticate(self.staff)
+        self.client.post(self.uri, self.rate | {'weekdays': 0b1111111})
+        Room.objects.create(number='1', room_class=self.room_class)
+        response = self.client.post('/reservations/', {
+            'date_from': date.today() + timedelta(6),
+            'date_to': date.today() + timedelta(8),
+            'name': 'Smith',
+            'rooms': ['1']})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['total_cost'], 45 + 30)
+
+
+class ReservationBulkViewsTest(APITestCase):
+    """
+    Test suite for reservations/bulk/ endpoint.
+    """
+    uri = '/reservations/bulk/'
+
+    def setUp(self):
+        self.room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('30'))
+        self.rooms = [
+            Room.objects.create(number=str(n), room_class=self.room_class)
+            for n in range(100, 110)]
+        self.owner = User.objects.create(username='test', last_name='Brown')
+        self.reservation = Reservation.objects.create(
+            date_from=date.today() + timedelta(1),
+            date_to=date.today() + timedelta(3),
+            name='Smith',
+            owner=self.owner
+        )
+        self.reservation.rooms.set([self.rooms[0]])
+        self.client.force_authenticate(self.owner)
+
+    def _reservation(self, room, start=5, days=2, **kwargs):
+        return {'rooms': [room.number],
+                'date_from': date.today() + timedelta(start),
+                'date_to': date.today() + timedelta(start + days)} | kwargs
+
+    def test_create_reservations(self):
+        response = self.client.post(self.uri, {'reservations': [
+            self._reservation(room) for room in self.rooms]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Reservation.objects.count(), 11)
+        self.assertEqual(
+            [r['status'] for r in response.data], [201] * 10)
+        self.assertEqual(response.data[0]['data']['name'], 'Brown')
+        self.assertEqual(response.data[0]['data']['rooms'], ['100'])
+        self.assertEqual(response.data[0]['data']['total_cost'], 60)
+
+    def test_updated_reservations_keep_booked_prices(self):
+        self.room_class.price = Decimal('40')
+        self.room_class.save()
+        response = self.client.post(self.uri, {'reservations': [
+            self._reservation(
+                self.rooms[0], start=1, id=self.reservation.pk,
+                rooms=['100', '101'], name='Smith')]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['data']['total_cost'], 2 * 70)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.total_cost, 2 * 70)
+
+    def test_updated_reservations_are_repriced_if_dates_change(self):
+        self.room_class.price = Decimal('40')
+        self.room_class.save()
+        response = self.client.post(self.uri, {'reservations': [
+            self._reservation(
+                self.rooms[0], days=3, id=self.reservation.pk,
+                name='Smith')]})
+        self.assertEqual(response.data[0]['data']['total_cost'], 3 * 40)
+
+    def test_number_of_queries_does_not_depend_on_batch_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.uri, {'reservations': [
+                self._reservation(room) for room in self.rooms[:2]]})
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(self.uri, {'reservations': [
+                self._reservation(room, start=10) for room in self.rooms]})
+        self.assertEqual(len(large), len(small))
+
+    def test_atomic_batch_is_not_saved_if_any_reservation_is_invalid(self):
+        response = self.client.post(self.uri, {'reservations': [
+            self._reservation(self.rooms[1]),
+            self._reservation(self.rooms[0], start=2)]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [r['status'] for r in response.data], [424, 400])
+        self.assertIn('100', response.data[1]['errors']['non_field_errors'][0])
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_partial_batch_saves_valid_reservations(self):
+        response = self.client.post(self.uri, {
+            'atomic': False,
+            'reservations': [
+                self._reservation(self.rooms[1]),
+                self._reservation(self.rooms[0], start=2),
+                self._reservation(self.rooms[2], rooms=['missing'])]})
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [r['status'] for r in response.data], [201, 400, 400])
+        self.assertIn('rooms', response.data[2]['errors'])
+        self.assertEqual(Reservation.objects.count(), 2)
+
+    def test_reservations_collide_within_batch(self):
+        response = self.client.post(self.uri, {
+            'atomic': False,
+            'reservations': [
+                self._reservation(self.rooms[1]),
+                self._reservation(self.rooms[1], start=6),
+                self._reservation(self.rooms[1], start=7)]})
+        self.assertEqual(
+            [r['status'] for r in response.data], [201, 400, 201])
+        self.assertEqual(Reservation.objects.count(), 3)
+
+    def test_update_reservations(self):
+        response = self.client.post(self.uri, {'reservations': [
+            self._reservation(self.rooms[0], start=2, id=self.reservation.id),
+            self._reservation(self.rooms[0], start=1, days=1)]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in response.data], [200, 201])
+        self.reservation.refresh_from_db()
+        self.assertEqual(
+            self.reservation.date_from, date.today() + timedelta(2))
+        self.assertEqual(self.reservation.name, 'Smith')
+        self.assertEqual(Reservation.objects.count(), 2)
+
+    def test_failed_update_keeps_its_rooms(self):
+        # reservation keeps room 100 when it cannot be moved, so it cannot
+        # be booked by another reservation in the same batch
+        taken = Reservation.objects.create(
+            date_from=date.today() + timedelta(5),
+            date_to=date.today() + timedelta(7),
+            name='Green',
+            owner=self.owner)
+        taken.rooms.set([self.rooms[0]])
+        response = self.client.post(self.uri, {
+            'atomic': False,
+            'reservations': [
+                self._reservation(self.rooms[0], id=self.reservation.id),
+                self._reservation(self.rooms[0], start=1),
+                self._reservation(self.rooms[1], start=1)]})
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([r['status'] for r in response.data], [400, 400, 201])
+        self.reservation.refresh_from_db()
+        self.assertEqual(
+            self.reservation.date_from, date.today() + timedelta(1))
+        self.assertEqual(Reservation.objects.count(), 3)
+
+    def test_update_not_owned_reservation(self):
+        other = User.objects.create(username='other', last_name='Green')
+        self.client.force_authenticate(other)
+        response = self.client.post(self.uri, {'reservations': [
+            self._reservation(self.rooms[0], id=self.reservation.id)]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0]['status'], 404)
+
+    def test_empty_batch(self):
+        response = self.client.post(self.uri, {'reservations': []})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReservationExportViewsTest(APITestCase):
+    """
+    Test suite for reservations/export/ endpoint.
+    """
+    uri = '/reservations/export/'
+
+    def setUp(self):
+        self.room_class = RoomClass.objects.create(
+            room_class='T', price=Decimal('30'))
+        self.owner = User.objects.create(username='test', last_name='Brown')
+        for n in range(5):
+            room = Room.objects.create(
+                number=str(100 + n), room_class=self.room_class)
+            Reservation.objects.create(
+                date_from=date.today() + timedelta(5 - n),
+                date_to=date.today() + timedelta(6),
+                name='Smith' if n % 2 else 'Jones',
+                owner=self.owner
+            ).rooms.set([room])
+        other = User.objects.create(username='other', last_name='Green')
+        Reservation.objects.create(
+            date_from=date.today(),
+            date_to=date.today() + timedelta(1),
+            name='Green',
+            owner=other
+        ).rooms.set([room])
+        self.client.force_authenticate(self.owner)
+
+    def _content(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        response = self.client.get(self.uri)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        reservations = [
+            json.loads(line)
+            for line in self._content(response).splitlines()]
+        self.assertEqual(len(reservations), 5)
+        self.assertEqual(reservations[0]['rooms'], ['104'])
+        self.assertEqual(reservations[0]['duration'], 5)
+        self.assertEqual(reservations[0]['total_cost'], 150)
+        self.assertEqual(reservations[0]['owner'], self.owner.username)
+
+    def test_export_csv(self):
+        response = self.client.get(self.uri + '?output=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(
+            io.StringIO(self._content(response))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['rooms'], '104')
+        self.assertEqual(rows[0]['total_cost'], '150.00')
+
+    def test_export_uses_search_parameters(self):
+        response = self.client.get(self.uri + '?name=Smith')
+        self.assertEqual(len(self._content(response).splitlines()), 2)
+
+    def test_export_invalid_output(self):
+        response = self.client.get(self.uri + '?output=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReservationNameSearchViewsTest(APITestCase):
+    """
+    Test suite for reservations/search/ endpoint and name matching.
+    """
+    uri = '/reservations/search/'
+
+    def setUp(self):
+        self.owner = User.objects.create(username='test', last_name='Brown')
+        for n, name in enumerate(['Smith', 'Smithson', 'Smyth', 'Jones']):
+            Reservation.objects.create(
+                date_from=date.today() + timedelta(n),
+                date_to=date.today() + timedelta(n + 1),
+                name=name,
+                owner=self.owner)
+        self.client.force_authenticate(self.owner)
+
+    def test_search_ranks_names(self):
+        response = self.client.get(self.uri + '?name=smith')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['name'] for r in response.data], ['Smith', 'Smithson'])
+
+    def test_search_fuzzy_with_limit(self):
+        response = self.client.get(
+            self.uri + '?name=Smithe&name_match=fuzzy&limit=1')
+        self.assertEqual([r['name'] for r in response.data], ['Smith'])
+
+    def test_search_uses_other_parameters(self):
+        response = self.client.get(
+            self.uri + '?name=smith&date_from=' +
+            str(date.today() + timedelta(1)))
+        self.assertEqual([r['name'] for r in response.data], ['Smithson'])
+
+    def test_search_requires_name(self):
+        response = self.client.get(self.uri)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_rejects_short_name(self):
+        response = self.client.get(self.uri + '?name=Sm')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_by_name_prefix(self):
+        response = self.client.get('/reservations/?name=Smi&name_match=prefix')
+        self.assertEqual(
+            [r['name'] for r in response.data['results']],
+            ['Smith', 'Smithson'])
+
+    def test_list_invalid_name_match(self):
+        response = self.client.get('/reservations/?name=Smi&name_match=x')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,208 @@
+"""
+Rate limiting and admission control.
+
+Throttles are token buckets kept in the cache selected with
+`HOTEL_THROTTLE_CACHE` setting, so with a shared backend (e.g. memcached or
+Redis) limits apply across all worker processes. Rates are configured with
+`DEFAULT_THROTTLE_RATES` of `REST_FRAMEWORK` settings (`None` disables a
+scope).
+
+Expensive actions are additionally admitted only while fewer than
+`HOTEL_MAX_CONCURRENT_REQUESTS` of them are being handled by all workers;
+other requests are rejected at once with 503, instead of queuing up and
+slowing down everything else.
+"""
+import random
+from typing import Optional
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from hotel.exceptions import ServiceOverloadedError
+
+THROTTLE_KEY = 'hotel:throttle:{}:{}'
+# slots of expensive requests being handled, taken with atomic `add`
+ADMISSION_SLOT_KEY = 'hotel:admission:slot:{}'
+# how many of the free slots a request tries to take (others could take
+# them meanwhile)
+ADMISSION_PROBES = 3
+
+
+def throttle_cache():
+    """
+    Returns cache backend for throttling state, configured by
+    `HOTEL_THROTTLE_CACHE` setting.
+    """
+    return caches[settings.HOTEL_THROTTLE_CACHE]
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Throttle allowing bursts of up to N requests and N requests per period
+    on average, for rate 'N/period' of its scope.
+
+    Bucket of every client holds up to N tokens and is refilled at the
+    rate; each request takes a token. Bucket is read and written without
+    locking, so concurrent requests of the same client may occasionally
+    get an extra token.
+    """
+
+    def __init__(self):
+        # scope (and so rate) may depend on view, it's resolved per request
+        pass
+
+    def get_scope(self, request, view) -> Optional[str]:
+        return self.scope
+
+    def get_rate(self):
+        # rates are read when requests are throttled, so that they can be
+        # changed in tests
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return THROTTLE_KEY.format(self.scope, ident)
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        self.rate = self.get_rate() if self.scope else None
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        refill = self.num_requests / self.duration
+        cache = throttle_cache()
+        key = self.get_cache_key(request, view)
+        now = self.timer()
+        tokens, updated = cache.get(key, (self.num_requests, now))
+        tokens = min(self.num_requests, tokens + (now - updated) * refill)
+        if tokens < 1:
+            self._wait = (1 - tokens) / refill
+            return False
+        # bucket left alone for the whole period is full again
+        cache.set(key, (tokens - 1, now), self.duration)
+        return True
+
+    def wait(self):
+        return self._wait
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Limits all requests of a user ('user' scope) or, for anonymous
+    requests, of an IP address ('anon' scope).
+    """
+
+    def get_scope(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return 'user'
+        return 'anon'
+
+
+class ActionTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Limits requests of a user to view actions listed in `throttle_scopes`
+    of the view (action -> scope). Actions sharing a scope share the limit.
+    """
+
+    def get_scope(self, request, view):
+        return getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None))
+
+
+class AdmissionLimiter:
+    """
+    Limits number of requests handled at once by all workers sharing the
+    throttling cache. Slot of a worker that died while handling a request
+    is freed after `HOTEL_ADMISSION_SLOT_TIMEOUT` seconds.
+    """
+
+    def acquire(self) -> Optional[tuple[str, str]]:
+        """
+        Takes a free slot, or raises ServiceOverloadedError if there is
+        none. Returns slot to be released (None if there's no limit).
+        """
+        limit = settings.HOTEL_MAX_CONCURRENT_REQUESTS
+        if limit is None:
+            return None
+        cache = throttle_cache()
+        token = uuid4().hex
+        # taken slots are read at once, so that requests rejected under
+        # overload cost a single round trip; free slots are tried in random
+        # order, so that concurrent requests rarely try the same ones
+        keys = [ADMISSION_SLOT_KEY.format(n) for n in range(limit)]
+        taken = cache.get_many(keys)
+        free = [key for key in keys if key not in taken]
+        for key in random.sample(free, min(len(free), ADMISSION_PROBES)):
+            if cache.add(key, token, settings.HOTEL_ADMISSION_SLOT_TIMEOUT):
+                return key, token
+        raise ServiceOverloadedError()
+
+    def release(self, slot: Optional[tuple[str, str]]):
+        if slot is None:
+            return
+        key, token = slot
+        cache = throttle_cache()
+        # slot could have expired and been taken by another request
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+admission_limiter = AdmissionLimiter()
+
+
+class AdmissionControlMixin:
+    """
+    Admits requests to `admission_actions` of the viewset only while there
+    is a free slot (see AdmissionLimiter), after they're authenticated,
+    permitted and throttled. Slot is held until streamed response is sent,
+    or until an unhandled exception is raised.
+    """
+    admission_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.admission_actions:
+            self._admission_slot = admission_limiter.acquire()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        slot = self.__dict__.pop('_admission_slot', None)
+        if slot is not None and getattr(response, 'streaming', False):
+            # response closes its content when it's been sent
+            response.streaming_content = _ReleasingContent(
+                response.streaming_content, slot)
+        else:
+            admission_limiter.release(slot)
+        return response
+
+    def handle_exception(self, exc):
+        try:
+            return super().handle_exception(exc)
+        except BaseException:
+            # unhandled exception skips `finalize_response`
+            admission_limiter.release(
+                self.__dict__.pop('_admission_slot', None))
+            raise
+
+
+class _ReleasingContent:
+    """
+    Streamed content releasing admission slot when it's closed.
+    """
+
+    def __init__(self, content, slot):
+        self.content = content
+        self.slot = slot
+
+    def __iter__(self):
+        return iter(self.content)
+
+    def close(self):
+        admission_limiter.release(self.slot)
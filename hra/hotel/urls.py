@@ -1,14 +1,37 @@
 from django.urls.conf import include, path
 from rest_framework.routers import DefaultRouter
 
-from hotel import views
+from hotel import async_views, metrics, views
 
 router = DefaultRouter()
 router.register(r'rooms', views.RoomViewSet)
+router.register(r'rates', views.RoomRateViewSet)
 router.register(r'reservations', views.ReservationViewSet)
 router.register(r'users', views.UserViewSet)
 
+# async versions of read endpoints, for ASGI deployments
+async_urlpatterns = [
+    path('rooms/', async_views.AsyncRoomViewSet.as_view({'get': 'list'}),
+         name='room-list'),
+    path('rooms/available/',
+         async_views.AsyncRoomViewSet.as_view({'get': 'available'}),
+         name='room-available'),
+    path('reservations/',
+         async_views.AsyncReservationViewSet.as_view({'get': 'list'}),
+         name='reservation-list'),
+    path('reservations/<int:pk>/',
+         async_views.AsyncReservationViewSet.as_view({'get': 'retrieve'}),
+         name='reservation-detail'),
+]
+
 urlpatterns = [
     path('', include(router.urls)),
+    path('async/', include((async_urlpatterns, 'async'))),
+    path('reports/occupancy/', views.OccupancyReportView.as_view(),
+         name='occupancy-report'),
+    path('auth/token/', views.TokenView.as_view(), name='token'),
+    path('auth/token/refresh/', views.TokenRefreshView.as_view(),
+         name='token-refresh'),
     path('auth/', include('rest_framework.urls')),
+    path('metrics', metrics.prometheus_metrics, name='metrics'),
 ]
@@ -1,49 +1,146 @@
-from datetime import timedelta
+import csv
+import json
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError as DjangoValidationError
-from django.db.models.expressions import F
+from django.http import StreamingHttpResponse
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.decorators import action
 from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
-from hotel.exceptions import RoomDeleteError
-from hotel.models import Reservation, Room
-from hotel.permissions import (ReservationViewSetPermissions,
+from hotel.authentication import SignedTokenAuthentication, issue_token
+from hotel.bulk import ReservationBatch
+from hotel.caching import CachedRoomResponseMixin
+from hotel.inventory import retire_rooms
+from hotel.models import Reservation, Room, RoomRate
+from hotel.occupancy import occupancy_index
+from hotel.pagination import (ReservationPagination, RoomPagination,
+                              RoomRatePagination, UserPagination)
+from hotel.permissions import (ReportPermissions,
+                               ReservationViewSetPermissions,
+                               RoomRateViewSetPermissions,
                                RoomViewSetPermissions, UserViewSetPermissions,
                                is_staff)
-from hotel.serializers import (ReservationSerializer, RoomSerializer,
+from hotel.rollups import occupancy_report
+from hotel.routers import ReplicaReadMixin
+from hotel.search import name_match, rank_by_name, search_reservations
+from hotel.serializers import (BulkReservationSerializer,
+                               OccupancyReportSerializer,
+                               ReservationSerializer,
+                               RoomAvailabilitySerializer, RoomRateSerializer,
+                               RoomRetirementSerializer, RoomSerializer,
                                UserSerializer)
+from hotel.throttling import AdmissionControlMixin
 
 
-class RoomViewSet(ModelViewSet):
+# content types of available export formats
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# how many reservations are read from the database at once during export
+EXPORT_CHUNK_SIZE = 1000
+# how many best matching reservations are returned by name search by default
+# and at most
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# names shorter than a trigram can't be looked up in trigram index, so they
+# would be ranked by scanning all reservations
+MIN_SEARCH_NAME_LENGTH = 3
+
+
+class _Echo:
+    """
+    File-like object returning what is written to it, so that CSV writer's
+    output can be streamed.
+    """
+
+    def write(self, value):
+        return value
+
+
+class RoomViewSet(ReplicaReadMixin, CachedRoomResponseMixin, ModelViewSet):
     """
-    Viewset providing endpoints for handling Rooms.
+    Viewset providing endpoints for handling Rooms. Rooms are listed and
+    retrieved from response cache, filled from the replica database.
     """
     queryset = Room.objects.all()
     serializer_class = RoomSerializer
     permission_classes = [RoomViewSetPermissions]
+    pagination_class = RoomPagination
+
+    def perform_destroy(self, instance):
+        retire_rooms([instance.number])
+
+    @action(detail=False, methods=['post'])
+    def retire(self, request):
+        """
+        Deletes many rooms at once. Nothing is deleted if any of the rooms
+        is booked for tonight or later.
+        """
+        serializer = RoomRetirementSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            {'rooms': retire_rooms(serializer.validated_data['rooms'])})
+
+    @action(detail=False)
+    def available(self, request):
+        """
+        Lists rooms that are free within given period, optionally limited to
+        given room class. Served from occupancy index, not from reservations.
+        """
+        params = RoomAvailabilitySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        rooms = [
+            Room(number=number, room_class_id=room_class)
+            for number, room_class in occupancy_index.available_rooms(
+                **params.validated_data)]
+        return Response(self.get_serializer(rooms, many=True).data)
 
-    def destroy(self, request, pk: str):
-        if Reservation.objects.filter(rooms__number__contains=pk).count():
-            raise RoomDeleteError()
-        return super().destroy(request, pk)
 
+class RoomRateViewSet(ModelViewSet):
+    """
+    Viewset providing endpoints for handling rates of room classes.
+    """
+    queryset = RoomRate.objects.all()
+    serializer_class = RoomRateSerializer
+    permission_classes = [RoomRateViewSetPermissions]
+    pagination_class = RoomRatePagination
 
-class ReservationViewSet(ModelViewSet):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list' and 'room_class' in self.request.query_params:
+            queryset = queryset.filter(
+                room_class=self.request.query_params['room_class'])
+        return queryset
+
+
+class ReservationViewSet(ReplicaReadMixin, AdmissionControlMixin,
+                         ModelViewSet):
     """
-    Viewset providing endpoints for handling Reservations.
+    Viewset providing endpoints for handling Reservations. Lists, searches
+    and exports are read from the replica database. Bookings, searches and
+    exports are throttled per user and limited in number at once.
     """
+    replica_actions = ('list', 'retrieve', 'search', 'export')
+    throttle_scopes = {
+        'create': 'booking',
+        'update': 'booking',
+        'partial_update': 'booking',
+        'bulk': 'booking',
+        'search': 'search',
+        'export': 'export',
+    }
+    admission_actions = ('create', 'bulk', 'search', 'export')
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
     permission_classes = [ReservationViewSetPermissions]
-
-    def partial_update(self, request, pk: int, **kwargs):
-        # to satisfy validator, add rooms from reservation if they're not
-        # getting updated
-        if 'rooms' not in request.data:
-            request.data.update({'rooms': [r['number'] for r in list(
-                Reservation.objects.get(pk=pk).rooms.values('number').iterator())]})
-        return super().partial_update(request, pk, **kwargs)
+    pagination_class = ReservationPagination
 
     def get_queryset(self):
         """
@@ -51,51 +148,78 @@ class ReservationViewSet(ModelViewSet):
         """
         user = self.request.user
         queryset = super().get_queryset()
-        if self.action == 'list':
-            # do searching only in list view, not in detail view
+        if self.action in [
+                'list', 'retrieve', 'export', 'search', 'update',
+                'partial_update']:
+            # updated reservation's rooms are also used by its validation
+            queryset = queryset.for_serialization()
+        if self.action in ['list', 'export', 'search']:
+            # do searching only in list views, not in detail view
             if not is_staff(user):
                 # limit reservations on the list only to those that user is
                 # owner of
                 queryset = queryset.filter(owner=user)
-            queryset = self._search_queryset(queryset)
+            queryset = search_reservations(
+                queryset, self.request.query_params)
         return queryset
 
-    def _search_queryset(self, queryset):
-        params = self.request.query_params
-        if 'room_number' in params:
-            queryset = queryset.filter(
-                rooms__number=params['room_number'])
-        if 'name' in params:
-            queryset = queryset.filter(name__contains=params['name'])
-        if 'date' in params:
-            try:
-                queryset = queryset.filter(
-                    date_from__lte=params['date'],
-                    date_to__gte=params['date'])
-            except DjangoValidationError as e:
-                raise ValidationError(e.message, e.code)
-        if 'date_from' in params:
-            try:
-                queryset = queryset.filter(date_from=params['date_from'])
-            except DjangoValidationError as e:
-                raise ValidationError(e.message, e.code)
-        if 'date_to' in params:
-            try:
-                queryset = queryset.filter(date_to=params['date_to'])
-            except DjangoValidationError as e:
-                raise ValidationError(e.message, e.code)
-        if 'duration' in params:
-            try:
-                duration = int(params['duration'])
-            except ValueError as e:
-                raise ValidationError(e.__cause__)
-            if duration < 1:
-                raise ValidationError(
-                    'reservation duration cannot be negative')
-            queryset = queryset.filter(
-                date_to=F('date_from') +
-                timedelta(duration))
-        return queryset
+    @action(detail=False)
+    def search(self, request):
+        """
+        Lists reservations with names best matching `name` (ranked by
+        trigram similarity), narrowed down with other search parameters.
+        """
+        params = request.query_params
+        if 'name' not in params:
+            raise ValidationError('name is required')
+        if len(params['name']) < MIN_SEARCH_NAME_LENGTH:
+            raise ValidationError('name has to have at least {} '
+                                  'characters'.format(MIN_SEARCH_NAME_LENGTH))
+        try:
+            limit = min(int(params.get('limit', SEARCH_LIMIT)),
+                        MAX_SEARCH_LIMIT)
+        except ValueError as e:
+            raise ValidationError(e.__cause__)
+        if limit < 1:
+            raise ValidationError('limit has to be positive')
+        reservations = rank_by_name(
+            self.get_queryset(), params['name'], name_match(params), limit)
+        return Response(self.get_serializer(reservations, many=True).data)
+
+    @action(detail=False)
+    def export(self, request):
+        """
+        Streams all reservations that would be listed (with the same search
+        parameters), as NDJSON or, with `output=csv`, as CSV. Reservations
+        are read from the database in chunks, so memory use does not grow
+        with the number of reservations.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            raise ValidationError(
+                'output has to be one of: ' + ', '.join(EXPORT_FORMATS))
+        reservations = (
+            self.get_serializer(r).data
+            for r in self.get_queryset().order_by('date_from', 'id').iterator(
+                chunk_size=EXPORT_CHUNK_SIZE))
+        if output == 'csv':
+            lines = self._csv_lines(reservations)
+        else:
+            lines = (json.dumps(r, cls=JSONEncoder) + '\n'
+                     for r in reservations)
+        response = StreamingHttpResponse(
+            lines, content_type=EXPORT_FORMATS[output])
+        response['Content-Disposition'] = \
+            'attachment; filename="reservations.{}"'.format(output)
+        return response
+
+    def _csv_lines(self, reservations):
+        fields = self.get_serializer().Meta.fields
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for reservation in reservations:
+            reservation['rooms'] = ' '.join(reservation['rooms'])
+            yield writer.writerow(reservation[f] for f in fields)
 
     def create(self, request, *args, **kwargs):
         if 'name' not in self.request.data:
@@ -105,11 +229,74 @@ class ReservationViewSet(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Creates and updates many reservations at once. Returns result for
+        each of given reservations.
+        """
+        params = BulkReservationSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        batch = ReservationBatch(
+            params.validated_data['reservations'],
+            request.user,
+            params.validated_data['atomic'],
+            self.get_serializer_context())
+        results = batch.save()
+        return Response(results, status=batch.status_code)
+
 
-class UserViewSet(ModelViewSet):
+class UserViewSet(ReplicaReadMixin, ModelViewSet):
     """
-    Viewset providing endpoints for handling Users.
+    Viewset providing endpoints for handling Users. Users are listed and
+    retrieved from the replica database.
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [UserViewSetPermissions]
+    pagination_class = UserPagination
+
+
+class OccupancyReportView(APIView):
+    """
+    Reports occupancy, average daily rate and revenue per available room
+    within given period, per room class. Served from daily rollups, not
+    from reservations.
+    """
+    permission_classes = [ReportPermissions]
+
+    def get(self, request):
+        params = OccupancyReportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(occupancy_report(**params.validated_data))
+
+
+class TokenView(APIView):
+    """
+    Issues authentication token for given username and password.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    def post(self, request):
+        serializer = AuthTokenSerializer(
+            data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return Response(_token_response(serializer.validated_data['user']))
+
+
+class TokenRefreshView(APIView):
+    """
+    Issues new authentication token in place of a valid one.
+    """
+    authentication_classes = [SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return Response(_token_response(request.user))
+
+
+def _token_response(user):
+    return {
+        'token': issue_token(user),
+        'expires_in': settings.HOTEL_TOKEN_MAX_AGE}
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hra.settings')
+# settings depending on the server (e.g. database connections)
+os.environ.setdefault('HOTEL_ASGI', '1')
 
 application = get_asgi_application()
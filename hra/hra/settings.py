@@ -10,7 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from urllib.parse import urlsplit
+
+import django
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -19,13 +24,27 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-%s8utyr!e=m0%mxvle)%s0(ykc4a$qu68p5k!vxc!92((*0y%9'
+# Settings needed by production deployments are read from environment
+# variables; defaults are suitable only for development.
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
 
-ALLOWED_HOSTS = []
+# SECURITY WARNING: keep the secret key used in production secret!
+# Development key is used only in debug mode; tokens and sessions signed with
+# it could be forged by anyone.
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    if not DEBUG:
+        raise ImproperlyConfigured(
+            'DJANGO_SECRET_KEY has to be set when DJANGO_DEBUG is off')
+    SECRET_KEY = \
+        'django-insecure-%s8utyr!e=m0%mxvle)%s0(ykc4a$qu68p5k!vxc!92((*0y%9'
+
+# comma separated host names
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',')
+    if host]
 
 
 # Application definition
@@ -42,7 +61,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'hotel.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,12 +96,89 @@ WSGI_APPLICATION = 'hra.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database is selected with DATABASE_ENGINE environment variable: 'sqlite'
+# (default) for single node deployments or 'postgresql'.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'hotel'),
+            'USER': os.environ.get('DATABASE_USER', ''),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', ''),
+            'PORT': os.environ.get('DATABASE_PORT', ''),
+            'OPTIONS': {},
+        }
     }
-}
+    if os.environ.get('DATABASE_POOL', '0') == '1':
+        # connection pool of each worker process (Django 5.1+, psycopg 3
+        # with pool extra); pooled connections are not closed after request
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', '10')),
+        }
+    if os.environ.get('DATABASE_PGBOUNCER', '0') == '1':
+        # server side cursors do not work with transaction pooling
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # wait for concurrent writers (seconds) instead of failing
+                # with "database is locked"; WAL mode and synchronous mode
+                # are set on each new connection (see hotel.signals)
+                'timeout': 20,
+            },
+        }
+    }
+    if django.VERSION >= (5, 1):
+        # take write lock when transaction starts, so waiting for it is
+        # covered by the timeout (lock upgrade in the middle of a
+        # transaction fails immediately)
+        DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+# Served as ASGI application (set by hra.asgi and gunicorn.conf.py)
+ASGI = os.environ.get('HOTEL_ASGI', '0') == '1'
+
+# Connections are kept open between requests (seconds, 0 closes them after
+# every request) and checked before reuse, unless they are pooled. Under
+# ASGI, sync code runs in threads not tied to requests, so connections kept
+# by them would not be checked or closed; they are closed after every request
+DATABASES['default']['CONN_MAX_AGE'] = \
+    0 if 'pool' in DATABASES['default']['OPTIONS'] or ASGI \
+    else int(os.environ.get('DATABASE_CONN_MAX_AGE', '600'))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Optional read replica, used by list and search endpoints: PostgreSQL
+# server with the same credentials or, for trying it out locally, copy of
+# the SQLite database file
+if DATABASE_ENGINE == 'postgresql' and 'DATABASE_REPLICA_HOST' in os.environ:
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        HOST=os.environ['DATABASE_REPLICA_HOST'],
+        PORT=os.environ.get(
+            'DATABASE_REPLICA_PORT', DATABASES['default']['PORT']),
+        OPTIONS=dict(DATABASES['default']['OPTIONS']))
+elif DATABASE_ENGINE != 'postgresql' and 'SQLITE_REPLICA_PATH' in os.environ:
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=os.environ['SQLITE_REPLICA_PATH'],
+        OPTIONS=dict(DATABASES['default']['OPTIONS']))
+if 'replica' in DATABASES:
+    # tests see replica as the test database
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['hotel.routers.ReplicaRouter']
+
+# Database alias of read replica, if there is one
+HOTEL_REPLICA_DATABASE = 'replica' if 'replica' in DATABASES else None
+# How long (in seconds) reads of users who have written something go to the
+# primary database, which should cover replication lag
+HOTEL_PRIMARY_PIN_TIMEOUT = 5
 
 
 # Password validation
@@ -102,6 +200,44 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+
+def cache_from_url(url):
+    """
+    Returns configuration of cache given with URL: 'redis://host:port/db'
+    (also 'rediss://' and 'unix://') or 'memcached://host:port'; local
+    memory cache, if URL is empty.
+    """
+    if not url:
+        return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    scheme = urlsplit(url).scheme
+    if scheme in ('redis', 'rediss', 'unix'):
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': url,
+        }
+    if scheme == 'memcached':
+        return {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': urlsplit(url).netloc,
+        }
+    raise ImproperlyConfigured('Unsupported cache URL: {}'.format(url))
+
+
+# Default cache keeps state shared by worker processes (e.g. occupancy index,
+# staff membership, users of tokens and metrics), so with more than one worker
+# it has to be a shared backend, e.g. HOTEL_CACHE_URL=redis://redis:6379/0
+CACHES = {
+    'default': cache_from_url(os.environ.get('HOTEL_CACHE_URL')),
+}
+
+# Cache used for room responses; with more than one worker process it has to
+# be shared by all of them (e.g. memcached or Redis)
+HOTEL_RESPONSE_CACHE = 'default'
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -121,6 +257,24 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Static files (of admin and browsable API) are collected here with
+# `collectstatic` and served by application itself with WhiteNoise, with
+# hashed names and far-future cache headers
+STATIC_ROOT = os.environ.get('DJANGO_STATIC_ROOT', BASE_DIR / 'static')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# files missing from manifest (e.g. when `collectstatic` was not run in
+# development) are served under their original names
+WHITENOISE_MANIFEST_STRICT = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -129,7 +283,52 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'hotel.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-    ]
+    ],
+    # token buckets, see hotel/throttling.py
+    'DEFAULT_THROTTLE_CLASSES': [
+        'hotel.throttling.UserTokenBucketThrottle',
+        'hotel.throttling.ActionTokenBucketThrottle',
+    ],
+    # 'N/period' allows bursts of N requests and N requests per period on
+    # average; scopes other than 'user' and 'anon' are set per view action
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('HOTEL_THROTTLE_ANON', '60/min'),
+        'user': os.environ.get('HOTEL_THROTTLE_USER', '600/min'),
+        'booking': os.environ.get('HOTEL_THROTTLE_BOOKING', '60/min'),
+        'search': os.environ.get('HOTEL_THROTTLE_SEARCH', '120/min'),
+        'export': os.environ.get('HOTEL_THROTTLE_EXPORT', '10/min'),
+    },
 }
+
+# Cache keeping throttling state and admission slots; with more than one
+# worker process it has to be shared by all of them. It's the default cache,
+# unless a separate one is given with HOTEL_THROTTLE_CACHE_URL (e.g. Redis
+# instance which does not evict keys)
+if os.environ.get('HOTEL_THROTTLE_CACHE_URL'):
+    CACHES['throttle'] = cache_from_url(
+        os.environ['HOTEL_THROTTLE_CACHE_URL'])
+    HOTEL_THROTTLE_CACHE = 'throttle'
+else:
+    HOTEL_THROTTLE_CACHE = 'default'
+# How many expensive requests (bookings, searches and exports) are handled at
+# once by all workers; others are rejected with 503 (0 disables the limit)
+HOTEL_MAX_CONCURRENT_REQUESTS = int(
+    os.environ.get('HOTEL_MAX_CONCURRENT_REQUESTS', '16')) or None
+# How long (in seconds) admission slot of a request is held at most, e.g. if
+# its worker died
+HOTEL_ADMISSION_SLOT_TIMEOUT = 5 * 60
+
+# Requests taking longer (in seconds) are logged with their slowest queries
+HOTEL_SLOW_REQUEST_SECONDS = float(
+    os.environ.get('HOTEL_SLOW_REQUEST_SECONDS', '1'))
+# How often (in seconds) worker processes publish their request metrics
+HOTEL_METRICS_PUBLISH_INTERVAL = 10
+# Bearer token required by the metrics endpoint; without it, metrics are
+# exposed only in debug mode
+HOTEL_METRICS_TOKEN = os.environ.get('HOTEL_METRICS_TOKEN')
+
+# How long (in seconds) tokens issued by auth/token/ endpoint are valid
+HOTEL_TOKEN_MAX_AGE = 24 * 60 * 60